@@ -0,0 +1,201 @@
+# app/api.py
+"""
+Headless HTTP API next to the Streamlit UI, for mobile clients and batch callers:
+
+    uvicorn app.api:app --host 0.0.0.0 --port 8000
+
+    POST /analyze                   multipart image upload (field "file"), optional user_id form field
+    GET  /recommendations           skin_type, max_budget, min_rating, categories, concerns, k
+    GET  /progress/{user_id}        bucketed history (bucket=day|week|month) and summary
+    GET  /health                    backend, scheduler and cache metrics
+
+It reuses the process-wide DatabaseClient, ProductIndex, analysis cache, progress
+writer and BatchScheduler, so API requests are micro-batched together exactly like
+Streamlit sessions. Decoding runs in a bounded thread pool and at most
+API_MAX_CONCURRENCY uploads are decoded or analyzed at once. Request bodies are
+capped at API_MAX_BODY_BYTES as they stream in (by Content-Length, then by counting),
+so an oversized upload is rejected with 413 before Starlette parses or spools it.
+/progress reads through AsyncDatabaseClient without holding a thread.
+Set DATABASE_URL=sqlite:///... to run it against a local SQLite file.
+"""
+import sys
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi import FastAPI, File, Form, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+import config
+from src.database.db_client import PROGRESS_BUCKETS, get_db_client
+from src.database.async_db_client import get_async_db_client
+from src.database.product_index import get_product_index
+from src.database.progress_writer import get_progress_writer
+from src.recommendation.recommender import recommend_products
+from src.analysis.analyzers import progress_columns
+from src.analysis.scheduler import get_scheduler
+from src.analysis.result_cache import get_analysis_cache, image_digest
+from src.analysis.preprocessing import ImageValidationError, preprocess_image
+
+_decode_pool = ThreadPoolExecutor(max_workers=config.API_MAX_CONCURRENCY, thread_name_prefix="api-decode")
+_slots = asyncio.Semaphore(config.API_MAX_CONCURRENCY)
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    # Load the model, the product index and the database before the first request
+    await run_in_threadpool(get_scheduler)
+    await run_in_threadpool(get_analysis_cache)
+    await run_in_threadpool(get_product_index)
+    get_async_db_client()
+    yield
+    await get_async_db_client().aclose()
+    await run_in_threadpool(get_progress_writer().flush)
+    _decode_pool.shutdown(wait=False)
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class BodyLimitMiddleware:
+    """
+    Rejects request bodies over `max_bytes` with 413. A declared Content-Length is
+    checked before anything is read; otherwise (chunked uploads, or a client that
+    lies) the bytes are counted as they are received and the request fails as soon
+    as it passes the limit, instead of after Starlette has spooled the whole body.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        too_large = JSONResponse({"detail": f"Request body is larger than {self.max_bytes / 2**20:.0f} MB"}, 413)
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            return await too_large(scope, receive, send)
+
+        received, exceeded = 0, False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            # The form parser may turn _BodyTooLarge into its own 400; the 413 replaces it
+            if not exceeded:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            pass
+        if exceeded:
+            await too_large(scope, receive, send)
+
+
+app = FastAPI(title="AI SkinCare Recommender API", lifespan=lifespan)
+app.add_middleware(BodyLimitMiddleware, max_bytes=config.API_MAX_BODY_BYTES)
+
+
+async def _read_upload(file: UploadFile, max_bytes: int = config.MAX_UPLOAD_BYTES) -> bytes:
+    """
+    Reads the image from Starlette's spooled upload, rejecting it if it exceeds
+    `max_bytes` (BodyLimitMiddleware has already capped the body as a whole).
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(413, f"Image is larger than {max_bytes / 2**20:.0f} MB")
+    chunks, total = [], 0
+    while chunk := await file.read(config.API_UPLOAD_CHUNK_BYTES):
+        total += len(chunk)
+        if total > max_bytes:
+            raise HTTPException(413, f"Image is larger than {max_bytes / 2**20:.0f} MB")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+@app.post("/analyze")
+async def analyze(file: UploadFile = File(...), user_id: Optional[str] = Form(None)):
+    """
+    Analyzes one uploaded image. Results are cached by image hash; with `user_id` they
+    are also recorded in the user's progress history (written behind, in batches).
+    """
+    image_bytes = await _read_upload(file)
+    digest = image_digest(image_bytes)
+    cache = get_analysis_cache()
+    results = cache.get(digest)
+    cached = results is not None
+    if not cached:
+        async with _slots:
+            loop = asyncio.get_running_loop()
+            try:
+                prepared = await loop.run_in_executor(_decode_pool, preprocess_image, image_bytes)
+            except ImageValidationError as e:
+                raise HTTPException(422, str(e))
+            results = await asyncio.wrap_future(get_scheduler().submit(prepared.array))
+        cache.put(digest, results)
+
+    if user_id:
+        get_progress_writer().enqueue({
+            "user_id": user_id,
+            "image_path": file.filename,
+            **progress_columns(results),
+        })
+    return {"digest": digest, "cached": cached, "results": results}
+
+
+@app.get("/recommendations")
+def recommendations(
+    skin_type: str = "Normal",
+    max_budget: float = 50.0,
+    min_rating: float = 4.0,
+    categories: List[str] = Query([]),
+    concerns: List[str] = Query([]),
+    k: int = Query(6, ge=1, le=config.MAX_RECOMMENDATIONS),
+):
+    """Top `k` products for the filters, best first, each with its match_score (as on the recommendations page)."""
+    filters = {
+        "max_budget": max_budget,
+        "min_rating": min_rating,
+        "skin_type": skin_type,
+        "categories": categories,
+        "concerns": concerns,
+    }
+    return recommend_products(filters, k=k, index=get_product_index())
+
+
+@app.get("/progress/{user_id}")
+async def progress(user_id: str, bucket: str = Query("day", pattern=f"^({'|'.join(PROGRESS_BUCKETS)})$")):
+    """The user's history aggregated per day/week/month, plus their summary row (null if none)."""
+    db = get_async_db_client()
+    buckets, summary = await asyncio.gather(
+        db.get_user_progress_buckets(user_id, bucket), db.get_user_summary(user_id),
+    )
+    return {"buckets": buckets, "summary": summary}
+
+
+@app.get("/health")
+def health():
+    return {
+        "database": get_db_client().health(),
+        "async_database": get_async_db_client().health(),
+        "scheduler": get_scheduler().metrics(),
+        "analysis_cache": get_analysis_cache().stats(),
+        "progress_writer": get_progress_writer().metrics(),
+    }
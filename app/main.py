@@ -1,16 +1,9 @@
 # app/main.py
 import streamlit as st
 import sys
+import threading
 from pathlib import Path
-import pandas as pd
-import numpy as np
-from PIL import Image
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
-import time
-import random
-import os 
+from datetime import datetime
 
 # --- NEW, MORE ROBUST PATH SETUP ---
 APP_DIR = Path(__file__).resolve().parent # This is the app/ folder
@@ -21,12 +14,9 @@ CSS_FILE = APP_DIR / "static" / "css" / "style.css"
 if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
-try:
-    from src.database.db_client import DatabaseClient
-except ImportError as e:
-    st.error(f"Import error: {e}")
-    st.info("This app is best run from the project's root directory using: streamlit run app/main.py")
-    st.stop()
+# Heavy modules (pandas, plotly, numpy/PIL/OpenCV and the model runtime, SQLAlchemy,
+# supabase) are imported inside the pages that use them, so a cold start only pays
+# for streamlit before the first page renders. Profile with scripts/profile_imports.py.
 
 # --- INITIALIZE SESSION STATE ---
 if 'user_id' not in st.session_state:
@@ -85,23 +75,8 @@ def render_navigation():
 
     return selected_page_title.split(" ", 1)[1]
 
-# --- PLACEHOLDER AND CORE LOGIC FUNCTIONS ---
-
-def smart_mock_ai_analysis(image):
-    """Creates an intelligent mock AI analysis based on image properties."""
-    img_array = np.array(image.convert('RGB'))
-    avg_brightness = np.mean(img_array)
-    skin_type, oiliness, acne = ("Normal", 0.4, 0.1) if avg_brightness > 160 else ("Oily", 0.8, 0.6) if avg_brightness < 80 else ("Dry", 0.2, 0.2)
-    skin_tone = "Fair" if avg_brightness > 170 else "Light" if avg_brightness > 140 else "Medium" if avg_brightness > 100 else "Dark"
-
-    return {
-        'skin_type': {'prediction': skin_type, 'confidence': random.uniform(0.8, 0.95)},
-        'acne_severity': {'prediction': 'Mild' if acne > 0.4 else 'Clear', 'score': acne, 'confidence': random.uniform(0.75, 0.9)},
-        'skin_tone': {'tone': skin_tone, 'confidence': random.uniform(0.85, 0.98)},
-        'oiliness_level': oiliness
-    }
-
 # --- PAGE RENDERING FUNCTIONS ---
+# (Skin analysis itself lives in src/analysis/analyzers.py)
 
 def render_home_page():
     """Renders the content for the home page."""
@@ -112,34 +87,55 @@ def render_home_page():
 def render_analysis_page():
     """Renders the content for the skin analysis page."""
     st.markdown("## 📸 AI-Powered Skin Analysis")
+    from src.analysis.analyzers import progress_columns
+    from src.analysis.scheduler import get_scheduler
+    from src.analysis.result_cache import get_analysis_cache, image_digest, make_thumbnail
+    from src.analysis.preprocessing import ImageValidationError, preprocess_image
+    from src.database.progress_writer import get_progress_writer
+
     uploaded_file = st.file_uploader("Upload a clear selfie...", type=['jpg', 'jpeg', 'png'])
 
     if uploaded_file:
-        image = Image.open(uploaded_file)
-        st.image(image, caption="Your Selfie", width=300)
+        image_bytes = uploaded_file.getvalue()
+        st.image(image_bytes, caption="Your Selfie", width=300)
 
         if st.button("Analyze My Skin", type="primary"):
             with st.spinner("AI is at work..."):
-                results = smart_mock_ai_analysis(image)
+                # Re-uploads of the same selfie are answered from the cache without decoding
+                digest = image_digest(image_bytes)
+                cache = get_analysis_cache()
+                results = cache.get(digest)
+                if results is None:
+                    try:
+                        # Decoded straight to the model input size (draft mode, EXIF-aware)
+                        prepared = preprocess_image(image_bytes)
+                    except ImageValidationError as e:
+                        st.error(f"⚠️ {e}")
+                        return
+                    st.caption(f"Decoded {prepared.original_size[0]}x{prepared.original_size[1]} "
+                               f"{prepared.format} in {prepared.decode_ms:.0f} ms")
+                    # Queued with other sessions' requests and run as one micro-batch
+                    results = get_scheduler().analyze(prepared.array)
+                    cache.put(digest, results)
                 st.session_state.analysis_results = results
                 st.session_state.user_profile = {'skin_type': results['skin_type']['prediction'], 'skin_tone': results['skin_tone']['tone']}
-                # Add image to tracking list
-                st.session_state.uploaded_images.append({'name': uploaded_file.name, 'timestamp': datetime.now(), 'image': image})
+                # Add image to tracking list (a small thumbnail plus its hash, not the full image)
+                previous = next((img for img in st.session_state.uploaded_images if img['digest'] == digest), None)
+                st.session_state.uploaded_images.append({
+                    'name': uploaded_file.name,
+                    'timestamp': datetime.now(),
+                    'digest': digest,
+                    'thumbnail': previous['thumbnail'] if previous else make_thumbnail(image_bytes),
+                })
             st.success("Analysis complete!")
+            if not results.get('face_detected', True):
+                st.info("No face detected, so the whole photo was analyzed. A well-lit, front-facing photo gives better results.")
             try:
-                db = DatabaseClient()
-                db.insert_progress({
-                "user_id": st.session_state.user_id,
-                "skin_type": results['skin_type']['prediction'],
-                "acne_severity": results['acne_severity']['score'],
-                "oiliness_level": results['oiliness_level'],
-                "skin_tone": results['skin_tone']['tone'],
-                "image_path": uploaded_file.name,  # later replace with Supabase Storage link
-                "confidence_scores": {
-                    "skin_type": results['skin_type']['confidence'],
-                    "acne": results['acne_severity']['confidence'],
-                    "skin_tone": results['skin_tone']['confidence']
-                    }
+                # Buffered and written in batches by a background thread (spooled to disk meanwhile)
+                get_progress_writer().enqueue({
+                    "user_id": st.session_state.user_id,
+                    "image_path": uploaded_file.name,  # later replace with Supabase Storage link
+                    **progress_columns(results),
                 })
                 st.success("✅ Results saved to your skincare journey!")
             except Exception as e:
@@ -158,6 +154,10 @@ def render_recommendations_page():
         st.warning("Please complete your skin analysis first!")
         return
 
+    import pandas as pd
+    from src.database.product_index import get_product_index
+    from src.recommendation.recommender import recommend_products
+
     with st.sidebar:
         st.markdown("### 🎛️ Customize")
         max_budget = st.slider("Max Budget ($)", 5.0, 100.0, 50.0, 5.0)
@@ -179,7 +179,6 @@ def render_recommendations_page():
     # REPLACE the entire try...except block in render_recommendations_page with this one
 
     try:
-        db = DatabaseClient()
         user_skin_type = st.session_state.user_profile.get('skin_type', 'Normal')
 
         # --- THIS IS THE NEW, EFFICIENT WAY ---
@@ -192,23 +191,16 @@ def render_recommendations_page():
             "concerns": concerns
         }
 
-        # 2. Call the new function to get ONLY the matching products
+        # 2. Score and rank on the in-memory product index, keeping only the top 6
         with st.spinner("🤖 Finding your perfect products..."):
-            recommendations_data = db.get_products_by_criteria(filters)
+            top_products = recommend_products(filters, k=6, index=get_product_index())
 
-        if not recommendations_data:
+        if not top_products:
             st.info("😔 No products match your criteria. Try adjusting your filters!")
             return
 
-        # 3. Convert the small, filtered list to a DataFrame
-        products_df = pd.DataFrame(recommendations_data)
-
-        # The rest of your logic (calculating match score, displaying) can stay the same
-        products_df['match_score'] = (
-            products_df['rating'] / 5.0 * 0.4 +
-            (1 - products_df['price'] / max_budget) * 0.3 + 0.3
-        )
-        recommendations = products_df.sort_values('match_score', ascending=False).head(6)
+        # 3. Only the six winners are turned into a DataFrame (already sorted by match_score)
+        recommendations = pd.DataFrame(top_products)
 
         # ... (Your existing code to display the recommendations) ...
         # (The summary cards and product card display loop)
@@ -220,43 +212,54 @@ def render_recommendations_page():
 def render_progress_page():
     """Render progress tracking page with data from DB"""
     st.markdown("## 📊 Your Skincare Progress Journey")
+    import pandas as pd
+    import plotly.express as px
+    from src.database.db_client import get_db_client
+    from src.analysis.timeseries import downsample_frame
 
     try:
-        db = DatabaseClient()
-        progress_data = db.get_user_progress(st.session_state.user_id)
+        db = get_db_client()
+        bucket = st.radio("Group by", ["day", "week", "month"], horizontal=True,
+                          format_func=str.capitalize)
+        # Aggregated in the database: one row per bucket instead of one per upload
+        progress_data = db.get_user_progress_buckets(st.session_state.user_id, bucket)
 
         if not progress_data or len(progress_data) == 0:
             st.info("Upload multiple selfies over time to see your skin improvement journey!")
             return
 
-        # Convert DB results to DataFrame
         df = pd.DataFrame(progress_data)
-
-        # Ensure timestamp is in datetime format
-        if "timestamp" in df.columns:
-            df["timestamp"] = pd.to_datetime(df["timestamp"])
+        df["bucket"] = pd.to_datetime(df["bucket"])
 
         # Plot acne severity trend
-        if "acne_severity" in df.columns:
-            st.markdown("### 📈 Acne Severity Over Time")
-            fig = px.line(df, x="timestamp", y="acne_severity", markers=True,
-                          title="Acne Severity Trend")
-            st.plotly_chart(fig, use_container_width=True)
+        st.markdown("### 📈 Acne Severity Over Time")
+        acne = downsample_frame(df, "bucket", "acne_severity_mean")
+        fig = px.line(acne, x="bucket", y="acne_severity_mean", markers=True,
+                      title="Acne Severity Trend", labels={"bucket": "", "acne_severity_mean": "Acne severity"},
+                      error_y=acne["acne_severity_max"] - acne["acne_severity_mean"],
+                      error_y_minus=acne["acne_severity_mean"] - acne["acne_severity_min"])
+        st.plotly_chart(fig, use_container_width=True)
 
         # Plot oiliness trend
-        if "oiliness_level" in df.columns:
-            st.markdown("### 💧 Oiliness Level Over Time")
-            fig2 = px.line(df, x="timestamp", y="oiliness_level", markers=True,
-                           title="Oiliness Level Trend", color_discrete_sequence=["#3b82f6"])
-            st.plotly_chart(fig2, use_container_width=True)
-
-        # Show recent analysis summary
-        latest = df.sort_values("timestamp").iloc[-1]
-        st.markdown("### 📝 Latest Analysis Summary")
-        st.metric("Skin Type", latest.get("skin_type", "Unknown"))
-        st.metric("Skin Tone", latest.get("skin_tone", "Unknown"))
-        st.metric("Acne Severity", f"{latest.get('acne_severity', 0):.2f}")
-        st.metric("Oiliness", f"{latest.get('oiliness_level', 0):.2f}")
+        st.markdown("### 💧 Oiliness Level Over Time")
+        oiliness = downsample_frame(df, "bucket", "oiliness_level_mean")
+        fig2 = px.line(oiliness, x="bucket", y="oiliness_level_mean", markers=True,
+                       title="Oiliness Level Trend", color_discrete_sequence=["#3b82f6"],
+                       labels={"bucket": "", "oiliness_level_mean": "Oiliness level"},
+                       error_y=oiliness["oiliness_level_max"] - oiliness["oiliness_level_mean"],
+                       error_y_minus=oiliness["oiliness_level_mean"] - oiliness["oiliness_level_min"])
+        st.plotly_chart(fig2, use_container_width=True)
+
+        # Show recent analysis summary (maintained on insert, so no history scan)
+        summary = db.get_user_summary(st.session_state.user_id)
+        if summary:
+            st.markdown("### 📝 Latest Analysis Summary")
+            st.metric("Skin Type", summary.get("latest_skin_type") or "Unknown")
+            st.metric("Skin Tone", summary.get("latest_skin_tone") or "Unknown")
+            st.metric("Acne Severity", f"{summary.get('latest_acne_severity') or 0:.2f}",
+                      help=f"Average over {summary['samples']} analyses: {summary.get('acne_severity_avg') or 0:.2f}")
+            st.metric("Oiliness", f"{summary.get('latest_oiliness_level') or 0:.2f}",
+                      help=f"Average over {summary['samples']} analyses: {summary.get('oiliness_level_avg') or 0:.2f}")
 
     except Exception as e:
         st.error(f"⚠️ Could not load progress data: {e}")
@@ -282,27 +285,50 @@ def render_about_page():
 
 # --- MAIN APPLICATION LOGIC ---
 
+def _warm_up():
+    from src.analysis.scheduler import get_scheduler
+    from src.analysis.result_cache import get_analysis_cache
+    get_scheduler()
+    get_analysis_cache()
+
+@st.cache_resource
+def start_warm_up():
+    """
+    Loads and warms up the analysis model once per process, in a background thread:
+    the first page renders immediately and the model is ready by the first upload.
+    """
+    thread = threading.Thread(target=_warm_up, name="analysis-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
 def main():
     """Main function to run the Streamlit app."""
     st.set_page_config(page_title="AI SkinCare Recommender", page_icon="🌟", layout="wide")
+
+    start_warm_up()
     
     # Use the reliable, absolute path to the CSS file
     load_css(CSS_FILE)
     
     selected_page = render_navigation()
 
-    if selected_page == "Home":
-        render_home_page()
-    elif selected_page == "Skin Analysis":
-        render_analysis_page()
-    elif selected_page == "Product Recommendations":
-        render_recommendations_page()
-    elif selected_page == "Progress Tracking":
-        render_progress_page()
-    elif selected_page == "Skincare Routine":
-        render_routine_page()
-    elif selected_page == "About":
-        render_about_page()
+    try:
+        if selected_page == "Home":
+            render_home_page()
+        elif selected_page == "Skin Analysis":
+            render_analysis_page()
+        elif selected_page == "Product Recommendations":
+            render_recommendations_page()
+        elif selected_page == "Progress Tracking":
+            render_progress_page()
+        elif selected_page == "Skincare Routine":
+            render_routine_page()
+        elif selected_page == "About":
+            render_about_page()
+    except ImportError as e:
+        st.error(f"Import error: {e}")
+        st.info("This app is best run from the project's root directory using: streamlit run app/main.py")
 
 if __name__ == "__main__":
     main()
@@ -17,6 +17,35 @@ BATCH_SIZE = 32
 EPOCHS = 50
 LEARNING_RATE = 0.001
 
+# Inference settings: "heuristic" (no model), "onnx" or "tflite"
+ANALYZER_BACKEND = os.getenv("ANALYZER_BACKEND", "heuristic")
+MODEL_PATH = os.getenv("MODEL_PATH", str(MODELS_DIR / "skin_analyzer.onnx"))
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "0"))  # 0 = runtime default
+
+# Micro-batching of concurrent analysis requests
+SCHEDULER_MAX_BATCH = int(os.getenv("SCHEDULER_MAX_BATCH", str(BATCH_SIZE)))
+SCHEDULER_MAX_WAIT_MS = float(os.getenv("SCHEDULER_MAX_WAIT_MS", "20"))
+
+# Face detection before analysis: only skin regions (forehead, cheeks) are analyzed
+FACE_DETECTION = os.getenv("FACE_DETECTION", "true").lower() == "true"
+FACE_MIN_SIZE_RATIO = float(os.getenv("FACE_MIN_SIZE_RATIO", "0.2"))  # min face edge / image edge
+
+# Upload limits, checked before an image is decoded
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "15")) * 1024 * 1024)
+MAX_IMAGE_PIXELS = int(float(os.getenv("MAX_IMAGE_MEGAPIXELS", "50")) * 1_000_000)
+
+# HTTP API (app/api.py): concurrent decodes and analyses in flight per process
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", str(os.cpu_count() or 4)))
+API_UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Whole request body limit, enforced while it streams in: the image plus multipart headers and form fields
+API_MAX_BODY_BYTES = MAX_UPLOAD_BYTES + 64 * 1024
+
+# Content-addressed analysis result cache (set ANALYSIS_CACHE_DIR empty to keep it in memory only).
+# The disk store is kept per analyzer fingerprint (backend, model file, FACE_DETECTION).
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "1024"))
+ANALYSIS_CACHE_DIR = os.getenv("ANALYSIS_CACHE_DIR", str(DATA_DIR / "cache" / "analysis"))
+ANALYSIS_CACHE_DISK_ENTRIES = int(os.getenv("ANALYSIS_CACHE_DISK_ENTRIES", "50000"))
+
 # Skin analysis classes
 SKIN_TYPES = ['Normal', 'Oily', 'Dry']
 ACNE_SEVERITY = ['Clear', 'Almost Clear', 'Mild', 'Moderate', 'Severe', 'Very Severe']
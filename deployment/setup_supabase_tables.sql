@@ -1,56 +1,845 @@
--- setup_supabase_tables.sql
--- Run these commands in your Supabase SQL Editor
+-- Generated by: python -m src.database.migrations render postgresql
+-- Do not edit by hand; add a Migration to src/database/migrations.py instead.
 
--- Create products table
-CREATE TABLE IF NOT EXISTS products (
-    id BIGSERIAL PRIMARY KEY,
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
     name TEXT NOT NULL,
-    brand TEXT,
-    category TEXT,
-    skin_type TEXT,
-    concerns TEXT,
-    price DECIMAL(10,2),
-    rating DECIMAL(3,2),
-    description TEXT,
-    ingredients TEXT,
-    purchase_link TEXT,
-    image_url TEXT,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Create user_progress table
-CREATE TABLE IF NOT EXISTS user_progress (
-    id BIGSERIAL PRIMARY KEY,
-    user_id TEXT NOT NULL,
-    skin_type TEXT,
-    acne_severity DECIMAL(5,3),
-    oiliness_level DECIMAL(5,3),
-    skin_tone TEXT,
-    image_path TEXT,
-    confidence_scores JSONB,
-    timestamp TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-);
+-- 001_initial_schema
+DO $migration$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM schema_version WHERE version = 1) THEN
+        EXECUTE $step$
+        CREATE TABLE IF NOT EXISTS products (
+            id BIGSERIAL PRIMARY KEY,
+            name TEXT NOT NULL,
+            brand TEXT,
+            category TEXT,
+            skin_type TEXT,
+            concerns TEXT,
+            price DECIMAL(10,2),
+            rating DECIMAL(3,2),
+            description TEXT,
+            ingredients TEXT,
+            purchase_link TEXT,
+            image_url TEXT,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        )
+        $step$;
+        EXECUTE $step$
+        CREATE TABLE IF NOT EXISTS user_progress (
+            id BIGSERIAL PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            skin_type TEXT,
+            acne_severity DECIMAL(5,3),
+            oiliness_level DECIMAL(5,3),
+            skin_tone TEXT,
+            image_path TEXT,
+            confidence_scores JSONB,
+            timestamp TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        )
+        $step$;
+        EXECUTE $step$
+        CREATE INDEX IF NOT EXISTS idx_products_skin_type ON products(skin_type)
+        $step$;
+        EXECUTE $step$
+        CREATE INDEX IF NOT EXISTS idx_products_category ON products(category)
+        $step$;
+        EXECUTE $step$
+        CREATE INDEX IF NOT EXISTS idx_products_price ON products(price)
+        $step$;
+        EXECUTE $step$
+        CREATE INDEX IF NOT EXISTS idx_products_rating ON products(rating)
+        $step$;
+        EXECUTE $step$
+        CREATE INDEX IF NOT EXISTS idx_user_progress_user_id ON user_progress(user_id)
+        $step$;
+        EXECUTE $step$
+        CREATE INDEX IF NOT EXISTS idx_user_progress_timestamp ON user_progress(timestamp)
+        $step$;
+        EXECUTE $step$
+        ALTER TABLE products ENABLE ROW LEVEL SECURITY
+        $step$;
+        EXECUTE $step$
+        ALTER TABLE user_progress ENABLE ROW LEVEL SECURITY
+        $step$;
+        EXECUTE $step$
+        DROP POLICY IF EXISTS "Allow public read access to products" ON products
+        $step$;
+        EXECUTE $step$
+        CREATE POLICY "Allow public read access to products" ON products
+            FOR SELECT USING (true)
+        $step$;
+        EXECUTE $step$
+        DROP POLICY IF EXISTS "Users can view own progress" ON user_progress
+        $step$;
+        EXECUTE $step$
+        CREATE POLICY "Users can view own progress" ON user_progress
+            FOR SELECT USING (true) -- For demo purposes, allow all reads
+        $step$;
+        EXECUTE $step$
+        DROP POLICY IF EXISTS "Users can insert own progress" ON user_progress
+        $step$;
+        EXECUTE $step$
+        CREATE POLICY "Users can insert own progress" ON user_progress
+            FOR INSERT WITH CHECK (true) -- For demo purposes, allow all inserts
+        $step$;
+        INSERT INTO schema_version (version, name) VALUES (1, 'initial_schema');
+    END IF;
+END
+$migration$;
+
+-- 002_product_sync_columns
+DO $migration$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM schema_version WHERE version = 2) THEN
+        EXECUTE $step$
+        ALTER TABLE products ADD COLUMN IF NOT EXISTS content_hash TEXT
+        $step$;
+        EXECUTE $step$
+        ALTER TABLE products ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP WITH TIME ZONE
+        $step$;
+        EXECUTE $step$
+        CREATE INDEX IF NOT EXISTS idx_products_brand_name ON products(brand, name)
+        $step$;
+        INSERT INTO schema_version (version, name) VALUES (2, 'product_sync_columns');
+    END IF;
+END
+$migration$;
+
+-- 003_product_tags
+DO $migration$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM schema_version WHERE version = 3) THEN
+        EXECUTE $step$
+        ALTER TABLE products ADD COLUMN IF NOT EXISTS skin_type_tags TEXT[]
+            GENERATED ALWAYS AS (array_remove(string_to_array(lower(regexp_replace(btrim(coalesce(skin_type, '')), '\s*,\s*', ',', 'g')), ','), '')) STORED
+        $step$;
+        EXECUTE $step$
+        ALTER TABLE products ADD COLUMN IF NOT EXISTS concern_tags TEXT[]
+            GENERATED ALWAYS AS (array_remove(string_to_array(lower(regexp_replace(btrim(coalesce(concerns, '')), '\s*,\s*', ',', 'g')), ','), '')) STORED
+        $step$;
+        EXECUTE $step$
+        CREATE INDEX IF NOT EXISTS idx_products_skin_type_tags ON products USING GIN (skin_type_tags)
+        $step$;
+        EXECUTE $step$
+        CREATE INDEX IF NOT EXISTS idx_products_concern_tags ON products USING GIN (concern_tags)
+        $step$;
+        INSERT INTO schema_version (version, name) VALUES (3, 'product_tags');
+    END IF;
+END
+$migration$;
+
+-- 004_product_search
+DO $migration$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM schema_version WHERE version = 4) THEN
+        EXECUTE $step$
+        ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(ingredients, '')), 'B') ||
+                setweight(to_tsvector('english', coalesce(brand, '')), 'C') ||
+                setweight(to_tsvector('english', coalesce(description, '')), 'D')
+            ) STORED
+        $step$;
+        EXECUTE $step$
+        CREATE INDEX IF NOT EXISTS idx_products_search_vector ON products USING GIN (search_vector)
+        $step$;
+        EXECUTE $step$
+        CREATE OR REPLACE FUNCTION search_products(
+            p_query TEXT,
+            p_max_budget NUMERIC DEFAULT NULL,
+            p_min_rating NUMERIC DEFAULT NULL,
+            p_skin_type TEXT DEFAULT NULL,
+            p_categories TEXT[] DEFAULT NULL,
+            p_concerns TEXT[] DEFAULT NULL,
+            p_limit INT DEFAULT 20,
+            p_offset INT DEFAULT 0
+        )
+        RETURNS TABLE (
+            id BIGINT, name TEXT, brand TEXT, category TEXT, skin_type TEXT, concerns TEXT,
+            price DECIMAL(10,2), rating DECIMAL(3,2), description TEXT, ingredients TEXT,
+            purchase_link TEXT, image_url TEXT, search_rank REAL
+        )
+        LANGUAGE sql STABLE
+        AS $$
+            SELECT p.id, p.name, p.brand, p.category, p.skin_type, p.concerns,
+                   p.price, p.rating, p.description, p.ingredients, p.purchase_link, p.image_url,
+                   ts_rank(p.search_vector, q) AS search_rank
+            FROM products p, websearch_to_tsquery('english', p_query) q
+            WHERE p.search_vector @@ q
+              AND p.deleted_at IS NULL
+              AND (p_max_budget IS NULL OR p.price <= p_max_budget)
+              AND (p_min_rating IS NULL OR p.rating >= p_min_rating)
+              AND (p_skin_type IS NULL OR p.skin_type_tags @> ARRAY[p_skin_type])
+              AND (p_categories IS NULL OR p.category = ANY(p_categories))
+              AND (p_concerns IS NULL OR p.concern_tags && p_concerns)
+            ORDER BY search_rank DESC, p.id
+            LIMIT p_limit OFFSET p_offset;
+        $$
+        $step$;
+        INSERT INTO schema_version (version, name) VALUES (4, 'product_search');
+    END IF;
+END
+$migration$;
+
+-- 005_recommend_products_rpc
+DO $migration$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM schema_version WHERE version = 5) THEN
+        EXECUTE $step$
+        CREATE OR REPLACE FUNCTION recommend_products(
+            p_price_scale NUMERIC,
+            p_rating_weight NUMERIC DEFAULT 0.4,
+            p_price_weight NUMERIC DEFAULT 0.3,
+            p_base_weight NUMERIC DEFAULT 0.3,
+            p_max_budget NUMERIC DEFAULT NULL,
+            p_min_rating NUMERIC DEFAULT NULL,
+            p_skin_type TEXT DEFAULT NULL,
+            p_categories TEXT[] DEFAULT NULL,
+            p_concerns TEXT[] DEFAULT NULL,
+            p_limit INT DEFAULT 6
+        )
+        RETURNS TABLE (
+            id BIGINT, name TEXT, brand TEXT, category TEXT, skin_type TEXT, concerns TEXT,
+            price DECIMAL(10,2), rating DECIMAL(3,2), description TEXT, ingredients TEXT,
+            purchase_link TEXT, image_url TEXT, match_score NUMERIC
+        )
+        LANGUAGE sql STABLE
+        AS $$
+            SELECT p.id, p.name, p.brand, p.category, p.skin_type, p.concerns,
+                   p.price, p.rating, p.description, p.ingredients, p.purchase_link, p.image_url,
+                   p.rating / 5.0 * p_rating_weight + (1 - p.price / p_price_scale) * p_price_weight + p_base_weight
+                       AS match_score
+            FROM products p
+            WHERE p.deleted_at IS NULL
+              AND (p_max_budget IS NULL OR p.price <= p_max_budget)
+              AND (p_min_rating IS NULL OR p.rating >= p_min_rating)
+              AND (p_skin_type IS NULL OR p.skin_type_tags @> ARRAY[p_skin_type])
+              AND (p_categories IS NULL OR p.category = ANY(p_categories))
+              AND (p_concerns IS NULL OR p.concern_tags && p_concerns)
+            ORDER BY match_score DESC NULLS LAST, p.id
+            LIMIT p_limit;
+        $$
+        $step$;
+        INSERT INTO schema_version (version, name) VALUES (5, 'recommend_products_rpc');
+    END IF;
+END
+$migration$;
+
+-- 006_user_progress_buckets_rpc
+DO $migration$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM schema_version WHERE version = 6) THEN
+        EXECUTE $step$
+        CREATE OR REPLACE FUNCTION user_progress_buckets(p_user_id TEXT, p_bucket TEXT DEFAULT 'day')
+        RETURNS TABLE (
+            bucket DATE, samples BIGINT,
+            acne_severity_mean NUMERIC, acne_severity_min NUMERIC, acne_severity_max NUMERIC,
+            oiliness_level_mean NUMERIC, oiliness_level_min NUMERIC, oiliness_level_max NUMERIC,
+            last_skin_type TEXT, last_skin_tone TEXT, last_acne_severity NUMERIC, last_oiliness_level NUMERIC
+        )
+        LANGUAGE sql STABLE
+        AS $$
+            SELECT date_trunc(p_bucket, up.timestamp)::date AS bucket,
+                   COUNT(*),
+                   AVG(up.acne_severity), MIN(up.acne_severity), MAX(up.acne_severity),
+                   AVG(up.oiliness_level), MIN(up.oiliness_level), MAX(up.oiliness_level),
+                   (array_agg(up.skin_type ORDER BY up.timestamp DESC, up.id DESC))[1],
+                   (array_agg(up.skin_tone ORDER BY up.timestamp DESC, up.id DESC))[1],
+                   (array_agg(up.acne_severity ORDER BY up.timestamp DESC, up.id DESC))[1],
+                   (array_agg(up.oiliness_level ORDER BY up.timestamp DESC, up.id DESC))[1]
+            FROM user_progress up
+            WHERE up.user_id = p_user_id
+            GROUP BY 1
+            ORDER BY 1;
+        $$
+        $step$;
+        INSERT INTO schema_version (version, name) VALUES (6, 'user_progress_buckets_rpc');
+    END IF;
+END
+$migration$;
+
+-- 007_user_progress_summary
+DO $migration$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM schema_version WHERE version = 7) THEN
+        EXECUTE $step$
+        CREATE TABLE IF NOT EXISTS user_progress_summary (
+            user_id TEXT PRIMARY KEY,
+            samples BIGINT NOT NULL,
+            first_timestamp TIMESTAMP WITH TIME ZONE,
+            last_timestamp TIMESTAMP WITH TIME ZONE,
+            latest_skin_type TEXT,
+            latest_skin_tone TEXT,
+            latest_acne_severity DECIMAL(5,3),
+            latest_oiliness_level DECIMAL(5,3),
+            acne_severity_sum NUMERIC NOT NULL DEFAULT 0,
+            acne_severity_count BIGINT NOT NULL DEFAULT 0,
+            oiliness_level_sum NUMERIC NOT NULL DEFAULT 0,
+            oiliness_level_count BIGINT NOT NULL DEFAULT 0
+        )
+        $step$;
+        EXECUTE $step$
+        CREATE OR REPLACE FUNCTION user_progress_summary_on_insert()
+        RETURNS TRIGGER
+        LANGUAGE plpgsql
+        SECURITY DEFINER  -- clients never write the summary directly (see RLS below)
+        AS $$
+        BEGIN
+            INSERT INTO user_progress_summary AS s (
+                user_id, samples, first_timestamp, last_timestamp,
+                latest_skin_type, latest_skin_tone, latest_acne_severity, latest_oiliness_level,
+                acne_severity_sum, acne_severity_count, oiliness_level_sum, oiliness_level_count
+            ) VALUES (
+                NEW.user_id, 1, NEW.timestamp, NEW.timestamp,
+                NEW.skin_type, NEW.skin_tone, NEW.acne_severity, NEW.oiliness_level,
+                COALESCE(NEW.acne_severity, 0), (NEW.acne_severity IS NOT NULL)::int,
+                COALESCE(NEW.oiliness_level, 0), (NEW.oiliness_level IS NOT NULL)::int
+            )
+            ON CONFLICT (user_id) DO UPDATE SET
+                samples = s.samples + 1,
+                first_timestamp = LEAST(s.first_timestamp, EXCLUDED.first_timestamp),
+                -- Written-behind records can arrive out of order, so latest_* only moves forward
+                latest_skin_type = CASE WHEN EXCLUDED.last_timestamp >= s.last_timestamp THEN EXCLUDED.latest_skin_type ELSE s.latest_skin_type END,
+                latest_skin_tone = CASE WHEN EXCLUDED.last_timestamp >= s.last_timestamp THEN EXCLUDED.latest_skin_tone ELSE s.latest_skin_tone END,
+                latest_acne_severity = CASE WHEN EXCLUDED.last_timestamp >= s.last_timestamp THEN EXCLUDED.latest_acne_severity ELSE s.latest_acne_severity END,
+                latest_oiliness_level = CASE WHEN EXCLUDED.last_timestamp >= s.last_timestamp THEN EXCLUDED.latest_oiliness_level ELSE s.latest_oiliness_level END,
+                last_timestamp = GREATEST(s.last_timestamp, EXCLUDED.last_timestamp),
+                acne_severity_sum = s.acne_severity_sum + EXCLUDED.acne_severity_sum,
+                acne_severity_count = s.acne_severity_count + EXCLUDED.acne_severity_count,
+                oiliness_level_sum = s.oiliness_level_sum + EXCLUDED.oiliness_level_sum,
+                oiliness_level_count = s.oiliness_level_count + EXCLUDED.oiliness_level_count;
+            RETURN NULL;
+        END;
+        $$
+        $step$;
+        EXECUTE $step$
+        DROP TRIGGER IF EXISTS trg_user_progress_summary ON user_progress
+        $step$;
+        EXECUTE $step$
+        CREATE TRIGGER trg_user_progress_summary
+            AFTER INSERT ON user_progress
+            FOR EACH ROW EXECUTE FUNCTION user_progress_summary_on_insert()
+        $step$;
+        EXECUTE $step$
+        CREATE OR REPLACE FUNCTION rebuild_user_progress_summary(p_user_ids TEXT[] DEFAULT NULL)
+        RETURNS VOID
+        LANGUAGE sql
+        SECURITY DEFINER
+        AS $$
+            DELETE FROM user_progress_summary
+            WHERE p_user_ids IS NULL OR user_id = ANY(p_user_ids);
+
+            INSERT INTO user_progress_summary (
+                user_id, samples, first_timestamp, last_timestamp,
+                latest_skin_type, latest_skin_tone, latest_acne_severity, latest_oiliness_level,
+                acne_severity_sum, acne_severity_count, oiliness_level_sum, oiliness_level_count
+            )
+            SELECT agg.user_id, agg.samples, agg.first_timestamp, agg.last_timestamp,
+                   l.skin_type, l.skin_tone, l.acne_severity, l.oiliness_level,
+                   agg.acne_severity_sum, agg.acne_severity_count, agg.oiliness_level_sum, agg.oiliness_level_count
+            FROM (
+                SELECT user_id, COUNT(*) AS samples, MIN(timestamp) AS first_timestamp, MAX(timestamp) AS last_timestamp,
+                       COALESCE(SUM(acne_severity), 0) AS acne_severity_sum, COUNT(acne_severity) AS acne_severity_count,
+                       COALESCE(SUM(oiliness_level), 0) AS oiliness_level_sum, COUNT(oiliness_level) AS oiliness_level_count
+                FROM user_progress
+                WHERE p_user_ids IS NULL OR user_id = ANY(p_user_ids)
+                GROUP BY user_id
+            ) agg
+            JOIN (
+                SELECT DISTINCT ON (user_id) user_id, skin_type, skin_tone, acne_severity, oiliness_level
+                FROM user_progress
+                WHERE p_user_ids IS NULL OR user_id = ANY(p_user_ids)
+                ORDER BY user_id, timestamp DESC, id DESC
+            ) l ON l.user_id = agg.user_id;
+        $$
+        $step$;
+        EXECUTE $step$
+        SELECT rebuild_user_progress_summary()
+        $step$;
+        EXECUTE $step$
+        ALTER TABLE user_progress_summary ENABLE ROW LEVEL SECURITY
+        $step$;
+        EXECUTE $step$
+        DROP POLICY IF EXISTS "Users can view own progress summary" ON user_progress_summary
+        $step$;
+        EXECUTE $step$
+        CREATE POLICY "Users can view own progress summary" ON user_progress_summary
+            FOR SELECT USING (true) -- For demo purposes, allow all reads
+        $step$;
+        INSERT INTO schema_version (version, name) VALUES (7, 'user_progress_summary');
+    END IF;
+END
+$migration$;
+
+-- 008_user_progress_user_time_index
+DO $migration$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM schema_version WHERE version = 8) THEN
+        EXECUTE $step$
+        CREATE INDEX IF NOT EXISTS idx_user_progress_user_time ON user_progress(user_id, timestamp) INCLUDE (skin_type, skin_tone, acne_severity, oiliness_level)
+        $step$;
+        EXECUTE $step$
+        DROP INDEX IF EXISTS idx_user_progress_user_id
+        $step$;
+        EXECUTE $step$
+        DROP INDEX IF EXISTS idx_user_progress_timestamp
+        $step$;
+        INSERT INTO schema_version (version, name) VALUES (8, 'user_progress_user_time_index');
+    END IF;
+END
+$migration$;
+
+-- 009_user_progress_partitions_and_rollups
+DO $migration$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM schema_version WHERE version = 9) THEN
+        EXECUTE $step$
+        CREATE TABLE IF NOT EXISTS user_progress_daily (
+            user_id TEXT NOT NULL,
+            day DATE NOT NULL,
+            samples BIGINT NOT NULL,
+            first_timestamp TIMESTAMP WITH TIME ZONE,
+            last_timestamp TIMESTAMP WITH TIME ZONE,
+            latest_skin_type TEXT,
+            latest_skin_tone TEXT,
+            latest_acne_severity DECIMAL(5,3),
+            latest_oiliness_level DECIMAL(5,3),
+            acne_severity_sum NUMERIC NOT NULL DEFAULT 0,
+            acne_severity_count BIGINT NOT NULL DEFAULT 0,
+            acne_severity_min DECIMAL(5,3),
+            acne_severity_max DECIMAL(5,3),
+            oiliness_level_sum NUMERIC NOT NULL DEFAULT 0,
+            oiliness_level_count BIGINT NOT NULL DEFAULT 0,
+            oiliness_level_min DECIMAL(5,3),
+            oiliness_level_max DECIMAL(5,3),
+            PRIMARY KEY (user_id, day)
+        )
+        $step$;
+        EXECUTE $step$
+        ALTER TABLE user_progress_daily ENABLE ROW LEVEL SECURITY
+        $step$;
+        EXECUTE $step$
+        CREATE POLICY "Users can view own progress rollups" ON user_progress_daily
+            FOR SELECT USING (true) -- For demo purposes, allow all reads
+        $step$;
+        EXECUTE $step$
+        ALTER TABLE user_progress RENAME TO user_progress_unpartitioned
+        $step$;
+        EXECUTE $step$
+        ALTER INDEX IF EXISTS idx_user_progress_user_time RENAME TO idx_user_progress_unpartitioned_user_time
+        $step$;
+        EXECUTE $step$
+        ALTER SEQUENCE user_progress_id_seq OWNED BY NONE
+        $step$;
+        EXECUTE $step$
+        CREATE TABLE user_progress (
+            id BIGINT NOT NULL DEFAULT nextval('user_progress_id_seq'),
+            user_id TEXT NOT NULL,
+            skin_type TEXT,
+            acne_severity DECIMAL(5,3),
+            oiliness_level DECIMAL(5,3),
+            skin_tone TEXT,
+            image_path TEXT,
+            confidence_scores JSONB,
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+        $step$;
+        EXECUTE $step$
+        ALTER SEQUENCE user_progress_id_seq OWNED BY user_progress.id
+        $step$;
+        EXECUTE $step$
+        CREATE TABLE user_progress_default PARTITION OF user_progress DEFAULT
+        $step$;
+        EXECUTE $step$
+        CREATE INDEX idx_user_progress_user_time ON user_progress(user_id, timestamp) INCLUDE (skin_type, skin_tone, acne_severity, oiliness_level)
+        $step$;
+        EXECUTE $step$
+        CREATE OR REPLACE FUNCTION create_user_progress_partitions(p_from DATE DEFAULT NULL, p_months_ahead INT DEFAULT 3)
+        RETURNS INT
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            v_month DATE := date_trunc('month', COALESCE(p_from, now()))::date;
+            v_last DATE := (date_trunc('month', now()) + make_interval(months => p_months_ahead))::date;
+            v_name TEXT;
+            v_created INT := 0;
+        BEGIN
+            WHILE v_month <= v_last LOOP
+                v_name := 'user_progress_' || to_char(v_month, 'YYYY_MM');
+                IF to_regclass(v_name) IS NULL THEN
+                    EXECUTE format('CREATE TABLE %I PARTITION OF user_progress FOR VALUES FROM (%L) TO (%L)',
+                                   v_name, v_month, (v_month + INTERVAL '1 month')::date);
+                    v_created := v_created + 1;
+                END IF;
+                v_month := (v_month + INTERVAL '1 month')::date;
+            END LOOP;
+            RETURN v_created;
+        END;
+        $$
+        $step$;
+        EXECUTE $step$
+        SELECT create_user_progress_partitions((SELECT MIN(timestamp) FROM user_progress_unpartitioned)::date)
+        $step$;
+        EXECUTE $step$
+        INSERT INTO user_progress
+            (id, user_id, skin_type, acne_severity, oiliness_level, skin_tone, image_path, confidence_scores, timestamp)
+        SELECT id, user_id, skin_type, acne_severity, oiliness_level, skin_tone, image_path, confidence_scores,
+               COALESCE(timestamp, NOW())
+        FROM user_progress_unpartitioned
+        $step$;
+        EXECUTE $step$
+        DROP TABLE user_progress_unpartitioned
+        $step$;
+        EXECUTE $step$
+        CREATE TRIGGER trg_user_progress_summary
+            AFTER INSERT ON user_progress
+            FOR EACH ROW EXECUTE FUNCTION user_progress_summary_on_insert()
+        $step$;
+        EXECUTE $step$
+        ALTER TABLE user_progress ENABLE ROW LEVEL SECURITY
+        $step$;
+        EXECUTE $step$
+        CREATE POLICY "Users can view own progress" ON user_progress
+            FOR SELECT USING (true) -- For demo purposes, allow all reads
+        $step$;
+        EXECUTE $step$
+        CREATE POLICY "Users can insert own progress" ON user_progress
+            FOR INSERT WITH CHECK (true) -- For demo purposes, allow all inserts
+        $step$;
+        EXECUTE $step$
+        CREATE OR REPLACE FUNCTION rollup_user_progress(p_from TIMESTAMPTZ, p_to TIMESTAMPTZ)
+        RETURNS BIGINT
+        LANGUAGE sql
+        AS $$
+            INSERT INTO user_progress_daily AS d (
+                user_id, day, samples, first_timestamp, last_timestamp,
+                latest_skin_type, latest_skin_tone, latest_acne_severity, latest_oiliness_level,
+                acne_severity_sum, acne_severity_count, acne_severity_min, acne_severity_max,
+                oiliness_level_sum, oiliness_level_count, oiliness_level_min, oiliness_level_max
+            )
+            SELECT user_id, timestamp::date, COUNT(*), MIN(timestamp), MAX(timestamp),
+                   (array_agg(skin_type ORDER BY timestamp DESC, id DESC))[1],
+                   (array_agg(skin_tone ORDER BY timestamp DESC, id DESC))[1],
+                   (array_agg(acne_severity ORDER BY timestamp DESC, id DESC))[1],
+                   (array_agg(oiliness_level ORDER BY timestamp DESC, id DESC))[1],
+                   COALESCE(SUM(acne_severity), 0), COUNT(acne_severity), MIN(acne_severity), MAX(acne_severity),
+                   COALESCE(SUM(oiliness_level), 0), COUNT(oiliness_level), MIN(oiliness_level), MAX(oiliness_level)
+            FROM user_progress
+            WHERE timestamp >= p_from AND timestamp < p_to
+            GROUP BY user_id, timestamp::date
+            ON CONFLICT (user_id, day) DO UPDATE SET
+                samples = d.samples + EXCLUDED.samples,
+                first_timestamp = LEAST(d.first_timestamp, EXCLUDED.first_timestamp),
+                latest_skin_type = CASE WHEN EXCLUDED.last_timestamp >= d.last_timestamp THEN EXCLUDED.latest_skin_type ELSE d.latest_skin_type END,
+                latest_skin_tone = CASE WHEN EXCLUDED.last_timestamp >= d.last_timestamp THEN EXCLUDED.latest_skin_tone ELSE d.latest_skin_tone END,
+                latest_acne_severity = CASE WHEN EXCLUDED.last_timestamp >= d.last_timestamp THEN EXCLUDED.latest_acne_severity ELSE d.latest_acne_severity END,
+                latest_oiliness_level = CASE WHEN EXCLUDED.last_timestamp >= d.last_timestamp THEN EXCLUDED.latest_oiliness_level ELSE d.latest_oiliness_level END,
+                last_timestamp = GREATEST(d.last_timestamp, EXCLUDED.last_timestamp),
+                acne_severity_sum = d.acne_severity_sum + EXCLUDED.acne_severity_sum,
+                acne_severity_count = d.acne_severity_count + EXCLUDED.acne_severity_count,
+                acne_severity_min = LEAST(d.acne_severity_min, EXCLUDED.acne_severity_min),
+                acne_severity_max = GREATEST(d.acne_severity_max, EXCLUDED.acne_severity_max),
+                oiliness_level_sum = d.oiliness_level_sum + EXCLUDED.oiliness_level_sum,
+                oiliness_level_count = d.oiliness_level_count + EXCLUDED.oiliness_level_count,
+                oiliness_level_min = LEAST(d.oiliness_level_min, EXCLUDED.oiliness_level_min),
+                oiliness_level_max = GREATEST(d.oiliness_level_max, EXCLUDED.oiliness_level_max);
+
+            SELECT COUNT(*) FROM user_progress WHERE timestamp >= p_from AND timestamp < p_to;
+        $$
+        $step$;
+        EXECUTE $step$
+        CREATE OR REPLACE FUNCTION maintain_user_progress(p_retention_months INT DEFAULT 24, p_months_ahead INT DEFAULT 3)
+        RETURNS TABLE (partitions_created INT, partitions_dropped INT, rows_rolled_up BIGINT, cutoff DATE)
+        LANGUAGE plpgsql
+        SECURITY DEFINER
+        AS $$
+        DECLARE
+            v_partition RECORD;
+            v_month DATE;
+        BEGIN
+            cutoff := (date_trunc('month', now()) - make_interval(months => p_retention_months))::date;
+            partitions_created := create_user_progress_partitions(NULL, p_months_ahead);
+            partitions_dropped := 0;
+            rows_rolled_up := 0;
+
+            FOR v_partition IN
+                SELECT c.relname
+                FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'user_progress'::regclass
+                  AND c.relname ~ '^user_progress_[0-9]{4}_[0-9]{2}$'
+                ORDER BY c.relname
+            LOOP
+                v_month := to_date(right(v_partition.relname, 7), 'YYYY_MM');
+                EXIT WHEN v_month + INTERVAL '1 month' > cutoff;
+                rows_rolled_up := rows_rolled_up + rollup_user_progress(v_month, (v_month + INTERVAL '1 month')::date);
+                EXECUTE format('ALTER TABLE user_progress DETACH PARTITION %I', v_partition.relname);
+                EXECUTE format('DROP TABLE %I', v_partition.relname);
+                partitions_dropped := partitions_dropped + 1;
+            END LOOP;
+
+            rows_rolled_up := rows_rolled_up + rollup_user_progress('-infinity', cutoff);
+            DELETE FROM user_progress WHERE timestamp < cutoff;
+            RETURN NEXT;
+        END;
+        $$
+        $step$;
+        EXECUTE $step$
+        DO $cron$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+                PERFORM cron.schedule('maintain-user-progress', '15 3 * * *', 'SELECT maintain_user_progress()');
+            END IF;
+        END
+        $cron$
+        $step$;
+        EXECUTE $step$
+        CREATE OR REPLACE FUNCTION user_progress_buckets(p_user_id TEXT, p_bucket TEXT DEFAULT 'day')
+                RETURNS TABLE (
+                    bucket DATE, samples BIGINT,
+                    acne_severity_mean NUMERIC, acne_severity_min NUMERIC, acne_severity_max NUMERIC,
+                    oiliness_level_mean NUMERIC, oiliness_level_min NUMERIC, oiliness_level_max NUMERIC,
+                    last_skin_type TEXT, last_skin_tone TEXT, last_acne_severity NUMERIC, last_oiliness_level NUMERIC
+                )
+                LANGUAGE sql STABLE
+                AS $$
+                    SELECT date_trunc(p_bucket, e.ts)::date AS bucket,
+                           SUM(e.samples)::bigint,
+                           SUM(e.acne_sum) / NULLIF(SUM(e.acne_count), 0), MIN(e.acne_min), MAX(e.acne_max),
+                           SUM(e.oiliness_sum) / NULLIF(SUM(e.oiliness_count), 0), MIN(e.oiliness_min), MAX(e.oiliness_max),
+                           (array_agg(e.skin_type ORDER BY e.ts DESC, e.seq DESC))[1],
+                           (array_agg(e.skin_tone ORDER BY e.ts DESC, e.seq DESC))[1],
+                           (array_agg(e.latest_acne ORDER BY e.ts DESC, e.seq DESC))[1],
+                           (array_agg(e.latest_oiliness ORDER BY e.ts DESC, e.seq DESC))[1]
+                    FROM (
+            SELECT user_id, timestamp AS ts, id AS seq, 1 AS samples, timestamp AS first_ts,
+                   skin_type, skin_tone, acne_severity AS latest_acne, oiliness_level AS latest_oiliness,
+                   COALESCE(acne_severity, 0) AS acne_sum, (acne_severity IS NOT NULL)::int AS acne_count,
+                   acne_severity AS acne_min, acne_severity AS acne_max,
+                   COALESCE(oiliness_level, 0) AS oiliness_sum, (oiliness_level IS NOT NULL)::int AS oiliness_count,
+                   oiliness_level AS oiliness_min, oiliness_level AS oiliness_max
+            FROM user_progress WHERE user_id = p_user_id
+            UNION ALL
+            SELECT user_id, last_timestamp, 0, samples, first_timestamp,
+                   latest_skin_type, latest_skin_tone, latest_acne_severity, latest_oiliness_level,
+                   acne_severity_sum, acne_severity_count, acne_severity_min, acne_severity_max,
+                   oiliness_level_sum, oiliness_level_count, oiliness_level_min, oiliness_level_max
+            FROM user_progress_daily WHERE user_id = p_user_id
+        ) e
+                    GROUP BY 1
+                    ORDER BY 1;
+                $$
+        $step$;
+        EXECUTE $step$
+        CREATE OR REPLACE FUNCTION rebuild_user_progress_summary(p_user_ids TEXT[] DEFAULT NULL)
+                RETURNS VOID
+                LANGUAGE sql
+                SECURITY DEFINER
+                AS $$
+                    DELETE FROM user_progress_summary
+                    WHERE p_user_ids IS NULL OR user_id = ANY(p_user_ids);
+
+                    INSERT INTO user_progress_summary (
+                        user_id, samples, first_timestamp, last_timestamp,
+                        latest_skin_type, latest_skin_tone, latest_acne_severity, latest_oiliness_level,
+                        acne_severity_sum, acne_severity_count, oiliness_level_sum, oiliness_level_count
+                    )
+                    SELECT e.user_id, SUM(e.samples)::bigint, MIN(e.first_ts), MAX(e.ts),
+                           (array_agg(e.skin_type ORDER BY e.ts DESC, e.seq DESC))[1],
+                           (array_agg(e.skin_tone ORDER BY e.ts DESC, e.seq DESC))[1],
+                           (array_agg(e.latest_acne ORDER BY e.ts DESC, e.seq DESC))[1],
+                           (array_agg(e.latest_oiliness ORDER BY e.ts DESC, e.seq DESC))[1],
+                           COALESCE(SUM(e.acne_sum), 0), SUM(e.acne_count)::bigint,
+                           COALESCE(SUM(e.oiliness_sum), 0), SUM(e.oiliness_count)::bigint
+                    FROM (
+            SELECT user_id, timestamp AS ts, id AS seq, 1 AS samples, timestamp AS first_ts,
+                   skin_type, skin_tone, acne_severity AS latest_acne, oiliness_level AS latest_oiliness,
+                   COALESCE(acne_severity, 0) AS acne_sum, (acne_severity IS NOT NULL)::int AS acne_count,
+                   acne_severity AS acne_min, acne_severity AS acne_max,
+                   COALESCE(oiliness_level, 0) AS oiliness_sum, (oiliness_level IS NOT NULL)::int AS oiliness_count,
+                   oiliness_level AS oiliness_min, oiliness_level AS oiliness_max
+            FROM user_progress WHERE p_user_ids IS NULL OR user_id = ANY(p_user_ids)
+            UNION ALL
+            SELECT user_id, last_timestamp, 0, samples, first_timestamp,
+                   latest_skin_type, latest_skin_tone, latest_acne_severity, latest_oiliness_level,
+                   acne_severity_sum, acne_severity_count, acne_severity_min, acne_severity_max,
+                   oiliness_level_sum, oiliness_level_count, oiliness_level_min, oiliness_level_max
+            FROM user_progress_daily WHERE p_user_ids IS NULL OR user_id = ANY(p_user_ids)
+        ) e
+                    GROUP BY e.user_id;
+                $$
+        $step$;
+        INSERT INTO schema_version (version, name) VALUES (9, 'user_progress_partitions_and_rollups');
+    END IF;
+END
+$migration$;
 
--- Create indexes for better performance
-CREATE INDEX IF NOT EXISTS idx_products_skin_type ON products(skin_type);
-CREATE INDEX IF NOT EXISTS idx_products_category ON products(category);
-CREATE INDEX IF NOT EXISTS idx_products_price ON products(price);
-CREATE INDEX IF NOT EXISTS idx_products_rating ON products(rating);
-CREATE INDEX IF NOT EXISTS idx_user_progress_user_id ON user_progress(user_id);
-CREATE INDEX IF NOT EXISTS idx_user_progress_timestamp ON user_progress(timestamp);
+-- 010_update_user_progress_analyses_rpc
+DO $migration$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM schema_version WHERE version = 10) THEN
+        EXECUTE $step$
+        CREATE OR REPLACE FUNCTION update_user_progress_analyses(p_rows JSONB)
+        RETURNS INT
+        LANGUAGE sql
+        SECURITY DEFINER
+        AS $$
+            WITH updated AS (
+                UPDATE user_progress p
+                SET skin_type = r.skin_type,
+                    acne_severity = r.acne_severity,
+                    oiliness_level = r.oiliness_level,
+                    skin_tone = r.skin_tone,
+                    confidence_scores = r.confidence_scores
+                FROM jsonb_to_recordset(p_rows) AS r(
+                    id BIGINT, skin_type TEXT, acne_severity DECIMAL(5,3), oiliness_level DECIMAL(5,3),
+                    skin_tone TEXT, confidence_scores JSONB
+                )
+                WHERE p.id = r.id
+                RETURNING 1
+            )
+            SELECT COUNT(*)::int FROM updated;
+        $$
+        $step$;
+        EXECUTE $step$
+        REVOKE EXECUTE ON FUNCTION update_user_progress_analyses(JSONB) FROM PUBLIC
+        $step$;
+        EXECUTE $step$
+        DO $grants$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'anon') THEN
+                REVOKE EXECUTE ON FUNCTION update_user_progress_analyses(JSONB) FROM anon, authenticated;
+            END IF;
+        END
+        $grants$
+        $step$;
+        INSERT INTO schema_version (version, name) VALUES (10, 'update_user_progress_analyses_rpc');
+    END IF;
+END
+$migration$;
 
--- Enable Row Level Security (RLS)
-ALTER TABLE products ENABLE ROW LEVEL SECURITY;
-ALTER TABLE user_progress ENABLE ROW LEVEL SECURITY;
+-- 011_unique_active_product_key
+DO $migration$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM schema_version WHERE version = 11) THEN
+        EXECUTE $step$
+        UPDATE products SET deleted_at = NOW(), updated_at = NOW()
+        WHERE deleted_at IS NULL AND id NOT IN (
+            SELECT MIN(id) FROM products WHERE deleted_at IS NULL GROUP BY COALESCE(brand, ''), name
+        )
+        $step$;
+        EXECUTE $step$
+        DROP INDEX IF EXISTS idx_products_brand_name
+        $step$;
+        EXECUTE $step$
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_products_brand_name ON products(COALESCE(brand, ''), name) WHERE deleted_at IS NULL
+        $step$;
+        INSERT INTO schema_version (version, name) VALUES (11, 'unique_active_product_key');
+    END IF;
+END
+$migration$;
 
--- Create policies for public read access to products
-CREATE POLICY "Allow public read access to products" ON products
-    FOR SELECT USING (true);
+-- 012_products_version
+DO $migration$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM schema_version WHERE version = 12) THEN
+        EXECUTE $step$
+        CREATE TABLE IF NOT EXISTS products_version (
+            id INT PRIMARY KEY CHECK (id = 1),
+            version BIGINT NOT NULL
+        )
+        $step$;
+        EXECUTE $step$
+        INSERT INTO products_version (id, version) VALUES (1, 0) ON CONFLICT DO NOTHING
+        $step$;
+        EXECUTE $step$
+        CREATE OR REPLACE FUNCTION bump_products_version()
+        RETURNS TRIGGER
+        LANGUAGE plpgsql
+        SECURITY DEFINER  -- clients never write the counter directly (see RLS below)
+        AS $$
+        BEGIN
+            UPDATE products_version SET version = version + 1 WHERE id = 1;
+            RETURN NULL;
+        END;
+        $$
+        $step$;
+        EXECUTE $step$
+        DROP TRIGGER IF EXISTS trg_products_version ON products
+        $step$;
+        EXECUTE $step$
+        CREATE TRIGGER trg_products_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON products
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_products_version()
+        $step$;
+        EXECUTE $step$
+        ALTER TABLE products_version ENABLE ROW LEVEL SECURITY
+        $step$;
+        EXECUTE $step$
+        DROP POLICY IF EXISTS "Allow public read access to products_version" ON products_version
+        $step$;
+        EXECUTE $step$
+        CREATE POLICY "Allow public read access to products_version" ON products_version
+            FOR SELECT USING (true)
+        $step$;
+        INSERT INTO schema_version (version, name) VALUES (12, 'products_version');
+    END IF;
+END
+$migration$;
 
--- Create policies for user progress (users can only access their own data)
-CREATE POLICY "Users can view own progress" ON user_progress
-    FOR SELECT USING (true); -- For demo purposes, allow all reads
+-- 013_user_progress_partitions_from_default
+DO $migration$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM schema_version WHERE version = 13) THEN
+        EXECUTE $step$
+        CREATE OR REPLACE FUNCTION create_user_progress_partitions(p_from DATE DEFAULT NULL, p_months_ahead INT DEFAULT 3)
+        RETURNS INT
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            v_month DATE := date_trunc('month', COALESCE(p_from, now()))::date;
+            v_last DATE := (date_trunc('month', now()) + make_interval(months => p_months_ahead))::date;
+            v_next DATE;
+            v_name TEXT;
+            v_created INT := 0;
+        BEGIN
+            WHILE v_month <= v_last LOOP
+                v_name := 'user_progress_' || to_char(v_month, 'YYYY_MM');
+                v_next := (v_month + INTERVAL '1 month')::date;
+                IF to_regclass(v_name) IS NULL THEN
+                    EXECUTE format('CREATE TABLE %I (LIKE user_progress INCLUDING DEFAULTS)', v_name);
+                    -- Moved rows don't pass through user_progress, so the summary trigger doesn't count them again
+                    EXECUTE format('WITH moved AS (DELETE FROM user_progress_default WHERE timestamp >= %L AND timestamp < %L RETURNING *) '
+                                   'INSERT INTO %I SELECT * FROM moved', v_month, v_next, v_name);
+                    EXECUTE format('ALTER TABLE user_progress ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                                   v_name, v_month, v_next);
+                    v_created := v_created + 1;
+                END IF;
+                v_month := v_next;
+            END LOOP;
+            RETURN v_created;
+        END;
+        $$
+        $step$;
+        INSERT INTO schema_version (version, name) VALUES (13, 'user_progress_partitions_from_default');
+    END IF;
+END
+$migration$;
 
-CREATE POLICY "Users can insert own progress" ON user_progress
-    FOR INSERT WITH CHECK (true); -- For demo purposes, allow all inserts
\ No newline at end of file
+-- 014_product_name_index
+DO $migration$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM schema_version WHERE version = 14) THEN
+        EXECUTE $step$
+        CREATE INDEX IF NOT EXISTS idx_products_name ON products(name)
+        $step$;
+        INSERT INTO schema_version (version, name) VALUES (14, 'product_name_index');
+    END IF;
+END
+$migration$;
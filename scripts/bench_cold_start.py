@@ -0,0 +1,93 @@
+"""
+Cold-start regression benchmark: time from a fresh interpreter to the first
+rendered page of app/main.py (imports included), measured with Streamlit's AppTest.
+
+    python scripts/bench_cold_start.py [--runs N] [--page PAGE] [--save-baseline]
+
+Each run is a separate process, so nothing is cached between runs. The median is
+compared with the baseline stored in scripts/cold_start_baseline.json (written by
+--save-baseline); the exit status is 1 when it is more than --tolerance slower, or
+above --budget seconds if one is given, so the check can run in CI.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+BASELINE_FILE = Path(__file__).resolve().parent / "cold_start_baseline.json"
+
+# Runs in the child process; prints the seconds until the page finished rendering
+_CHILD = """
+import sys, time, json
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({app!r}, default_timeout=120)
+app.session_state["navigation_radio"] = {page!r}
+app.run()
+elapsed = time.perf_counter() - start
+errors = [str(e.value) for e in app.exception] + [e.value for e in app.error]
+print(json.dumps({{"seconds": elapsed, "errors": errors, "modules": sorted(sys.modules)}}))
+"""
+
+# Modules the Home page must not load (the analysis stack loads in the background warm-up;
+# streamlit itself imports plotly's lazy graph_objects shell, but not plotly.express)
+LAZY_MODULES = ("pandas", "plotly.express", "supabase", "sqlalchemy", "tensorflow")
+
+
+def cold_start(page: str) -> dict:
+    code = _CHILD.format(app=str(ROOT_DIR / "app" / "main.py"), page=page)
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, capture_output=True, text=True,
+                          env=dict(os.environ, PYTHONPATH=str(ROOT_DIR)))
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark app/main.py cold start time.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to time (default: 5)")
+    parser.add_argument("--page", default="🏠 Home", help="navigation entry to render (default: Home)")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs. baseline (default: 0.2)")
+    parser.add_argument("--budget", type=float, default=None, help="fail if the median exceeds this many seconds")
+    parser.add_argument("--save-baseline", action="store_true", help=f"store the median in {BASELINE_FILE.name}")
+    args = parser.parse_args(argv)
+
+    results = [cold_start(args.page) for _ in range(args.runs)]
+    for result in results:
+        if result["errors"]:
+            print(f"❌ Page raised: {result['errors']}")
+            return 1
+    times = [result["seconds"] for result in results]
+    median = statistics.median(times)
+    print(f"{args.page}: median {median:.2f}s, min {min(times):.2f}s, max {max(times):.2f}s over {args.runs} runs")
+
+    failed = False
+    if args.page == "🏠 Home":
+        loaded = [name for name in LAZY_MODULES
+                  if any(m == name or m.startswith(name + ".") for m in results[0]["modules"])]
+        if loaded:
+            print(f"❌ Heavy modules loaded before the first page rendered: {', '.join(loaded)}")
+            failed = True
+
+    baselines = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+    if args.save_baseline:
+        baselines[args.page] = round(median, 3)
+        BASELINE_FILE.write_text(json.dumps(baselines, indent=2, ensure_ascii=False) + "\n")
+        print(f"✅ Saved baseline {median:.2f}s")
+    elif args.page in baselines:
+        limit = baselines[args.page] * (1 + args.tolerance)
+        if median > limit:
+            print(f"❌ Regression: {median:.2f}s vs. baseline {baselines[args.page]:.2f}s (limit {limit:.2f}s)")
+            failed = True
+    if args.budget is not None and median > args.budget:
+        print(f"❌ Over budget: {median:.2f}s > {args.budget:.2f}s")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Import-time profile of the app's startup and of each page's lazy imports:
+
+    python scripts/profile_imports.py [--top N] [target ...]
+
+Each target is imported in a fresh interpreter under `python -X importtime` with
+the modules of STARTUP already loaded (they are paid for once per process
+anyway). The report shows the total import time and the top-level packages that
+cost the most, so a heavy dependency creeping into the startup path is obvious.
+Targets are names from PAGE_IMPORTS or arbitrary module names; default: all pages.
+"""
+import os
+import sys
+import argparse
+import subprocess
+from collections import defaultdict
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# What app/main.py imports before the first page renders, and what each page adds
+STARTUP = ("streamlit",)
+PAGE_IMPORTS = {
+    "startup": STARTUP,
+    "skin_analysis": (
+        "src.analysis.analyzers", "src.analysis.scheduler", "src.analysis.result_cache",
+        "src.analysis.preprocessing", "src.database.progress_writer",
+    ),
+    "recommendations": ("pandas", "src.database.product_index", "src.recommendation.recommender"),
+    "progress": ("pandas", "plotly.express", "src.database.db_client", "src.analysis.timeseries"),
+}
+
+
+def profile(modules, preload=()) -> dict:
+    """
+    Imports `modules` in a fresh interpreter with -X importtime (after `preload`,
+    which is not counted) and returns {'total_ms', 'packages': {package: ms}},
+    where a package's time is the self time of all its submodules.
+    """
+    marker = "-- profile_imports: preload done --"
+    code = "".join(f"import {m}\n" for m in preload)
+    code += f"import sys\nsys.stderr.write({marker!r} + '\\n')\nsys.stderr.flush()\n"
+    code += "".join(f"import {m}\n" for m in modules)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT_DIR), os.environ.get("PYTHONPATH")])))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    # Everything logged before the marker belongs to the preload
+    lines = proc.stderr.splitlines()
+    lines = lines[lines.index(marker) + 1:]
+    packages = defaultdict(float)
+    for line in lines:
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _cumulative, name = line[len("import time:"):].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us) / 1000
+    return {"total_ms": sum(packages.values()), "packages": dict(packages)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Profile import time of the app startup and pages.")
+    parser.add_argument("targets", nargs="*", help=f"pages ({', '.join(PAGE_IMPORTS)}) or module names")
+    parser.add_argument("--top", type=int, default=10, help="packages listed per target (default: 10)")
+    args = parser.parse_args(argv)
+
+    for target in args.targets or PAGE_IMPORTS:
+        modules = PAGE_IMPORTS.get(target, (target,))
+        preload = () if target == "startup" else STARTUP
+        report = profile(modules, preload)
+        print(f"\n{target}: {report['total_ms']:.0f} ms" + (" (on top of startup)" if preload else ""))
+        ranked = sorted(report["packages"].items(), key=lambda item: item[1], reverse=True)
+        for package, ms in ranked[:args.top]:
+            print(f"  {ms:8.1f} ms  {package}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+import abc
+import json
+import random
+import hashlib
+import threading
+from pathlib import Path
+
+import numpy as np
+
+import config
+from .batch import StageTimer, analyze_arrays, load_image_array
+from .face import crop_faces, get_face_detector
+
+
+class SkinAnalyzer(abc.ABC):
+    """
+    Interface every analysis backend implements. analyze_batch takes a stacked
+    (N, H, W, 3) uint8 batch at config.IMG_SIZE, detects faces with `detector`
+    (if any) and returns one result dict per image, in the shape the Streamlit
+    pages expect:
+
+        {'skin_type': {'prediction', 'confidence'},
+         'acne_severity': {'prediction', 'score', 'confidence'},
+         'skin_tone': {'tone', 'confidence'},
+         'oiliness_level': float,
+         'face_detected': bool}
+
+    Backends implement _analyze(batch, faces). Per-stage timings accumulate in `timer`.
+    """
+
+    name = "base"
+    max_batch_size = config.BATCH_SIZE
+    # Bump when the result dicts change shape, so cached results are not reused
+    result_version = 1
+    model_digest = None
+
+    def __init__(self, detector=None):
+        self.detector = detector
+        self.timer = StageTimer()
+
+    def fingerprint(self) -> str:
+        """
+        Identifies what produces this analyzer's results: backend, model file contents,
+        whether faces are detected and the result format. Results cached under another
+        fingerprint must not be reused.
+        """
+        parts = [self.name, self.model_digest, self.detector is not None, self.result_version]
+        return hashlib.blake2b(json.dumps(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+    def analyze_batch(self, batch: np.ndarray) -> list:
+        faces = None
+        if self.detector is not None:
+            with self.timer.stage("detect", len(batch)):
+                faces = self.detector.detect_batch(batch)
+        with self.timer.stage("analyze", len(batch)):
+            results = self._analyze(batch, faces)
+        for i, result in enumerate(results):
+            result['face_detected'] = faces is not None and faces[i] is not None
+        return results
+
+    @abc.abstractmethod
+    def _analyze(self, batch: np.ndarray, faces) -> list:
+        """Returns one result dict per image of `batch` (face_detected is added by analyze_batch)."""
+
+    def analyze(self, image) -> dict:
+        """Analyzes a single image (path, file object or PIL image)."""
+        return self.analyze_batch(load_image_array(image)[np.newaxis])[0]
+
+    def warmup(self):
+        """Runs one dummy batch so the first real request doesn't pay for lazy initialization."""
+        width, height = config.IMG_SIZE
+        self.analyze_batch(np.zeros((1, height, width, 3), dtype=np.uint8))
+
+
+class HeuristicAnalyzer(SkinAnalyzer):
+    """The brightness-based mock analysis (see src/analysis/batch.py)."""
+
+    name = "heuristic"
+
+    def _analyze(self, batch: np.ndarray, faces) -> list:
+        return [
+            {
+                'skin_type': {'prediction': str(row['skin_type']), 'confidence': random.uniform(0.8, 0.95)},
+                'acne_severity': {'prediction': str(row['acne_severity']), 'score': float(row['acne_score']),
+                                  'confidence': random.uniform(0.75, 0.9)},
+                'skin_tone': {'tone': str(row['skin_tone']), 'confidence': random.uniform(0.85, 0.98)},
+                'oiliness_level': float(row['oiliness_level']),
+            }
+            for row in analyze_arrays(batch, faces)
+        ]
+
+
+def _decode_model_outputs(outputs: dict) -> list:
+    """
+    Turns model heads into result dicts. Expected heads (softmax probabilities):
+    skin_type (N, len(SKIN_TYPES)), acne_severity (N, len(ACNE_SEVERITY)),
+    skin_tone (N, len(SKIN_TONES)) and oiliness (N, 1) in [0, 1].
+    """
+    skin_type, acne, tone = outputs["skin_type"], outputs["acne_severity"], outputs["skin_tone"]
+    oiliness = np.asarray(outputs["oiliness"]).reshape(len(skin_type))
+    # Acne score is the expected severity class, scaled to [0, 1]
+    acne_levels = np.arange(acne.shape[1]) / max(acne.shape[1] - 1, 1)
+    acne_score = acne @ acne_levels
+
+    results = []
+    for i in range(len(skin_type)):
+        type_idx, acne_idx, tone_idx = skin_type[i].argmax(), acne[i].argmax(), tone[i].argmax()
+        results.append({
+            'skin_type': {'prediction': config.SKIN_TYPES[type_idx], 'confidence': float(skin_type[i, type_idx])},
+            'acne_severity': {'prediction': config.ACNE_SEVERITY[acne_idx], 'score': float(acne_score[i]),
+                              'confidence': float(acne[i, acne_idx])},
+            'skin_tone': {'tone': config.SKIN_TONES[tone_idx], 'confidence': float(tone[i, tone_idx])},
+            'oiliness_level': float(oiliness[i]),
+        })
+    return results
+
+
+def _file_digest(path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+
+
+def _preprocess(batch: np.ndarray) -> np.ndarray:
+    """uint8 NHWC -> float32 NHWC in [0, 1], the layout the exported Keras models take."""
+    return batch.astype(np.float32) / 255.0
+
+
+class OnnxAnalyzer(SkinAnalyzer):
+    """CPU inference through ONNX Runtime. The session is created once and is thread-safe."""
+
+    name = "onnx"
+
+    def __init__(self, model_path, max_batch_size: int = config.BATCH_SIZE, threads: int = config.INFERENCE_THREADS,
+                 detector=None):
+        super().__init__(detector)
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("OnnxAnalyzer requires onnxruntime (pip install onnxruntime)") from e
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self.model_digest = _file_digest(model_path)
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_names = [o.name for o in self.session.get_outputs()]
+        self.max_batch_size = max_batch_size
+
+    def _analyze(self, batch: np.ndarray, faces) -> list:
+        if faces is not None:
+            batch = crop_faces(batch, faces)
+        results = []
+        for start in range(0, len(batch), self.max_batch_size):
+            inputs = _preprocess(batch[start:start + self.max_batch_size])
+            outputs = self.session.run(self.output_names, {self.input_name: inputs})
+            results.extend(_decode_model_outputs(dict(zip(self.output_names, outputs))))
+        return results
+
+
+class TFLiteAnalyzer(SkinAnalyzer):
+    """
+    CPU inference through a TFLite interpreter (tflite_runtime if installed, else
+    tensorflow.lite). Interpreters are not thread-safe, so calls are serialized.
+    """
+
+    name = "tflite"
+
+    def __init__(self, model_path, max_batch_size: int = config.BATCH_SIZE, threads: int = config.INFERENCE_THREADS,
+                 detector=None):
+        super().__init__(detector)
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        self.interpreter = Interpreter(model_path=str(model_path), num_threads=threads or None)
+        self.model_digest = _file_digest(model_path)
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.outputs = {d["name"].split(":")[0].split("/")[-1]: d["index"]
+                        for d in self.interpreter.get_output_details()}
+        self.max_batch_size = max_batch_size
+        self._lock = threading.Lock()
+        self._batch_size = None
+
+    def _run(self, inputs: np.ndarray) -> dict:
+        with self._lock:
+            if self._batch_size != len(inputs):
+                # Re-allocating tensors is costly, so only do it when the batch size changes
+                self.interpreter.resize_tensor_input(self.input_index, inputs.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_size = len(inputs)
+            self.interpreter.set_tensor(self.input_index, inputs)
+            self.interpreter.invoke()
+            return {name: self.interpreter.get_tensor(index).copy() for name, index in self.outputs.items()}
+
+    def _analyze(self, batch: np.ndarray, faces) -> list:
+        if faces is not None:
+            batch = crop_faces(batch, faces)
+        results = []
+        for start in range(0, len(batch), self.max_batch_size):
+            outputs = self._run(_preprocess(batch[start:start + self.max_batch_size]))
+            results.extend(_decode_model_outputs(outputs))
+        return results
+
+
+def progress_columns(result: dict) -> dict:
+    """The user_progress analysis columns for one analysis result dict."""
+    return {
+        "skin_type": result['skin_type']['prediction'],
+        "acne_severity": result['acne_severity']['score'],
+        "oiliness_level": result['oiliness_level'],
+        "skin_tone": result['skin_tone']['tone'],
+        "confidence_scores": {
+            "skin_type": result['skin_type']['confidence'],
+            "acne": result['acne_severity']['confidence'],
+            "skin_tone": result['skin_tone']['confidence'],
+        },
+    }
+
+
+ANALYZER_BACKENDS = {
+    "heuristic": HeuristicAnalyzer,
+    "onnx": OnnxAnalyzer,
+    "tflite": TFLiteAnalyzer,
+}
+
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+
+def create_analyzer(backend: str = None, model_path=None) -> SkinAnalyzer:
+    """
+    Builds and warms up an analyzer with the shared face detector, falling back to
+    the heuristic if the model can't be loaded.
+    """
+    backend = (backend or config.ANALYZER_BACKEND).lower()
+    model_path = Path(model_path or config.MODEL_PATH)
+    if backend not in ANALYZER_BACKENDS:
+        raise ValueError(f"Unknown analyzer backend: {backend}")
+
+    detector = get_face_detector()
+    if backend == "heuristic":
+        analyzer = HeuristicAnalyzer(detector)
+    else:
+        try:
+            analyzer = ANALYZER_BACKENDS[backend](model_path, detector=detector)
+            print(f"✅ Loaded {backend} skin analysis model from {model_path}")
+        except Exception as e:
+            print(f"⚠️ Could not load {backend} model ({e}), using heuristic analysis")
+            analyzer = HeuristicAnalyzer(detector)
+
+    analyzer.warmup()
+    return analyzer
+
+
+def get_analyzer() -> SkinAnalyzer:
+    """Returns the analyzer shared by every Streamlit session; the model is loaded once per process."""
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                _analyzer = create_analyzer()
+    return _analyzer
@@ -0,0 +1,205 @@
+import time
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+
+import numpy as np
+from PIL import Image
+
+import config
+from .face import get_face_detector, skin_brightness
+from .preprocessing import ImageValidationError, preprocess_image
+
+# Brightness thresholds of the heuristic analysis (mean RGB value, 0-255)
+NORMAL_MIN_BRIGHTNESS = 160
+OILY_MAX_BRIGHTNESS = 80
+TONE_THRESHOLDS = ((170, "Fair"), (140, "Light"), (100, "Medium"))
+ACNE_MILD_SCORE = 0.4
+
+ANALYSIS_DTYPE = np.dtype([
+    ("brightness", np.float64),
+    ("skin_type", "U8"),
+    ("skin_tone", "U8"),
+    ("oiliness_level", np.float64),
+    ("acne_score", np.float64),
+    ("acne_severity", "U8"),
+    ("face_detected", np.bool_),
+    ("error", object),  # why the image couldn't be analyzed (None when it was)
+])
+
+
+class StageTimer:
+    """Accumulates wall time, image counts and failures per pipeline stage (decode, detect, analyze, ...)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seconds = defaultdict(float)
+        self._images = defaultdict(int)
+        self._failed = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name: str, images: int = 1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._seconds[name] += elapsed
+                self._images[name] += images
+
+    def record_failures(self, name: str, images: int):
+        with self._lock:
+            self._failed[name] += images
+
+    def summary(self) -> dict:
+        """{stage: {'total_ms', 'images', 'failed', 'per_image_ms'}}"""
+        with self._lock:
+            return {
+                name: {
+                    "total_ms": seconds * 1000,
+                    "images": self._images[name],
+                    "failed": self._failed[name],
+                    "per_image_ms": seconds * 1000 / self._images[name] if self._images[name] else 0.0,
+                }
+                for name, seconds in self._seconds.items()
+            }
+
+
+def classify_brightness(brightness) -> dict:
+    """
+    Vectorized heuristic: maps an array of mean brightness values to skin type,
+    tone, oiliness and acne score arrays. Single-image analysis uses the same rules.
+    """
+    brightness = np.asarray(brightness, dtype=np.float64)
+    is_normal = brightness > NORMAL_MIN_BRIGHTNESS
+    is_oily = ~is_normal & (brightness < OILY_MAX_BRIGHTNESS)
+
+    acne_score = np.select([is_normal, is_oily], [0.1, 0.6], default=0.2)
+    return {
+        "skin_type": np.select([is_normal, is_oily], ["Normal", "Oily"], default="Dry"),
+        "oiliness_level": np.select([is_normal, is_oily], [0.4, 0.8], default=0.2),
+        "acne_score": acne_score,
+        "acne_severity": np.where(acne_score > ACNE_MILD_SCORE, "Mild", "Clear"),
+        "skin_tone": np.select(
+            [brightness > limit for limit, _ in TONE_THRESHOLDS],
+            [tone for _, tone in TONE_THRESHOLDS],
+            default="Dark",
+        ),
+    }
+
+
+def load_image_array(source, size=config.IMG_SIZE) -> np.ndarray:
+    """
+    Decodes an image (bytes, path, file object or PIL image) to a (H, W, 3) uint8
+    array at `size`. Undecoded sources go through preprocess_image, so they get
+    draft-mode decoding, EXIF orientation and upload validation.
+    """
+    if not isinstance(source, Image.Image):
+        return preprocess_image(source, size).array
+    image = source.convert("RGB")
+    if image.size != tuple(size):
+        image = image.resize(tuple(size), Image.BILINEAR, reducing_gap=2.0)
+    return np.asarray(image, dtype=np.uint8)
+
+
+def _try_load(source, size):
+    try:
+        return load_image_array(source, size), None
+    except (ImageValidationError, OSError) as e:
+        return None, str(e)
+
+
+def load_batch(sources, size=config.IMG_SIZE, max_workers: int = None) -> tuple:
+    """
+    Decodes and downsamples `sources` in a thread pool (PIL releases the GIL while
+    decoding). Returns (batch, errors): the images that decoded, stacked into one
+    (N, H, W, 3) uint8 array in input order, and {input index: message} for those
+    that didn't (corrupt, truncated, unsupported or missing), so one bad file
+    doesn't fail the rest.
+    """
+    sources = list(sources)
+    width, height = size
+    batch = np.empty((len(sources), height, width, 3), dtype=np.uint8)
+    errors = {}
+    loaded = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for i, (array, error) in enumerate(pool.map(lambda s: _try_load(s, size), sources)):
+            if error is None:
+                batch[loaded] = array
+                loaded += 1
+            else:
+                errors[i] = error
+    return batch[:loaded], errors
+
+
+def analyze_arrays(batch: np.ndarray, faces=None) -> np.ndarray:
+    """
+    Runs the heuristic over an (N, H, W, 3) batch and returns a structured array
+    (ANALYSIS_DTYPE). With `faces` (one FaceBox or None per image) only the skin
+    regions of detected faces are measured; otherwise the whole frame is.
+    """
+    if faces is None:
+        brightness = batch.mean(axis=(1, 2, 3), dtype=np.float64)
+    else:
+        brightness = skin_brightness(batch, faces)
+    labels = classify_brightness(brightness)
+
+    results = np.empty(len(batch), dtype=ANALYSIS_DTYPE)
+    results["brightness"] = brightness
+    results["face_detected"] = [face is not None for face in faces] if faces is not None else False
+    for field in ("skin_type", "skin_tone", "oiliness_level", "acne_score", "acne_severity"):
+        results[field] = labels[field]
+    return results
+
+
+def analyze_batch(sources, size=config.IMG_SIZE, max_workers: int = None,
+                  chunk_size: int = None, as_frame: bool = True, timer: StageTimer = None):
+    """
+    Analyzes many images at once. `sources` may be any iterable (e.g. a generator of
+    paths); it is consumed `chunk_size` images at a time (default config.BATCH_SIZE * 8)
+    so memory stays bounded for large archives. Faces are detected per chunk and only
+    their skin regions are analyzed. Images that can't be decoded get a row with
+    `error` set and no scores; the rest are analyzed as usual. Returns a DataFrame, or
+    a structured array when `as_frame` is False; pass a StageTimer to collect
+    per-stage timings and decode failure counts.
+    """
+    chunk_size = chunk_size or config.BATCH_SIZE * 8
+    timer = timer or StageTimer()
+    detector = get_face_detector()
+    iterator = iter(sources)
+    chunks = []
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            break
+        with timer.stage("decode", len(chunk)):
+            batch, errors = load_batch(chunk, size, max_workers)
+        timer.record_failures("decode", len(errors))
+        faces = None
+        if detector is not None and len(batch):
+            with timer.stage("detect", len(batch)):
+                faces = detector.detect_batch(batch)
+        with timer.stage("analyze", len(batch)):
+            analyzed = analyze_arrays(batch, faces)
+
+        results = np.empty(len(chunk), dtype=ANALYSIS_DTYPE)
+        failed = np.zeros(len(chunk), dtype=bool)
+        failed[list(errors)] = True
+        results[~failed] = analyzed
+        for field in ("brightness", "oiliness_level", "acne_score"):
+            results[field][failed] = np.nan
+        for field in ("skin_type", "skin_tone", "acne_severity"):
+            results[field][failed] = ""
+        results["face_detected"][failed] = False
+        results["error"][failed] = [errors[i] for i in sorted(errors)]
+        chunks.append(results)
+
+    results = np.concatenate(chunks) if chunks else np.empty(0, dtype=ANALYSIS_DTYPE)
+    if as_frame:
+        import pandas as pd  # only needed for the DataFrame view
+
+        return pd.DataFrame(results)
+    return results
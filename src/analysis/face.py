@@ -0,0 +1,135 @@
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+import config
+
+FaceBox = namedtuple("FaceBox", ["x", "y", "w", "h"])
+
+# Skin regions as fractions of the face box: (top, bottom, left, right). They avoid the
+# eyes, brows, nose, mouth and hairline, so analysis sees skin rather than features.
+SKIN_REGIONS = {
+    "forehead": (0.08, 0.25, 0.25, 0.75),
+    "left_cheek": (0.50, 0.72, 0.12, 0.36),
+    "right_cheek": (0.50, 0.72, 0.64, 0.88),
+}
+# Margin added around the face box when cropping it for a model backend
+FACE_CROP_MARGIN = 0.15
+
+
+class FaceDetector:
+    """
+    OpenCV Haar cascade face detector. The cascade XML is parsed once; detection runs
+    on the grayscale analysis-size image and returns the largest face. Cascade
+    classifiers are not thread-safe, so calls are serialized (OpenCV still spreads
+    each detection across cores internally).
+    """
+
+    def __init__(self, cascade_path=None, scale_factor: float = 1.1, min_neighbors: int = 5,
+                 min_size_ratio: float = config.FACE_MIN_SIZE_RATIO):
+        try:
+            import cv2
+        except ImportError as e:
+            raise ImportError("FaceDetector requires OpenCV (pip install opencv-python)") from e
+
+        self._cv2 = cv2
+        cascade_path = cascade_path or cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        self.cascade = cv2.CascadeClassifier(str(cascade_path))
+        if self.cascade.empty():
+            raise OSError(f"Could not load face cascade from {cascade_path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size_ratio = min_size_ratio
+        self._lock = threading.Lock()
+
+    def _detect(self, image: np.ndarray):
+        cv2 = self._cv2
+        gray = cv2.equalizeHist(cv2.cvtColor(image, cv2.COLOR_RGB2GRAY))
+        min_edge = max(int(min(gray.shape) * self.min_size_ratio), 1)
+        boxes = self.cascade.detectMultiScale(
+            gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors, minSize=(min_edge, min_edge),
+        )
+        if len(boxes) == 0:
+            return None
+        x, y, w, h = max(boxes, key=lambda box: box[2] * box[3])
+        return FaceBox(int(x), int(y), int(w), int(h))
+
+    def detect(self, image: np.ndarray):
+        """Largest face in an (H, W, 3) uint8 RGB image as a FaceBox, or None."""
+        with self._lock:
+            return self._detect(image)
+
+    def detect_batch(self, batch) -> list:
+        """Faces for every image of an (N, H, W, 3) batch, under a single lock acquisition."""
+        with self._lock:
+            return [self._detect(image) for image in batch]
+
+
+def skin_regions(image: np.ndarray, face) -> dict:
+    """
+    Skin regions of `image` as views (no pixel copies), keyed by SKIN_REGIONS name.
+    Without a face the whole frame is returned as the single region "frame".
+    """
+    if face is None:
+        return {"frame": image}
+    regions = {}
+    for name, (top, bottom, left, right) in SKIN_REGIONS.items():
+        y0, y1 = face.y + int(face.h * top), face.y + int(face.h * bottom)
+        x0, x1 = face.x + int(face.w * left), face.x + int(face.w * right)
+        region = image[max(y0, 0):max(y1, 0), max(x0, 0):max(x1, 0)]
+        if region.size:
+            regions[name] = region
+    return regions or {"frame": image}
+
+
+def skin_brightness(batch: np.ndarray, faces) -> np.ndarray:
+    """Mean RGB value over each image's skin regions (the whole frame where no face was found)."""
+    brightness = np.empty(len(batch), dtype=np.float64)
+    for i, (image, face) in enumerate(zip(batch, faces)):
+        regions = skin_regions(image, face).values()
+        total = sum(float(region.sum(dtype=np.uint64)) for region in regions)
+        brightness[i] = total / sum(region.size for region in regions)
+    return brightness
+
+
+def crop_faces(batch: np.ndarray, faces, margin: float = FACE_CROP_MARGIN) -> np.ndarray:
+    """
+    Face crops (with `margin`) resized back to the batch's image size, for model
+    backends that take a whole image. Images without a face are passed through.
+    """
+    import cv2
+
+    height, width = batch.shape[1:3]
+    crops = batch.copy() if any(face is not None for face in faces) else batch
+    for i, face in enumerate(faces):
+        if face is None:
+            continue
+        pad_x, pad_y = int(face.w * margin), int(face.h * margin)
+        x0, y0 = max(face.x - pad_x, 0), max(face.y - pad_y, 0)
+        x1, y1 = min(face.x + face.w + pad_x, width), min(face.y + face.h + pad_y, height)
+        crops[i] = cv2.resize(batch[i, y0:y1, x0:x1], (width, height), interpolation=cv2.INTER_AREA)
+    return crops
+
+
+_face_detector = None
+_face_detector_loaded = False
+_face_detector_lock = threading.Lock()
+
+
+def get_face_detector():
+    """
+    Returns the process-wide FaceDetector, or None when face detection is disabled
+    (FACE_DETECTION=false) or OpenCV is unavailable, in which case the whole frame is analyzed.
+    """
+    global _face_detector, _face_detector_loaded
+    if not _face_detector_loaded:
+        with _face_detector_lock:
+            if not _face_detector_loaded:
+                if config.FACE_DETECTION:
+                    try:
+                        _face_detector = FaceDetector()
+                    except Exception as e:
+                        print(f"⚠️ Could not load face detector ({e}), analyzing whole images")
+                _face_detector_loaded = True
+    return _face_detector
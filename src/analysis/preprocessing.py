@@ -0,0 +1,91 @@
+import io
+import os
+import time
+
+import numpy as np
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+import config
+
+ALLOWED_FORMATS = {"JPEG", "PNG", "WEBP"}
+
+
+class ImageValidationError(ValueError):
+    """Raised for uploads that are too large, corrupt or not a supported image format."""
+
+
+class PreprocessedImage:
+    """An analysis-ready (H, W, 3) uint8 array plus facts about the source image."""
+
+    __slots__ = ("array", "original_size", "format", "decode_ms")
+
+    def __init__(self, array, original_size, format, decode_ms):
+        self.array = array
+        self.original_size = original_size
+        self.format = format
+        self.decode_ms = decode_ms
+
+
+def _source_size(source):
+    """Byte size of bytes, a path or a seekable file object (None if unknown)."""
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    if hasattr(source, "seek") and hasattr(source, "tell"):
+        position = source.tell()
+        source.seek(0, os.SEEK_END)
+        size = source.tell()
+        source.seek(position)
+        return size
+    return None
+
+
+def preprocess_image(source, size=config.IMG_SIZE, max_bytes: int = config.MAX_UPLOAD_BYTES,
+                     max_pixels: int = config.MAX_IMAGE_PIXELS) -> PreprocessedImage:
+    """
+    Decodes an upload (bytes, path or file object) straight to the analysis size.
+
+    Cheap checks run before any pixel is decoded: byte size, format and pixel count
+    (read from the header). JPEGs are then decoded with draft mode, letting libjpeg
+    produce a 1/2-1/8 scale image directly, so a 12MP selfie never exists at full
+    resolution in memory. EXIF orientation is applied before resizing to `size`.
+    """
+    start = time.perf_counter()
+    byte_size = _source_size(source)
+    if byte_size is not None and byte_size > max_bytes:
+        raise ImageValidationError(
+            f"Image is {byte_size / 2**20:.1f} MB; the limit is {max_bytes / 2**20:.0f} MB"
+        )
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    try:
+        image = Image.open(source)
+        source_format = image.format
+        if source_format not in ALLOWED_FORMATS:
+            raise ImageValidationError(f"Unsupported image format: {source_format}")
+        width, height = image.size
+        if width * height > max_pixels:
+            raise ImageValidationError(f"Image is {width}x{height}; the limit is {max_pixels / 1e6:.0f} megapixels")
+
+        # Draft mode only ever scales down by a power of two, never below the request.
+        # Ask for the longer edge on both axes so an EXIF rotation can't leave it short.
+        edge = max(size)
+        image.draft("RGB", (edge, edge))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGB")
+        if image.size != tuple(size):
+            image = image.resize(tuple(size), Image.BILINEAR, reducing_gap=2.0)
+        array = np.asarray(image, dtype=np.uint8)
+    except ImageValidationError:
+        raise
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError, ValueError) as e:
+        raise ImageValidationError(f"Could not read image: {e}") from e
+
+    return PreprocessedImage(
+        array=array,
+        original_size=(width, height),
+        format=source_format,
+        decode_ms=(time.perf_counter() - start) * 1000,
+    )
@@ -0,0 +1,174 @@
+"""
+Offline re-analysis of every stored progress image, e.g. after the analyzer changed:
+
+    python -m src.analysis.reanalyze --image-root DIR [--workers N] [--chunk-size N]
+                                     [--checkpoint FILE] [--restart]
+
+Progress rows with an image_path are streamed from the database in id order, split
+into chunks and analyzed in a process pool (one analyzer per worker process, loaded
+once). Results are written back with bulk updates, in id order, and the affected
+users' summaries are rebuilt. The last written id is checkpointed to a JSON file, so
+an interrupted run resumes where it stopped; --restart starts over. On Supabase the
+job needs the service-role key (SUPABASE_KEY) to update progress rows. With a model
+backend, set INFERENCE_THREADS=1 so the worker processes don't oversubscribe the cores.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import config
+from ..database.db_client import get_db_client
+from .analyzers import create_analyzer, progress_columns
+from .batch import load_image_array
+from .preprocessing import ImageValidationError
+
+DEFAULT_CHECKPOINT = config.DATA_DIR / "reanalyze_checkpoint.json"
+# Chunks written between checkpoints (each checkpoint also rebuilds summaries)
+CHECKPOINT_EVERY = 20
+
+_analyzer = None
+
+
+def _init_worker(backend: str, model_path: str):
+    """Process-pool initializer: loads the analyzer once per worker process."""
+    global _analyzer
+    _analyzer = create_analyzer(backend, model_path)
+
+
+def _analyze_chunk(rows: list, image_root: str) -> tuple:
+    """
+    Worker task: decodes and analyzes one chunk of progress rows as a single batch.
+    Returns (updates, failures), failures being (id, image_path, reason) tuples for
+    images that are missing or can't be decoded.
+    """
+    arrays, decoded, failures = [], [], []
+    for row in rows:
+        path = Path(image_root) / row["image_path"]
+        try:
+            arrays.append(load_image_array(path))
+            decoded.append(row)
+        except (OSError, ImageValidationError) as e:
+            failures.append((row["id"], row["image_path"], str(e)))
+    if not arrays:
+        return [], failures
+    results = _analyzer.analyze_batch(np.stack(arrays))
+    return [{"id": row["id"], **progress_columns(result)} for row, result in zip(decoded, results)], failures
+
+
+def load_checkpoint(path) -> dict:
+    path = Path(path)
+    if not path.exists():
+        return {"last_id": 0, "updated": 0, "failed": 0}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, state: dict):
+    """Writes the checkpoint atomically (temp file + rename), so a crash never leaves it half-written."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def _chunks(rows, size: int):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def reanalyze(image_root, workers: int = None, chunk_size: int = config.BATCH_SIZE,
+              checkpoint=DEFAULT_CHECKPOINT, restart: bool = False,
+              backend: str = None, model_path=None, checkpoint_every: int = CHECKPOINT_EVERY) -> dict:
+    """
+    Re-analyzes every progress image after the checkpointed id and returns the final
+    checkpoint state ({'last_id', 'updated', 'failed'}). At most 2 chunks per worker
+    are in flight, so memory stays bounded however many rows there are.
+    """
+    db = get_db_client()
+    workers = workers or os.cpu_count() or 1
+    state = {"last_id": 0, "updated": 0, "failed": 0} if restart else load_checkpoint(checkpoint)
+    if state["last_id"]:
+        print(f"↩️ Resuming after progress row {state['last_id']}")
+
+    users = set()
+    done = since_checkpoint = 0
+    start = time.perf_counter()
+
+    def _checkpoint():
+        nonlocal since_checkpoint
+        db.rebuild_user_summaries(users)
+        users.clear()
+        save_checkpoint(checkpoint, state)
+        since_checkpoint = 0
+        elapsed = time.perf_counter() - start
+        print(f"   {done} images in {elapsed:.1f}s ({done / elapsed if elapsed else 0.0:.1f} images/sec), "
+              f"last id {state['last_id']}")
+
+    def _write(chunk, future):
+        nonlocal done, since_checkpoint
+        updates, failures = future.result()
+        db.update_progress_analyses(updates)
+        for row_id, image_path, reason in failures:
+            print(f"⚠️ Skipped progress row {row_id} ({image_path}): {reason}")
+        users.update(row["user_id"] for row in chunk)
+        state["last_id"] = chunk[-1]["id"]
+        state["updated"] += len(updates)
+        state["failed"] += len(failures)
+        done += len(chunk)
+        since_checkpoint += 1
+        if since_checkpoint >= checkpoint_every:
+            _checkpoint()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(backend, model_path and str(model_path))) as pool:
+        pending = deque()
+        rows = db.iter_progress_images(state["last_id"], batch_size=chunk_size * workers)
+        for chunk in _chunks(rows, chunk_size):
+            pending.append((chunk, pool.submit(_analyze_chunk, chunk, str(image_root))))
+            # Results are written in submission (id) order, so the checkpoint never skips rows
+            while len(pending) >= 2 * workers or (pending and pending[0][1].done()):
+                _write(*pending.popleft())
+        while pending:
+            _write(*pending.popleft())
+    _checkpoint()
+    return state
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Re-analyze every stored progress image and update the results.")
+    parser.add_argument("--image-root", default=".", help="directory user_progress.image_path is relative to")
+    parser.add_argument("--workers", type=int, default=None, help="analysis processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=config.BATCH_SIZE, help="images per analysis batch")
+    parser.add_argument("--checkpoint", default=str(DEFAULT_CHECKPOINT), help="JSON file recording progress")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first row")
+    parser.add_argument("--backend", default=None, help="analyzer backend (default: ANALYZER_BACKEND)")
+    parser.add_argument("--model-path", default=None, help="model file (default: MODEL_PATH)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    state = reanalyze(
+        args.image_root, workers=args.workers, chunk_size=args.chunk_size, checkpoint=args.checkpoint,
+        restart=args.restart, backend=args.backend, model_path=args.model_path,
+    )
+    print(f"✅ Re-analysis done in {time.perf_counter() - start:.1f}s: "
+          f"{state['updated']} rows updated, {state['failed']} skipped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
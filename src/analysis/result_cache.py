@@ -0,0 +1,181 @@
+import io
+import os
+import re
+import json
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+import config
+
+THUMBNAIL_SIZE = (128, 128)
+# Names the cache writes under its root: digests (files) and analyzer fingerprints (directories)
+_CACHE_NAME = re.compile(r"[0-9a-f]{32}(\.json)?")
+
+
+def image_digest(data: bytes) -> str:
+    """Content address of an uploaded image: a 128-bit BLAKE2b hash of its raw bytes."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def make_thumbnail(data: bytes, size=THUMBNAIL_SIZE) -> bytes:
+    """
+    Small JPEG preview of an uploaded image, decoded at reduced resolution where possible
+    and turned upright by its EXIF orientation (as preprocess_image does).
+    """
+    image = Image.open(io.BytesIO(data))
+    # Longer edge on both axes, so a 90-degree EXIF rotation can't leave the draft short
+    edge = max(size)
+    image.draft("RGB", (edge, edge))
+    image = ImageOps.exif_transpose(image)
+    image = image.convert("RGB")
+    image.thumbnail(size)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
+
+
+class AnalysisCache:
+    """
+    Content-addressed cache of analysis results keyed on image_digest().
+
+    A bounded in-memory LRU sits in front of an optional on-disk store (one small
+    JSON file per digest under `cache_dir`) that survives restarts. The disk store
+    is bounded too: once it holds more than `max_disk_entries` files, the least
+    recently used tenth is removed.
+
+    Results depend on the analyzer as well as the image, so the disk store lives in a
+    subdirectory named after `namespace` (the analyzer's fingerprint); stores of other
+    fingerprints are deleted when the cache opens.
+    """
+
+    def __init__(self, max_entries: int = config.ANALYSIS_CACHE_SIZE, cache_dir=config.ANALYSIS_CACHE_DIR,
+                 max_disk_entries: int = config.ANALYSIS_CACHE_DISK_ENTRIES, namespace: str = None):
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir and namespace:
+            _remove_stale_stores(self.cache_dir, namespace)
+            self.cache_dir = self.cache_dir / namespace
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._disk_count = 0
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_count = sum(1 for _ in self.cache_dir.glob("*.json"))
+
+    def _path(self, digest: str) -> Path:
+        return self.cache_dir / f"{digest}.json"
+
+    def get(self, digest: str):
+        with self._lock:
+            result = self._entries.get(digest)
+            if result is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return result
+
+        result = self._read_disk(digest)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(digest, result)
+        return result
+
+    def put(self, digest: str, result: dict):
+        with self._lock:
+            self._remember(digest, result)
+        self._write_disk(digest, result)
+
+    def _remember(self, digest: str, result: dict):
+        self._entries[digest] = result
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_disk(self, digest: str):
+        if not self.cache_dir:
+            return None
+        path = self._path(digest)
+        try:
+            with open(path) as f:
+                result = json.load(f)
+            os.utime(path)  # mtime doubles as the disk LRU clock
+            return result
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, digest: str, result: dict):
+        if not self.cache_dir:
+            return
+        path = self._path(digest)
+        is_new = not path.exists()
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+        if is_new:
+            with self._lock:
+                self._disk_count += 1
+                over_limit = self._disk_count > self.max_disk_entries
+            if over_limit:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        files = sorted(self.cache_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        excess = len(files) - self.max_disk_entries + self.max_disk_entries // 10
+        for path in files[:max(excess, 0)]:
+            path.unlink(missing_ok=True)
+        with self._lock:
+            self._disk_count = len(files) - max(excess, 0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "disk_entries": self._disk_count,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def _remove_stale_stores(root: Path, namespace: str):
+    """Deletes the results of other analyzer configurations (and of the unversioned layout) under `root`."""
+    if not root.is_dir():
+        return
+    for path in root.iterdir():
+        if path.name == namespace or not _CACHE_NAME.fullmatch(path.name):
+            continue
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+
+
+_analysis_cache = None
+_analysis_cache_lock = threading.Lock()
+
+
+def get_analysis_cache() -> AnalysisCache:
+    """
+    Returns the analysis cache shared by every Streamlit session in this process,
+    scoped to the fingerprint of the process-wide analyzer (loaded here if needed).
+    """
+    global _analysis_cache
+    if _analysis_cache is None:
+        from .analyzers import get_analyzer
+
+        with _analysis_cache_lock:
+            if _analysis_cache is None:
+                _analysis_cache = AnalysisCache(namespace=get_analyzer().fingerprint())
+    return _analysis_cache
@@ -0,0 +1,153 @@
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
+import numpy as np
+
+import config
+from .analyzers import get_analyzer
+from .batch import load_image_array
+
+
+class _Job:
+    __slots__ = ("array", "future", "enqueued_at")
+
+    def __init__(self, array):
+        self.array = array
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class BatchScheduler:
+    """
+    Process-wide dynamic micro-batcher for analysis requests.
+
+    Jobs from every Streamlit session go into one queue. A single worker thread
+    takes the oldest job, keeps collecting until it has `max_batch_size` jobs or the
+    oldest one has waited `max_wait_ms`, runs the analyzer once on the stacked batch
+    and resolves each job's future. Images are decoded in the submitting thread, so
+    decoding stays parallel and only inference is batched.
+    """
+
+    def __init__(self, analyzer=None, max_batch_size: int = config.SCHEDULER_MAX_BATCH,
+                 max_wait_ms: float = config.SCHEDULER_MAX_WAIT_MS, latency_window: int = 1000):
+        self.analyzer = analyzer or get_analyzer()
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)
+        self._batch_sizes = Counter()
+        self._completed = 0
+        self._failed = 0
+        self._closing = False
+        # Orders submits against shutdown, so no job is queued behind the stop sentinel
+        self._submit_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="analysis-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, image) -> Future:
+        """Queues one image (path, file object, PIL image or IMG_SIZE array); returns a Future of its result dict."""
+        if self._closing:
+            raise RuntimeError("BatchScheduler has been shut down")
+        if isinstance(image, np.ndarray):
+            array = image
+        else:
+            with self.analyzer.timer.stage("decode"):
+                array = load_image_array(image)
+        job = _Job(array)
+        with self._submit_lock:
+            if self._closing:
+                raise RuntimeError("BatchScheduler has been shut down")
+            self._queue.put(job)
+        return job.future
+
+    def analyze(self, image, timeout: float = None) -> dict:
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(image).result(timeout)
+
+    def _collect(self) -> list:
+        first = self._queue.get()
+        if first is None:
+            self._stopped.set()
+            return []
+        jobs = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(jobs) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                self._stopped.set()  # finish this batch, then exit
+                break
+            jobs.append(job)
+        return jobs
+
+    def _run(self):
+        while not self._stopped.is_set():
+            jobs = self._collect()
+            if not jobs:
+                break
+            try:
+                results = self.analyzer.analyze_batch(np.stack([job.array for job in jobs]))
+            except Exception as e:
+                for job in jobs:
+                    job.future.set_exception(e)
+                with self._lock:
+                    self._failed += len(jobs)
+                    self._batch_sizes[len(jobs)] += 1
+                continue
+
+            done_at = time.perf_counter()
+            for job, result in zip(jobs, results):
+                job.future.set_result(result)
+            with self._lock:
+                self._completed += len(jobs)
+                self._batch_sizes[len(jobs)] += 1
+                self._latencies.extend(done_at - job.enqueued_at for job in jobs)
+
+    def metrics(self) -> dict:
+        """Queue depth, batch-size histogram, request latency percentiles and per-stage timings (ms) for tuning."""
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            histogram = dict(sorted(self._batch_sizes.items()))
+            completed, failed = self._completed, self._failed
+        batches = sum(histogram.values())
+        return {
+            "queue_depth": self._queue.qsize(),
+            "completed": completed,
+            "failed": failed,
+            "batches": batches,
+            "mean_batch_size": (completed + failed) / batches if batches else 0.0,
+            "batch_size_histogram": histogram,
+            "latency_p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+            "latency_p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+            "stages": self.analyzer.timer.summary(),
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Stops accepting work; jobs already queued are still processed."""
+        with self._submit_lock:
+            self._closing = True
+            self._queue.put(None)
+        if wait:
+            self._worker.join()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> BatchScheduler:
+    """Returns the scheduler shared by every Streamlit session in this process."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = BatchScheduler()
+    return _scheduler
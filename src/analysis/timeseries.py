@@ -0,0 +1,47 @@
+import numpy as np
+
+# Upper bound on the points sent to a progress chart, whatever the history length
+MAX_CHART_POINTS = 300
+
+
+def lttb_indices(x, y, threshold: int = MAX_CHART_POINTS) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling. Returns the indices of at most
+    `threshold` points of (x, y) that keep the visual shape of the series: the
+    first and last points always, plus, for each of `threshold - 2` equal buckets,
+    the point forming the largest triangle with the previously kept point and the
+    mean of the next bucket. `x` must be sorted; datetimes are accepted.
+    """
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype("datetime64[ns]").astype(np.int64)
+    x = x.astype(np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_end = edges[i + 2]
+            next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+
+        px, py = x[previous], y[previous]
+        areas = np.abs((px - next_x) * (y[start:end] - py) - (px - x[start:end]) * (next_y - py))
+        previous = start + int(np.argmax(areas))
+        indices[i + 1] = previous
+    return indices
+
+
+def downsample_frame(df, x: str, y: str, threshold: int = MAX_CHART_POINTS):
+    """Returns the rows of `df` (sorted by `x`) that LTTB keeps for plotting `y` against `x`."""
+    if len(df) <= threshold:
+        return df
+    return df.iloc[lttb_indices(df[x].to_numpy(), df[y].to_numpy(), threshold)]
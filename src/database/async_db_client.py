@@ -0,0 +1,288 @@
+"""
+asyncio variant of DatabaseClient for async servers (e.g. app/api.py handlers that
+should not hold a thread per query).
+
+SQLite goes through SQLAlchemy's async engine (aiosqlite driver) with the same pool
+settings as the sync engine; Supabase goes through postgrest's async client, one
+pooled HTTP/2 session per process. Every operation also takes a slot of a semaphore
+(ASYNC_DB_MAX_CONCURRENCY), so thousands of in-flight requests queue in the event
+loop and share a handful of connections instead of piling up on the pool.
+
+Queries, filters and row conversions are shared with db_client, so both clients
+return identical rows (and share the product cache).
+"""
+import os
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from .db_client import (
+    DATABASE_URL,
+    DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    INSERT_PROGRESS_SQL,
+    PROGRESS_BUCKETS,
+    SUPABASE_KEY,
+    SUPABASE_URL,
+    _apply_supabase_product_filters,
+    _decode_progress_row,
+    _is_sqlite_memory,
+    _progress_buckets_sql,
+    _progress_insert_rows,
+    _progress_query,
+    _sqlite_product_filters,
+    _summary_row,
+    _supabase_progress_query,
+    _top_products_query,
+    _top_products_rpc_params,
+    bootstrap_schema,
+    product_cache,
+)
+from .query_cache import bucketed_filters, canonical_filters
+
+ASYNC_DB_MAX_CONCURRENCY = int(os.getenv("ASYNC_DB_MAX_CONCURRENCY", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+
+# Async drivers for the sync URL schemes DATABASE_URL may use
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+_registry_lock = threading.RLock()
+_async_engines = {}
+_async_supabase_client = None
+_async_db_client = None
+
+
+def async_database_url(url: str) -> str:
+    """Rewrites a sync SQLAlchemy URL to its async driver (sqlite:///x.db -> sqlite+aiosqlite:///x.db)."""
+    scheme, sep, rest = url.partition("://")
+    if "+" in scheme:
+        scheme = scheme.split("+", 1)[0]
+    if scheme not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {scheme} URLs")
+    return f"{ASYNC_DRIVERS[scheme]}{sep}{rest}"
+
+
+def _build_async_engine(url: str) -> AsyncEngine:
+    if _is_sqlite_memory(url):
+        # Every pooled aiosqlite connection would see its own empty database
+        raise ValueError("AsyncDatabaseClient needs a file-based database, not in-memory SQLite")
+    # aiosqlite defaults to NullPool (a new connection per checkout); pool explicitly
+    engine = create_async_engine(
+        async_database_url(url),
+        poolclass=AsyncAdaptedQueuePool,
+        pool_pre_ping=True,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+
+    if url.startswith("sqlite"):
+        @event.listens_for(engine.sync_engine, "connect")
+        def _on_connect(dbapi_conn, _record):
+            # Same pragmas as the sync engine: WAL lets readers run next to the writer
+            cursor = dbapi_conn.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA foreign_keys=ON")
+            cursor.close()
+
+    return engine
+
+
+def get_async_engine(url: str = None) -> AsyncEngine:
+    """
+    Returns the pooled async engine for `url`, creating it on first use. An async
+    engine's connections belong to the event loop that opened them, so use one
+    event loop per process (as uvicorn does).
+    """
+    url = url or DATABASE_URL
+    engine = _async_engines.get(url)
+    if engine is None:
+        with _registry_lock:
+            engine = _async_engines.get(url)
+            if engine is None:
+                engine = _async_engines[url] = _build_async_engine(url)
+    return engine
+
+
+def get_async_supabase_client():
+    """Returns the process-wide async PostgREST client (one pooled HTTP/2 session)."""
+    global _async_supabase_client
+    if _async_supabase_client is None:
+        from postgrest import AsyncPostgrestClient
+
+        with _registry_lock:
+            if _async_supabase_client is None:
+                _async_supabase_client = AsyncPostgrestClient(
+                    f"{SUPABASE_URL}/rest/v1",
+                    headers={"apikey": SUPABASE_KEY, "Authorization": f"Bearer {SUPABASE_KEY}"},
+                )
+    return _async_supabase_client
+
+
+def get_async_db_client() -> "AsyncDatabaseClient":
+    """Returns the AsyncDatabaseClient shared by every request in this process."""
+    global _async_db_client
+    if _async_db_client is None:
+        with _registry_lock:
+            if _async_db_client is None:
+                _async_db_client = AsyncDatabaseClient()
+    return _async_db_client
+
+
+class AsyncDatabaseClient:
+    """
+    Awaitable counterparts of the DatabaseClient read paths and progress writes,
+    with the same arguments and results. Maintenance, sync and migration jobs stay
+    on the sync client.
+    """
+
+    def __init__(self, database_url: str = None, max_concurrency: int = ASYNC_DB_MAX_CONCURRENCY):
+        self.use_supabase = bool(SUPABASE_URL and SUPABASE_KEY)
+        self.database_url = database_url or DATABASE_URL
+        self.max_concurrency = max_concurrency
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        if self.use_supabase:
+            self.supabase = get_async_supabase_client()
+            self.engine = None
+        else:
+            self.supabase = None
+            self.engine = get_async_engine(self.database_url)
+            # One-time, blocking schema check (shared with the sync client)
+            bootstrap_schema(self.database_url)
+
+    @asynccontextmanager
+    async def _slot(self):
+        """Waits for one of the max_concurrency operation slots."""
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def _connect(self):
+        async with self._slot():
+            async with self.engine.connect() as conn:
+                yield conn
+
+    @asynccontextmanager
+    async def _begin(self):
+        async with self._slot():
+            async with self.engine.begin() as conn:
+                yield conn
+
+    async def _fetch(self, sql: str, params: dict) -> list:
+        async with self._connect() as conn:
+            result = await conn.execute(text(sql), params)
+            return [dict(row._mapping) for row in result]
+
+    async def _execute(self, query):
+        """Runs a PostgREST request builder and returns its rows."""
+        async with self._slot():
+            return (await query.execute()).data
+
+    async def aclose(self):
+        """Closes pooled connections (SQLAlchemy) or the HTTP session (Supabase)."""
+        if self.use_supabase:
+            await self.supabase.aclose()
+        else:
+            await self.engine.dispose()
+
+    def health(self) -> dict:
+        stats = {"backend": "supabase" if self.use_supabase else "sqlalchemy",
+                 "max_concurrency": self.max_concurrency, "waiting": self._waiting,
+                 "product_cache": product_cache.stats()}
+        if not self.use_supabase:
+            stats["pool_status"] = self.engine.pool.status()
+        return stats
+
+    # ----------------- Product Methods -----------------
+    async def get_products_by_criteria(self, filters: dict):
+        """See DatabaseClient.get_products_by_criteria (same cache entries)."""
+        key = ("get_products_by_criteria", self.database_url, self.use_supabase, canonical_filters(filters))
+        rows = product_cache.get(key)
+        if rows is None:
+            rows = await self._query_products_by_criteria(bucketed_filters(filters))
+            product_cache.put(key, rows)
+        max_budget, min_rating = filters.get('max_budget'), filters.get('min_rating')
+        return [
+            row for row in rows
+            if (max_budget is None or row['price'] <= max_budget)
+            and (min_rating is None or row['rating'] >= min_rating)
+        ]
+
+    async def _query_products_by_criteria(self, filters: dict):
+        if self.use_supabase:
+            query = self.supabase.table("products").select("*").is_("deleted_at", "null")
+            return await self._execute(_apply_supabase_product_filters(query, filters))
+        where_clauses, params = _sqlite_product_filters(filters)
+        return await self._fetch(f"SELECT * FROM products WHERE {' AND '.join(where_clauses)}", params)
+
+    async def get_top_products(self, filters: dict, k: int, weights: dict):
+        """See DatabaseClient.get_top_products."""
+        if self.use_supabase:
+            return await self._execute(self.supabase.rpc("recommend_products", _top_products_rpc_params(filters, k, weights)))
+        return await self._fetch(*_top_products_query(filters, k, weights))
+
+    # ----------------- User Progress Methods -----------------
+    async def insert_progress(self, progress_data: dict):
+        """Inserts one progress record (see insert_progress_bulk)."""
+        await self.insert_progress_bulk([progress_data])
+
+    async def insert_progress_bulk(self, records) -> int:
+        """See DatabaseClient.insert_progress_bulk."""
+        rows = _progress_insert_rows(records, self.use_supabase)
+        if not rows:
+            return 0
+        if self.use_supabase:
+            await self._execute(self.supabase.table("user_progress").insert(rows))
+        else:
+            async with self._begin() as conn:
+                await conn.execute(text(INSERT_PROGRESS_SQL), rows)
+        return len(rows)
+
+    async def get_user_progress(self, user_id: str, since=None, until=None, limit: int = None, columns=None):
+        """See DatabaseClient.get_user_progress."""
+        if self.use_supabase:
+            query = self.supabase.table("user_progress")
+            return await self._execute(_supabase_progress_query(query, user_id, since, until, limit, columns))
+        sql, params = _progress_query(user_id, since, until, limit, columns)
+        async with self._connect() as conn:
+            result = await conn.execute(text(sql), params)
+            return [_decode_progress_row(row._mapping) for row in result]
+
+    async def get_user_progress_buckets(self, user_id: str, bucket: str = "day"):
+        """See DatabaseClient.get_user_progress_buckets."""
+        if bucket not in PROGRESS_BUCKETS:
+            raise ValueError(f"bucket must be one of {sorted(PROGRESS_BUCKETS)}")
+        if self.use_supabase:
+            return await self._execute(
+                self.supabase.rpc("user_progress_buckets", {"p_user_id": user_id, "p_bucket": bucket})
+            )
+        return await self._fetch(_progress_buckets_sql(bucket), {"user_id": user_id})
+
+    async def get_user_summary(self, user_id: str):
+        """See DatabaseClient.get_user_summary."""
+        if self.use_supabase:
+            query = self.supabase.table("user_progress_summary").select("*").eq("user_id", user_id)
+            rows = await self._execute(query)
+        else:
+            rows = await self._fetch("SELECT * FROM user_progress_summary WHERE user_id = :user_id",
+                                     {"user_id": user_id})
+        return _summary_row(rows[0]) if rows else None
@@ -1,9 +1,18 @@
 import os
+import re
 import json
-from sqlalchemy import create_engine, text
-from supabase import create_client, Client
+import time
+import hashlib
+from datetime import datetime, timezone
+import threading
+from contextlib import contextmanager
+from itertools import islice
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
 from dotenv import load_dotenv
 
+from .query_cache import QueryCache, bucketed_filters, canonical_filters
+
 # Load env vars
 load_dotenv()
 
@@ -11,192 +20,1338 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./database/skincare.db")
 
+# Connection pool settings (ignored for in-memory SQLite, which is single-connection)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Product read cache, shared by every DatabaseClient in the process
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "256"))
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", "300"))
+# Raw user_progress rows older than this many whole months are rolled up into user_progress_daily
+PROGRESS_RETENTION_MONTHS = int(os.getenv("PROGRESS_RETENTION_MONTHS", "24"))
+# SQLite compaction rolls up and deletes at most this many raw rows per transaction
+PROGRESS_COMPACT_BATCH = int(os.getenv("PROGRESS_COMPACT_BATCH", "5000"))
+
+# Columns accepted when writing products; anything else in the input dict is ignored
+PRODUCT_COLUMNS = (
+    "name", "brand", "category", "skin_type", "concerns", "price", "rating",
+    "description", "ingredients", "purchase_link", "image_url",
+)
+INSERT_PRODUCT_SQL = (
+    f"INSERT INTO products ({', '.join(PRODUCT_COLUMNS)}, content_hash) "
+    f"VALUES ({', '.join(':' + c for c in PRODUCT_COLUMNS)}, :content_hash)"
+)
+UPDATE_PRODUCT_SQL = (
+    f"UPDATE products SET {', '.join(f'{c} = :{c}' for c in PRODUCT_COLUMNS)}, "
+    "content_hash = :content_hash, deleted_at = NULL, updated_at = CURRENT_TIMESTAMP "
+    "WHERE id = :id"
+)
+SOFT_DELETE_PRODUCT_SQL = (
+    "UPDATE products SET deleted_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP WHERE id = :id"
+)
+
+
+# Columns written to user_progress (id is generated; timestamp defaults to now when None)
+PROGRESS_COLUMNS = (
+    "user_id", "skin_type", "acne_severity", "oiliness_level", "skin_tone",
+    "image_path", "confidence_scores", "timestamp",
+)
+INSERT_PROGRESS_SQL = (
+    f"INSERT INTO user_progress ({', '.join(PROGRESS_COLUMNS)}) "
+    f"VALUES ({', '.join(':' + c for c in PROGRESS_COLUMNS[:-1])}, COALESCE(:timestamp, CURRENT_TIMESTAMP))"
+)
+
+# Analysis results stored per progress row, rewritten when images are re-analyzed
+PROGRESS_ANALYSIS_COLUMNS = ("skin_type", "acne_severity", "oiliness_level", "skin_tone", "confidence_scores")
+UPDATE_PROGRESS_ANALYSIS_SQL = (
+    f"UPDATE user_progress SET {', '.join(f'{c} = :{c}' for c in PROGRESS_ANALYSIS_COLUMNS)} WHERE id = :id"
+)
+
+# Columns a progress read may select, and the subset the (user_id, timestamp) index
+# covers, so selecting only these never touches the table
+PROGRESS_READ_COLUMNS = ("id",) + PROGRESS_COLUMNS
+PROGRESS_INDEXED_COLUMNS = (
+    "id", "user_id", "timestamp", "skin_type", "skin_tone", "acne_severity", "oiliness_level",
+)
+
+
+def _progress_select_columns(columns) -> list:
+    if columns is None:
+        return list(PROGRESS_READ_COLUMNS)
+    columns = list(dict.fromkeys(columns))
+    unknown = [col for col in columns if col not in PROGRESS_READ_COLUMNS]
+    if unknown or not columns:
+        raise ValueError(f"Unknown user_progress columns {unknown}; choose from {PROGRESS_READ_COLUMNS}")
+    return columns
+
+
+def _timestamp_param(value):
+    """Normalizes a datetime bound to the 'YYYY-MM-DD HH:MM:SS' UTC form timestamps are stored in."""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+
+# SQLite expressions for the start date of each progress bucket (weeks start on Monday)
+PROGRESS_BUCKETS = {
+    "day": "date(timestamp)",
+    "week": "date(timestamp, '-6 days', 'weekday 1')",
+    "month": "strftime('%Y-%m-01', timestamp)",
+}
+
+# user_progress_summary keeps one row per user. The latest_* values come from the row
+# with the greatest (timestamp, id); averages are *_sum / *_count over non-null values.
+SUMMARY_LATEST_COLUMNS = ("skin_type", "skin_tone", "acne_severity", "oiliness_level")
+SUMMARY_AVERAGED_COLUMNS = ("acne_severity", "oiliness_level")
+
+# A user's history as "events": raw user_progress rows plus the daily rollups that
+# compact_user_progress() leaves behind for expired rows. Both carry sums, counts,
+# min/max and latest_* values, so they aggregate the same way. {where} filters users.
+PROGRESS_EVENTS_SQL = """
+    SELECT user_id, timestamp, id AS seq, 1 AS samples, timestamp AS first_timestamp,
+           skin_type AS latest_skin_type, skin_tone AS latest_skin_tone,
+           acne_severity AS latest_acne_severity, oiliness_level AS latest_oiliness_level,
+           COALESCE(acne_severity, 0) AS acne_severity_sum, acne_severity IS NOT NULL AS acne_severity_count,
+           acne_severity AS acne_severity_min, acne_severity AS acne_severity_max,
+           COALESCE(oiliness_level, 0) AS oiliness_level_sum, oiliness_level IS NOT NULL AS oiliness_level_count,
+           oiliness_level AS oiliness_level_min, oiliness_level AS oiliness_level_max
+    FROM user_progress {where}
+    UNION ALL
+    SELECT user_id, last_timestamp, 0, samples, first_timestamp,
+           latest_skin_type, latest_skin_tone, latest_acne_severity, latest_oiliness_level,
+           acne_severity_sum, acne_severity_count, acne_severity_min, acne_severity_max,
+           oiliness_level_sum, oiliness_level_count, oiliness_level_min, oiliness_level_max
+    FROM user_progress_daily {where}
+"""
+
+# Recomputes summary rows from the progress events; {where} narrows it to some users
+REBUILD_SUMMARY_SQL = """
+    WITH events AS ({events}), latest AS (
+        SELECT * FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY timestamp DESC, seq DESC) AS rn
+            FROM events
+        ) WHERE rn = 1
+    )
+    INSERT OR REPLACE INTO user_progress_summary (
+        user_id, samples, first_timestamp, last_timestamp,
+        latest_skin_type, latest_skin_tone, latest_acne_severity, latest_oiliness_level,
+        acne_severity_sum, acne_severity_count, oiliness_level_sum, oiliness_level_count
+    )
+    SELECT e.user_id, SUM(e.samples), MIN(e.first_timestamp), MAX(e.timestamp),
+           l.latest_skin_type, l.latest_skin_tone, l.latest_acne_severity, l.latest_oiliness_level,
+           TOTAL(e.acne_severity_sum), SUM(e.acne_severity_count),
+           TOTAL(e.oiliness_level_sum), SUM(e.oiliness_level_count)
+    FROM events e JOIN latest l ON l.user_id = e.user_id
+    GROUP BY e.user_id
+"""
+
+
+def _latest_updates_sql(table: str) -> str:
+    """Upsert SET clauses that take latest_* from the incoming row only if it is not older."""
+    is_newer = f"excluded.last_timestamp >= {table}.last_timestamp"
+    return ",\n".join(
+        f"latest_{col} = CASE WHEN {is_newer} THEN excluded.latest_{col} ELSE latest_{col} END"
+        for col in SUMMARY_LATEST_COLUMNS
+    )
+
+
+# Rolls the raw rows in [:start, :end) up into one user_progress_daily row per user and
+# day, merging with a rollup of the same day that may already exist
+ROLLUP_PROGRESS_SQL = f"""
+    WITH ranked AS (
+        SELECT *, date(timestamp) AS day,
+               ROW_NUMBER() OVER (PARTITION BY user_id, date(timestamp) ORDER BY timestamp DESC, id DESC) AS rn
+        FROM user_progress
+        WHERE timestamp >= :start AND timestamp < :end
+    )
+    INSERT INTO user_progress_daily (
+        user_id, day, samples, first_timestamp, last_timestamp,
+        latest_skin_type, latest_skin_tone, latest_acne_severity, latest_oiliness_level,
+        acne_severity_sum, acne_severity_count, acne_severity_min, acne_severity_max,
+        oiliness_level_sum, oiliness_level_count, oiliness_level_min, oiliness_level_max
+    )
+    SELECT user_id, day, COUNT(*), MIN(timestamp), MAX(timestamp),
+           MAX(CASE WHEN rn = 1 THEN skin_type END), MAX(CASE WHEN rn = 1 THEN skin_tone END),
+           MAX(CASE WHEN rn = 1 THEN acne_severity END), MAX(CASE WHEN rn = 1 THEN oiliness_level END),
+           TOTAL(acne_severity), COUNT(acne_severity), MIN(acne_severity), MAX(acne_severity),
+           TOTAL(oiliness_level), COUNT(oiliness_level), MIN(oiliness_level), MAX(oiliness_level)
+    FROM ranked
+    WHERE true
+    GROUP BY user_id, day
+    ON CONFLICT (user_id, day) DO UPDATE SET
+        samples = samples + excluded.samples,
+        first_timestamp = min(first_timestamp, excluded.first_timestamp),
+        {_latest_updates_sql("user_progress_daily")},
+        last_timestamp = max(last_timestamp, excluded.last_timestamp),
+        acne_severity_sum = acne_severity_sum + excluded.acne_severity_sum,
+        acne_severity_count = acne_severity_count + excluded.acne_severity_count,
+        acne_severity_min = min(COALESCE(acne_severity_min, excluded.acne_severity_min),
+                                COALESCE(excluded.acne_severity_min, acne_severity_min)),
+        acne_severity_max = max(COALESCE(acne_severity_max, excluded.acne_severity_max),
+                                COALESCE(excluded.acne_severity_max, acne_severity_max)),
+        oiliness_level_sum = oiliness_level_sum + excluded.oiliness_level_sum,
+        oiliness_level_count = oiliness_level_count + excluded.oiliness_level_count,
+        oiliness_level_min = min(COALESCE(oiliness_level_min, excluded.oiliness_level_min),
+                                 COALESCE(excluded.oiliness_level_min, oiliness_level_min)),
+        oiliness_level_max = max(COALESCE(oiliness_level_max, excluded.oiliness_level_max),
+                                 COALESCE(excluded.oiliness_level_max, oiliness_level_max))
+"""
+
+
+def _supabase_progress_query(table, user_id: str, since=None, until=None, limit: int = None, columns=None):
+    """Builds the get_user_progress select on a user_progress table builder (sync or async client)."""
+    query = table.select(",".join(_progress_select_columns(columns))).eq("user_id", user_id)
+    since, until = _timestamp_param(since), _timestamp_param(until)
+    if since is not None:
+        query = query.gte("timestamp", since)
+    if until is not None:
+        query = query.lt("timestamp", until)
+    query = query.order("timestamp").order("id")
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def _progress_query(user_id: str, since=None, until=None, limit: int = None, columns=None) -> tuple:
+    """SQLite query and bind params for DatabaseClient.get_user_progress."""
+    columns = _progress_select_columns(columns)
+    since, until = _timestamp_param(since), _timestamp_param(until)
+    where, params = ["user_id = :user_id"], {"user_id": user_id}
+    if since is not None:
+        where.append("timestamp >= :since")
+        params["since"] = since
+    if until is not None:
+        where.append("timestamp < :until")
+        params["until"] = until
+    sql = (
+        f"SELECT {', '.join(columns)} FROM user_progress "
+        f"WHERE {' AND '.join(where)} ORDER BY timestamp, id"
+    )
+    if limit is not None:
+        sql += " LIMIT :limit"
+        params["limit"] = limit
+    return sql, params
+
+
+def _decode_progress_row(mapping) -> dict:
+    """A SQLite progress row as a dict, with confidence_scores decoded from its JSON string."""
+    row = dict(mapping)
+    if row.get("confidence_scores"):
+        try:
+            row["confidence_scores"] = json.loads(row["confidence_scores"])
+        except json.JSONDecodeError:
+            pass
+    return row
+
+
+def _progress_buckets_sql(bucket: str) -> str:
+    """SQLite query (bound by :user_id) for DatabaseClient.get_user_progress_buckets."""
+    bucket_expr = PROGRESS_BUCKETS[bucket]
+    last_value = "FIRST_VALUE({col}) OVER (PARTITION BY bucket ORDER BY timestamp DESC, seq DESC)"
+    events = PROGRESS_EVENTS_SQL.format(where="WHERE user_id = :user_id")
+    return f"""
+        WITH bucketed AS (
+            SELECT {bucket_expr} AS bucket, * FROM ({events})
+        ), ranked AS (
+            SELECT *,
+                   {last_value.format(col="latest_skin_type")} AS last_skin_type,
+                   {last_value.format(col="latest_skin_tone")} AS last_skin_tone,
+                   {last_value.format(col="latest_acne_severity")} AS last_acne_severity,
+                   {last_value.format(col="latest_oiliness_level")} AS last_oiliness_level
+            FROM bucketed
+        )
+        SELECT bucket,
+               SUM(samples) AS samples,
+               TOTAL(acne_severity_sum) / NULLIF(SUM(acne_severity_count), 0) AS acne_severity_mean,
+               MIN(acne_severity_min) AS acne_severity_min,
+               MAX(acne_severity_max) AS acne_severity_max,
+               TOTAL(oiliness_level_sum) / NULLIF(SUM(oiliness_level_count), 0) AS oiliness_level_mean,
+               MIN(oiliness_level_min) AS oiliness_level_min,
+               MAX(oiliness_level_max) AS oiliness_level_max,
+               MAX(last_skin_type) AS last_skin_type,
+               MAX(last_skin_tone) AS last_skin_tone,
+               MAX(last_acne_severity) AS last_acne_severity,
+               MAX(last_oiliness_level) AS last_oiliness_level
+        FROM ranked
+        GROUP BY bucket
+        ORDER BY bucket
+    """
+
+
+def _month_start(value: datetime, months_back: int = 0) -> datetime:
+    """First instant of the month `months_back` months before `value`'s month."""
+    month_index = value.year * 12 + value.month - 1 - months_back
+    return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _summary_row(row: dict) -> dict:
+    """Adds *_avg values to a user_progress_summary row."""
+    summary = dict(row)
+    for col in SUMMARY_AVERAGED_COLUMNS:
+        count = summary.get(f"{col}_count") or 0
+        summary[f"{col}_avg"] = float(summary[f"{col}_sum"]) / count if count else None
+    return summary
+
+
+def _progress_row(record: dict) -> dict:
+    """Projects a progress record onto PROGRESS_COLUMNS, filling missing keys with None."""
+    return {col: record.get(col) for col in PROGRESS_COLUMNS}
+
+
+def _progress_insert_rows(records, supabase: bool) -> list:
+    """
+    Progress records as insert rows: for Supabase without a None timestamp (so the
+    database default applies), for SQLite with confidence_scores as a JSON string.
+    """
+    rows = [_progress_row(record) for record in records]
+    for row in rows:
+        if supabase:
+            if row["timestamp"] is None:
+                del row["timestamp"]
+        elif isinstance(row["confidence_scores"], dict):
+            row["confidence_scores"] = json.dumps(row["confidence_scores"])
+    return rows
+
+
+def product_content_hash(row: dict) -> str:
+    """Stable hash of a product's PRODUCT_COLUMNS values, used to detect changed rows."""
+    payload = json.dumps([row.get(col) for col in PRODUCT_COLUMNS], default=str, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def product_key(row: dict) -> tuple:
+    """Natural key of a product: (brand, name)."""
+    return (row.get("brand") or "", row.get("name") or "")
+
+
+def split_tags(value) -> list:
+    """Splits a comma-joined tag column ("Normal,Oily") into normalized lowercase tags."""
+    if not value or not isinstance(value, str):
+        return []
+    return [tag.strip().lower() for tag in value.split(",") if tag.strip()]
+
+
+def _sqlite_tag_values(column: str) -> str:
+    """
+    SQLite table-valued expression yielding the comma-separated tags in `column`.
+    The string is turned into a JSON array for json_each, since recursive CTEs
+    (the usual split idiom) are not allowed inside triggers.
+    """
+    escaped = f"replace(replace(coalesce({column}, ''), '\\', '\\\\'), '\"', '\\\"')"
+    return f"""json_each('["' || replace({escaped}, ',', '","') || '"]')"""
+
+
+# Tag kinds stored in product_tags, mapped to their source column in products
+PRODUCT_TAG_COLUMNS = {"skin_type": "skin_type", "concern": "concerns"}
+
+
+def _product_row(product: dict) -> dict:
+    """Projects a product dict onto PRODUCT_COLUMNS (missing keys become None) plus its content hash."""
+    row = {col: product.get(col) for col in PRODUCT_COLUMNS}
+    row["content_hash"] = product_content_hash(row)
+    return row
+
+
+def _chunked(iterable, size: int):
+    """Yields lists of up to `size` items without materializing the whole iterable."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class _IdSet:
+    """Set of non-negative integer ids kept as a bitmap: max id / 8 bytes, however many are added."""
+
+    __slots__ = ("_bits",)
+
+    def __init__(self):
+        self._bits = bytearray()
+
+    def add(self, row_id: int):
+        index = row_id >> 3
+        if index >= len(self._bits):
+            self._bits.extend(bytes(max(index + 1 - len(self._bits), len(self._bits))))
+        self._bits[index] |= 1 << (row_id & 7)
+
+    def update(self, row_ids):
+        for row_id in row_ids:
+            self.add(row_id)
+
+    def __contains__(self, row_id: int) -> bool:
+        index = row_id >> 3
+        return index < len(self._bits) and bool(self._bits[index] & (1 << (row_id & 7)))
+
+
+def _sqlite_product_filters(filters: dict, prefix: str = "") -> tuple:
+    """
+    Builds the SQLite WHERE clauses and bind params for a get_products_by_criteria
+    filter dict. `prefix` qualifies product columns (e.g. "p.") when joining.
+    Soft-deleted products are always excluded.
+    """
+    where_clauses = [f"{prefix}deleted_at IS NULL"]
+    params = {}
+
+    if 'max_budget' in filters:
+        where_clauses.append(f"{prefix}price <= :max_budget")
+        params['max_budget'] = filters['max_budget']
+    if 'min_rating' in filters:
+        where_clauses.append(f"{prefix}rating >= :min_rating")
+        params['min_rating'] = filters['min_rating']
+    if 'skin_type' in filters:
+        where_clauses.append(
+            f"{prefix}id IN (SELECT product_id FROM product_tags WHERE kind = 'skin_type' AND tag = :skin_type)"
+        )
+        params['skin_type'] = filters['skin_type'].strip().lower()
+    if 'categories' in filters and filters['categories']:
+        # Create placeholders for each category
+        cat_placeholders = ', '.join([f':cat{i}' for i in range(len(filters['categories']))])
+        where_clauses.append(f"{prefix}category IN ({cat_placeholders})")
+        for i, cat in enumerate(filters['categories']):
+            params[f'cat{i}'] = cat
+
+    if 'concerns' in filters and filters['concerns']:
+        concern_placeholders = ', '.join([f':concern{i}' for i in range(len(filters['concerns']))])
+        where_clauses.append(
+            f"{prefix}id IN (SELECT product_id FROM product_tags "
+            f"WHERE kind = 'concern' AND tag IN ({concern_placeholders}))"
+        )
+        for i, concern in enumerate(filters['concerns']):
+            params[f'concern{i}'] = concern.strip().lower()
+
+    return where_clauses, params
+
+
+def _apply_supabase_product_filters(query, filters: dict):
+    """Applies a get_products_by_criteria filter dict to a Supabase select query."""
+    if 'max_budget' in filters:
+        query = query.lte('price', filters['max_budget'])
+    if 'min_rating' in filters:
+        query = query.gte('rating', filters['min_rating'])
+    if 'skin_type' in filters:
+        # Containment on the GIN-indexed generated tag array
+        query = query.contains('skin_type_tags', split_tags(filters['skin_type']))
+    if 'categories' in filters and filters['categories']:
+        query = query.in_('category', filters['categories'])
+
+    # Concerns match if ANY selected concern is tagged (array overlap)
+    if 'concerns' in filters and filters['concerns']:
+        concern_tags = [tag for c in filters['concerns'] for tag in split_tags(c)]
+        query = query.overlaps('concern_tags', concern_tags)
+    return query
+
+
+def _supabase_rpc_filter_params(filters: dict) -> dict:
+    """Maps a get_products_by_criteria filter dict onto the p_* arguments of the catalog RPCs."""
+    return {
+        "p_max_budget": filters.get('max_budget'),
+        "p_min_rating": filters.get('min_rating'),
+        "p_skin_type": filters['skin_type'].strip().lower() if filters.get('skin_type') else None,
+        "p_categories": filters.get('categories') or None,
+        "p_concerns": [tag for c in filters.get('concerns') or [] for tag in split_tags(c)] or None,
+    }
+
+
+def _top_products_rpc_params(filters: dict, k: int, weights: dict) -> dict:
+    """Arguments of the recommend_products RPC (see DatabaseClient.get_top_products)."""
+    params = _supabase_rpc_filter_params(filters)
+    params.update(
+        p_price_scale=weights["price_scale"],
+        p_rating_weight=weights["rating"],
+        p_price_weight=weights["price"],
+        p_base_weight=weights["base"],
+        p_limit=k,
+    )
+    return params
+
+
+def _top_products_query(filters: dict, k: int, weights: dict) -> tuple:
+    """SQLite query and bind params for DatabaseClient.get_top_products."""
+    where_clauses, params = _sqlite_product_filters(filters)
+    params.update(
+        price_scale=weights["price_scale"],
+        rating_weight=weights["rating"],
+        price_weight=weights["price"],
+        base_weight=weights["base"],
+        k=k,
+    )
+    sql = f"""
+        SELECT *,
+               rating / 5.0 * :rating_weight
+               + (1 - price / :price_scale) * :price_weight
+               + :base_weight AS match_score
+        FROM products
+        WHERE {' AND '.join(where_clauses)}
+        ORDER BY match_score IS NULL, match_score DESC, id
+        LIMIT :k
+    """
+    return sql, params
+
+
+# bm25() weights for products_fts columns: name, brand, description, ingredients
+FTS_COLUMN_WEIGHTS = "5.0, 2.0, 1.0, 3.0"
+
+
+def _fts_match_expression(query: str) -> str:
+    """
+    Turns free text into a safe FTS5 MATCH expression: every word becomes a quoted
+    term (so FTS syntax characters in user input are inert) and all terms must match.
+    The last term is a prefix match so partially typed words still hit.
+    """
+    terms = re.findall(r"\w+", query or "")
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _iter_keyset(fetch_page, last_id: int = 0):
+    """Drives keyset pagination: calls `fetch_page(last_id)` until it returns an empty page."""
+    while True:
+        page = fetch_page(last_id)
+        if not page:
+            return
+        yield from page
+        last_id = page[-1]["id"]
+
+
+# ----------------- Process-wide Registry -----------------
+# Streamlit re-runs the page script on every interaction, so anything built in a
+# page handler is rebuilt constantly. Engines, Supabase clients and the shared
+# DatabaseClient live here instead and are created once per process.
+
+_registry_lock = threading.RLock()
+_engines = {}
+_pool_metrics = {}
+_bootstrapped = set()
+_supabase_client = None
+_db_client = None
+product_cache = QueryCache(max_entries=PRODUCT_CACHE_SIZE, ttl=PRODUCT_CACHE_TTL)
+
+
+class PoolMetrics:
+    """Thread-safe counters for one engine's connection pool."""
 
-class DatabaseClient:
     def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def incr(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.wait_count += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "checked_out": self.checkouts - self.checkins,
+                "invalidations": self.invalidations,
+                "wait_avg_ms": (self.wait_total / self.wait_count * 1000) if self.wait_count else 0.0,
+                "wait_max_ms": self.wait_max * 1000,
+            }
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    return url.startswith("sqlite") and (":memory:" in url or url.endswith("://"))
+
+
+def _build_engine(url: str) -> Engine:
+    kwargs = {"echo": False, "future": True, "pool_pre_ping": True}
+    if not _is_sqlite_memory(url):
+        kwargs.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+
+    if url.startswith("sqlite"):
+        # Make sure the directory for a file-based database exists
+        db_path = url.split("///", 1)[-1]
+        if db_path and not _is_sqlite_memory(url):
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+    engine = create_engine(url, **kwargs)
+    metrics = PoolMetrics()
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, _record):
+        metrics.incr("connects")
+        if url.startswith("sqlite"):
+            # WAL lets readers run concurrently with the single writer
+            cursor = dbapi_conn.cursor()
+            # Takes effect on new databases only; lets compaction hand freed pages back
+            cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA foreign_keys=ON")
+            cursor.close()
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(*_args):
+        metrics.incr("checkouts")
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(*_args):
+        metrics.incr("checkins")
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(*_args):
+        metrics.incr("invalidations")
+
+    _pool_metrics[url] = metrics
+    return engine
+
+
+def get_engine(url: str = None) -> Engine:
+    """Returns the pooled engine for `url`, creating it on first use."""
+    url = url or DATABASE_URL
+    engine = _engines.get(url)
+    if engine is None:
+        with _registry_lock:
+            engine = _engines.get(url)
+            if engine is None:
+                engine = _engines[url] = _build_engine(url)
+    return engine
+
+
+def get_supabase_client():
+    """
+    Returns the process-wide Supabase client. supabase (and its HTTP, auth, storage
+    and realtime clients) is imported here, so SQLite deployments never load it.
+    """
+    global _supabase_client
+    if _supabase_client is None:
+        from supabase import create_client
+
+        with _registry_lock:
+            if _supabase_client is None:
+                _supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _supabase_client
+
+
+def get_db_client() -> "DatabaseClient":
+    """Returns the DatabaseClient shared by every Streamlit session in this process."""
+    global _db_client
+    if _db_client is None:
+        with _registry_lock:
+            if _db_client is None:
+                _db_client = DatabaseClient()
+    return _db_client
+
+
+def bootstrap_schema(url: str = None):
+    """
+    Checks the schema version once per database URL (applying pending migrations if
+    DB_AUTO_MIGRATE is set). The DDL itself lives in migrations.py.
+    """
+    url = url or DATABASE_URL
+    if url in _bootstrapped:
+        return
+    from .migrations import ensure_schema  # migrations imports this module
+    with _registry_lock:
+        if url not in _bootstrapped:
+            ensure_schema(get_engine(url))
+            _bootstrapped.add(url)
+
+
+def get_pool_metrics(url: str = None) -> dict:
+    """Health/metrics for the pooled engine: checkouts, wait times and pool status."""
+    url = url or DATABASE_URL
+    engine = _engines.get(url)
+    if engine is None:
+        return {"initialized": False}
+    stats = _pool_metrics[url].snapshot()
+    stats["initialized"] = True
+    stats["pool_status"] = engine.pool.status()
+    return stats
+
+
+class DatabaseClient:
+    def __init__(self, database_url: str = None):
         self.use_supabase = bool(SUPABASE_URL and SUPABASE_KEY)
+        self.database_url = database_url or DATABASE_URL
         if self.use_supabase:
             print("✅ Using Supabase Database")
-            self.supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+            self.supabase = get_supabase_client()
             self.engine = None
         else:
             print("⚠️ Supabase not configured, using SQLite fallback")
             self.supabase = None
-            self.engine = create_engine(DATABASE_URL, echo=False, future=True)
-            self._create_sqlite_tables()
-
-    # ----------------- SQLite Fallback Setup -----------------
-    def _create_sqlite_tables(self):
-        with self.engine.begin() as conn:
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS products (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    brand TEXT,
-                    category TEXT,
-                    skin_type TEXT,
-                    concerns TEXT,
-                    price REAL,
-                    rating REAL,
-                    description TEXT,
-                    ingredients TEXT,
-                    purchase_link TEXT,
-                    image_url TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """))
-
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS user_progress (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id TEXT NOT NULL,
-                    skin_type TEXT,
-                    acne_severity REAL,
-                    oiliness_level REAL,
-                    skin_tone TEXT,
-                    image_path TEXT,
-                    confidence_scores TEXT, -- stored as JSON string
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """))
+            self.engine = get_engine(self.database_url)
+            self._bootstrap_schema()
+
+    def _bootstrap_schema(self):
+        bootstrap_schema(self.database_url)
+
+    @contextmanager
+    def _connect(self):
+        """Checks a connection out of the pool, recording how long the checkout took."""
+        start = time.perf_counter()
+        conn = self.engine.connect()
+        _pool_metrics[self.database_url].record_wait(time.perf_counter() - start)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _begin(self):
+        """Like _connect, but wraps the block in a transaction."""
+        with self._connect() as conn:
+            with conn.begin():
+                yield conn
+
+    def health(self) -> dict:
+        """Backend in use, product cache counters and pool metrics (SQLite/SQLAlchemy only)."""
+        if self.use_supabase:
+            return {"backend": "supabase", "product_cache": product_cache.stats()}
+        return {"backend": "sqlalchemy", "url": self.engine.url.render_as_string(hide_password=True),
+                "product_cache": product_cache.stats(), **get_pool_metrics(self.database_url)}
 
     # ----------------- Product Methods -----------------
     def insert_product(self, product_data: dict):
+        try:
+            if self.use_supabase:
+                return self.supabase.table("products").insert(_product_row(product_data)).execute()
+            else:
+                with self._begin() as conn:
+                    conn.execute(text(INSERT_PRODUCT_SQL), _product_row(product_data))
+        finally:
+            product_cache.invalidate()
+
+    def insert_products_bulk(self, products, chunk_size: int = 1000, on_chunk=None) -> int:
+        """
+        Inserts an iterable of product dicts in chunks and returns the row count.
+        Only for new products: (brand, name) is unique among active rows, so a product
+        that is already stored fails the load (use upsert_products instead). SQLite
+        runs every chunk through executemany inside one transaction; Supabase sends
+        one array insert per chunk. `on_chunk(total, chunk_rows, elapsed)` is called
+        after each chunk for progress reporting.
+        """
+        total = 0
+        start = time.perf_counter()
+
+        def _report(chunk_rows):
+            if on_chunk:
+                on_chunk(total, chunk_rows, time.perf_counter() - start)
+
+        try:
+            if self.use_supabase:
+                for chunk in _chunked(products, chunk_size):
+                    rows = [_product_row(p) for p in chunk]
+                    self.supabase.table("products").insert(rows).execute()
+                    total += len(rows)
+                    _report(len(rows))
+            else:
+                with self._begin() as conn:
+                    for chunk in _chunked(products, chunk_size):
+                        rows = [_product_row(p) for p in chunk]
+                        conn.execute(text(INSERT_PRODUCT_SQL), rows)
+                        total += len(rows)
+                        _report(len(rows))
+        finally:
+            product_cache.invalidate()
+        return total
+
+    def _lookup_products(self, keys, conn=None) -> dict:
+        """
+        Maps each stored (brand, name) among `keys` to [(id, content_hash, deleted_at), ...]
+        in id order, soft-deleted rows included. Rows are looked up by name (indexed),
+        so a sync only ever holds the state of the chunk it is writing.
+        """
+        wanted = set(keys)
+        names = sorted({name for _, name in wanted})
+        if not names:
+            return {}
         if self.use_supabase:
-            return self.supabase.table("products").insert(product_data).execute()
+            rows = []
+            for batch in _chunked(names, 100):  # keeps the in.(...) filter well inside URL limits
+                rows += (
+                    self.supabase.table("products")
+                    .select("id,brand,name,content_hash,deleted_at")
+                    .in_("name", batch)
+                    .execute()
+                    .data
+                )
         else:
-            with self.engine.begin() as conn:
-                conn.execute(text("""
-                    INSERT INTO products 
-                    (name, brand, category, skin_type, concerns, price, rating, description, ingredients, purchase_link, image_url)
-                    VALUES (:name, :brand, :category, :skin_type, :concerns, :price, :rating, :description, :ingredients, :purchase_link, :image_url)
-                """), product_data)
+            params = {f"n{i}": name for i, name in enumerate(names)}
+            rows = conn.execute(text(
+                "SELECT id, brand, name, content_hash, deleted_at FROM products "
+                f"WHERE name IN ({', '.join(':' + p for p in params)})"
+            ), params).mappings().all()
+        state = {}
+        for row in sorted(rows, key=lambda r: r["id"]):
+            key = product_key(row)
+            if key in wanted:
+                state.setdefault(key, []).append((row["id"], row["content_hash"], row["deleted_at"]))
+        return state
+
+    def sync_products(self, products, chunk_size: int = 1000, delete_missing: bool = True, on_chunk=None) -> dict:
+        """
+        Incrementally syncs the catalog with a full product feed keyed on (brand, name).
+        New rows are inserted, rows whose content hash changed (or that were soft-deleted)
+        are updated, and stored rows missing from the feed get `deleted_at` set.
+        Unchanged rows are not written. Each key keeps one active row (its lowest active
+        id); any other active row with the same key is soft-deleted as a duplicate.
+        With `delete_missing=False` the feed is applied as an upsert and rows missing
+        from it are left alone. Returns counts per outcome.
+
+        The feed is streamed: each chunk's stored rows are looked up by key, and the ids
+        the feed maps to are kept in a bitmap, so memory stays flat for large catalogs.
+        `on_chunk(total, chunk_rows, elapsed)` is called after each chunk for progress
+        reporting.
+        """
+        stats = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        seen = _IdSet()  # ids of the stored rows the feed maps to
+        total = 0
+        start = time.perf_counter()
+
+        def _plan(chunk, state):
+            """Splits a feed chunk into inserts, updates and duplicate ids to soft-delete."""
+            inserts, updates, duplicates, keys = [], [], [], set()
+            for product in chunk:
+                row = _product_row(product)
+                key = product_key(row)
+                if key in keys:
+                    continue  # duplicate key within the feed: first occurrence wins
+                keys.add(key)
+                stored = state.get(key)
+                if not stored:
+                    inserts.append(row)
+                    continue
+                active = [entry for entry in stored if entry[2] is None]
+                current = active[0] if active else stored[0]
+                if current[0] in seen:
+                    continue  # already synced from an earlier chunk
+                seen.add(current[0])
+                duplicates.extend(entry[0] for entry in active[1:])
+                if current[1] != row["content_hash"] or current[2] is not None:
+                    row["id"] = current[0]
+                    updates.append(row)
+                else:
+                    stats["unchanged"] += 1
+            stats["inserted"] += len(inserts)
+            stats["updated"] += len(updates)
+            return inserts, updates, duplicates
+
+        def _mark_inserted(inserts, conn=None):
+            state = self._lookup_products([product_key(row) for row in inserts], conn)
+            for stored in state.values():
+                seen.update(entry[0] for entry in stored if entry[2] is None)
 
-    def get_products(self, filters: dict = None):
+        def _report(chunk_rows):
+            if on_chunk:
+                on_chunk(total, chunk_rows, time.perf_counter() - start)
+
+        try:
+            if self.use_supabase:
+                now = datetime.now(timezone.utc).isoformat()
+
+                def _soft_delete(ids):
+                    for batch in _chunked(ids, chunk_size):
+                        (self.supabase.table("products")
+                            .update({"deleted_at": now, "updated_at": now})
+                            .in_("id", batch)
+                            .execute())
+                        stats["deleted"] += len(batch)
+
+                for chunk in _chunked(products, chunk_size):
+                    state = self._lookup_products([product_key(p) for p in chunk])
+                    inserts, updates, duplicates = _plan(chunk, state)
+                    if inserts:
+                        self.supabase.table("products").insert(inserts).execute()
+                        _mark_inserted(inserts)
+                    if updates:
+                        for row in updates:
+                            row.update(deleted_at=None, updated_at=now)
+                        self.supabase.table("products").upsert(updates).execute()
+                    _soft_delete(duplicates)
+                    total += len(chunk)
+                    _report(len(chunk))
+                if delete_missing:
+                    def _page(last_id):
+                        return (
+                            self.supabase.table("products")
+                            .select("id")
+                            .is_("deleted_at", "null")
+                            .gt("id", last_id)
+                            .order("id")
+                            .limit(1000)
+                            .execute()
+                            .data
+                        )
+                    # Pages are keyed on id, so soft-deleting rows already paged past is safe
+                    for page in _chunked(_iter_keyset(_page), 1000):
+                        _soft_delete([row["id"] for row in page if row["id"] not in seen])
+            else:
+                with self._begin() as conn:
+                    def _soft_delete(ids):
+                        if ids:
+                            conn.execute(text(SOFT_DELETE_PRODUCT_SQL), [{"id": row_id} for row_id in ids])
+                            stats["deleted"] += len(ids)
+
+                    for chunk in _chunked(products, chunk_size):
+                        state = self._lookup_products([product_key(p) for p in chunk], conn)
+                        inserts, updates, duplicates = _plan(chunk, state)
+                        if inserts:
+                            conn.execute(text(INSERT_PRODUCT_SQL), inserts)
+                            _mark_inserted(inserts, conn)
+                        if updates:
+                            conn.execute(text(UPDATE_PRODUCT_SQL), updates)
+                        _soft_delete(duplicates)
+                        total += len(chunk)
+                        _report(len(chunk))
+                    if delete_missing:
+                        last_id = 0
+                        while True:
+                            ids = conn.execute(text(
+                                "SELECT id FROM products WHERE deleted_at IS NULL AND id > :last_id "
+                                "ORDER BY id LIMIT :limit"
+                            ), {"last_id": last_id, "limit": chunk_size}).scalars().all()
+                            if not ids:
+                                break
+                            _soft_delete([row_id for row_id in ids if row_id not in seen])
+                            last_id = ids[-1]
+        finally:
+            product_cache.invalidate()
+        return stats
+
+    def upsert_products(self, products, chunk_size: int = 1000, on_chunk=None) -> dict:
+        """
+        Inserts new products and updates changed ones, keyed on (brand, name), so
+        re-running a load never duplicates rows. Products missing from `products`
+        are kept (use sync_products for a full feed). Returns counts per outcome.
+        """
+        return self.sync_products(products, chunk_size=chunk_size, delete_missing=False, on_chunk=on_chunk)
+
+    def get_products(self, filters: dict = None, use_cache: bool = True):
+        """
+        Returns active products matching exact column values. Results are served from the
+        process-wide product_cache until they expire or products are written; treat the
+        returned dicts as read-only. Pass `use_cache=False` to always hit the database.
+        """
+        if not use_cache:
+            return self._query_products(filters)
+        key = ("get_products", self.database_url, self.use_supabase, canonical_filters(filters))
+        return list(product_cache.get_or_load(key, lambda: self._query_products(filters)))
+
+    def _query_products(self, filters: dict = None):
         if self.use_supabase:
-            query = self.supabase.table("products").select("*")
+            query = self.supabase.table("products").select("*").is_("deleted_at", "null")
             if filters:
                 for k, v in filters.items():
                     query = query.eq(k, v)
             return query.execute().data
         else:
-            with self.engine.connect() as conn:
-                query = "SELECT * FROM products"
-                if filters:
-                    conditions = " AND ".join([f"{k}='{v}'" for k, v in filters.items()])
-                    query += f" WHERE {conditions}"
-                result = conn.execute(text(query))
-                return [dict(row) for row in result]
-            
-
+            with self._connect() as conn:
+                # Soft-deleted products (dropped from the catalog feed) are never returned
+                conditions = ["deleted_at IS NULL"]
+                params = {}
+                for i, (k, v) in enumerate((filters or {}).items()):
+                    if k not in PRODUCT_COLUMNS and k != "id":
+                        raise ValueError(f"Unknown product column: {k}")
+                    conditions.append(f"{k} = :f{i}")
+                    params[f"f{i}"] = v
+                query = f"SELECT * FROM products WHERE {' AND '.join(conditions)}"
+                result = conn.execute(text(query), params)
+                return [dict(row._mapping) for row in result]
 
     def get_products_by_criteria(self, filters: dict):
         """
         Fetches products from the database based on a dictionary of filters.
         This is the more efficient, "production-like" method.
+
+        Results go through the process-wide product_cache. The cache key is the
+        canonicalized filter dict with max_budget/min_rating widened to their buckets,
+        so slider tweaks reuse one query; the exact bounds are re-applied here.
         """
-        if self.use_supabase:
-            query = self.supabase.table("products").select("*")
+        key = ("get_products_by_criteria", self.database_url, self.use_supabase, canonical_filters(filters))
+        rows = product_cache.get_or_load(key, lambda: self._query_products_by_criteria(bucketed_filters(filters)))
+        max_budget, min_rating = filters.get('max_budget'), filters.get('min_rating')
+        return [
+            row for row in rows
+            if (max_budget is None or row['price'] <= max_budget)
+            and (min_rating is None or row['rating'] >= min_rating)
+        ]
 
+    def _query_products_by_criteria(self, filters: dict):
+        if self.use_supabase:
+            query = self.supabase.table("products").select("*").is_("deleted_at", "null")
             # Apply filters directly to the Supabase query
-            if 'max_budget' in filters:
-                query = query.lte('price', filters['max_budget'])
-            if 'min_rating' in filters:
-                query = query.gte('rating', filters['min_rating'])
-            if 'skin_type' in filters:
-                # ilike is a case-insensitive "LIKE" for partial text matching
-                query = query.ilike('skin_type', f"%{filters['skin_type']}%")
-            if 'categories' in filters and filters['categories']:
-                query = query.in_('category', filters['categories'])
-
-            # For concerns, we need to build a more complex filter
-            if 'concerns' in filters and filters['concerns']:
-                # Example: "concerns.ilike.%Acne%,concerns.ilike.%Hydration%"
-                concern_filters = [f"concerns.ilike.%{c}%" for c in filters['concerns']]
-                query = query.or_(",".join(concern_filters))
-
-            return query.execute().data
+            return _apply_supabase_product_filters(query, filters).execute().data
 
         else: # SQLite Fallback
-            with self.engine.connect() as conn:
-                base_query = "SELECT * FROM products"
-                where_clauses = []
-                params = {}
+            with self._connect() as conn:
+                where_clauses, params = _sqlite_product_filters(filters)
+                query = f"SELECT * FROM products WHERE {' AND '.join(where_clauses)}"
+                result = conn.execute(text(query), params)
+                return [dict(row._mapping) for row in result]
 
-                if 'max_budget' in filters:
-                    where_clauses.append("price <= :max_budget")
-                    params['max_budget'] = filters['max_budget']
-                if 'min_rating' in filters:
-                    where_clauses.append("rating >= :min_rating")
-                    params['min_rating'] = filters['min_rating']
-                if 'skin_type' in filters:
-                    where_clauses.append("skin_type LIKE :skin_type")
-                    params['skin_type'] = f"%{filters['skin_type']}%"
-                if 'categories' in filters and filters['categories']:
-                    # Create placeholders for each category
-                    cat_placeholders = ', '.join([f':cat{i}' for i in range(len(filters['categories']))])
-                    where_clauses.append(f"category IN ({cat_placeholders})")
-                    for i, cat in enumerate(filters['categories']):
-                        params[f'cat{i}'] = cat
-
-                if 'concerns' in filters and filters['concerns']:
-                    concern_clauses = []
-                    for i, concern in enumerate(filters['concerns']):
-                        param_name = f'concern{i}'
-                        concern_clauses.append(f"concerns LIKE :{param_name}")
-                        params[param_name] = f"%{concern}%"
-                    where_clauses.append(f"({ ' OR '.join(concern_clauses) })")
-
-                if where_clauses:
-                    query = f"{base_query} WHERE {' AND '.join(where_clauses)}"
-                else:
-                    query = base_query
+    # ----------------- Streaming Reads -----------------
+    def iter_products(self, filters: dict = None, batch_size: int = 500):
+        """
+        Yields active products matching exact column values, `batch_size` rows at a time
+        via keyset pagination on id. Memory stays bounded by one page and the first row
+        arrives after one page-sized query, however large the table is. Bypasses the cache.
+        """
+        if self.use_supabase:
+            def _page(last_id):
+                query = self.supabase.table("products").select("*").is_("deleted_at", "null")
+                for k, v in (filters or {}).items():
+                    query = query.eq(k, v)
+                return query.gt("id", last_id).order("id").limit(batch_size).execute().data
+        else:
+            where_clauses = ["deleted_at IS NULL"]
+            params = {}
+            for i, (k, v) in enumerate((filters or {}).items()):
+                if k not in PRODUCT_COLUMNS and k != "id":
+                    raise ValueError(f"Unknown product column: {k}")
+                where_clauses.append(f"{k} = :f{i}")
+                params[f"f{i}"] = v
+            _page = self._sqlite_page_reader("products", where_clauses, params, batch_size)
+        yield from _iter_keyset(_page)
 
-                result = conn.execute(text(query), params)
+    def iter_products_by_criteria(self, filters: dict, batch_size: int = 500):
+        """Streaming, keyset-paginated variant of get_products_by_criteria (see iter_products)."""
+        if self.use_supabase:
+            def _page(last_id):
+                query = self.supabase.table("products").select("*").is_("deleted_at", "null")
+                query = _apply_supabase_product_filters(query, filters)
+                return query.gt("id", last_id).order("id").limit(batch_size).execute().data
+        else:
+            where_clauses, params = _sqlite_product_filters(filters)
+            _page = self._sqlite_page_reader("products", where_clauses, params, batch_size)
+        yield from _iter_keyset(_page)
+
+    def _sqlite_page_reader(self, table: str, where_clauses: list, params: dict, batch_size: int):
+        """
+        Returns `page(last_id)` fetching the next `batch_size` rows with id > last_id.
+        Each page checks a connection out only for the query itself, so a slow or
+        abandoned consumer never pins a pooled connection.
+        """
+        sql = text(
+            f"SELECT * FROM {table} WHERE {' AND '.join(where_clauses + ['id > :last_id'])} "
+            "ORDER BY id LIMIT :batch_size"
+        )
+
+        def _page(last_id):
+            with self._connect() as conn:
+                result = conn.execute(sql, {**params, "last_id": last_id, "batch_size": batch_size})
                 return [dict(row._mapping) for row in result]
+        return _page
+
+    def search_products(self, query: str, filters: dict = None, limit: int = 20, offset: int = 0):
+        """
+        Full-text search over name, brand, description and ingredients, e.g. "niacinamide"
+        or "salicylic acid". Optional `filters` take the get_products_by_criteria keys.
+        Results are ordered by relevance (BM25 on SQLite, ts_rank on Postgres) and carry a
+        `search_rank` where higher is better; page through them with `limit`/`offset`.
+        """
+        filters = filters or {}
+        if self.use_supabase:
+            params = _supabase_rpc_filter_params(filters)
+            params.update(p_query=query, p_limit=limit, p_offset=offset)
+            return self.supabase.rpc("search_products", params).execute().data
+        else:
+            match = _fts_match_expression(query)
+            if not match:
+                return []
+            where_clauses, params = _sqlite_product_filters(filters, prefix="p.")
+            params.update(match=match, limit=limit, offset=offset)
+            sql = f"""
+                SELECT p.*, -bm25(products_fts, {FTS_COLUMN_WEIGHTS}) AS search_rank
+                FROM products_fts
+                JOIN products p ON p.id = products_fts.rowid
+                WHERE products_fts MATCH :match AND {' AND '.join(where_clauses)}
+                ORDER BY search_rank DESC
+                LIMIT :limit OFFSET :offset
+            """
+            with self._connect() as conn:
+                result = conn.execute(text(sql), params)
+                return [dict(row._mapping) for row in result]
+
+    def get_top_products(self, filters: dict, k: int, weights: dict):
+        """
+        Returns the `k` best matches for `filters` under a linear score computed in the
+        database, so only k rows are transferred however many products match:
+
+            rating / 5 * weights["rating"] + (1 - price / weights["price_scale"]) * weights["price"]
+            + weights["base"]
+
+        Each row carries its `match_score`; rows with a NULL price or rating sort last.
+        """
+        if self.use_supabase:
+            return self.supabase.rpc("recommend_products", _top_products_rpc_params(filters, k, weights)).execute().data
+        else:
+            sql, params = _top_products_query(filters, k, weights)
+            with self._connect() as conn:
+                result = conn.execute(text(sql), params)
+                return [dict(row._mapping) for row in result]
+
+    def get_products_watermark(self) -> int:
+        """
+        Cheap change marker for the products table: the products_version counter, which
+        triggers bump on every insert, update and delete. Unlike timestamps it never
+        misses a write that lands in the same second as the previous check.
+        """
+        if self.use_supabase:
+            rows = self.supabase.table("products_version").select("version").eq("id", 1).execute().data
+            return rows[0]["version"] if rows else 0
+        else:
+            with self._connect() as conn:
+                return conn.execute(text("SELECT version FROM products_version WHERE id = 1")).scalar() or 0
 
     # ----------------- User Progress Methods -----------------
     def insert_progress(self, progress_data: dict):
-            if self.use_supabase:
-                return self.supabase.table("user_progress").insert(progress_data).execute()
-            else:
-                # Convert confidence_scores dict to JSON string for SQLite
-                if "confidence_scores" in progress_data and isinstance(progress_data["confidence_scores"], dict):
-                    progress_data["confidence_scores"] = json.dumps(progress_data["confidence_scores"])
-
-                with self.engine.begin() as conn:
-                    conn.execute(text("""
-                        INSERT INTO user_progress 
-                        (user_id, skin_type, acne_severity, oiliness_level, skin_tone, image_path, confidence_scores)
-                        VALUES (:user_id, :skin_type, :acne_severity, :oiliness_level, :skin_tone, :image_path, :confidence_scores)
-                    """), progress_data)
-
-    def get_user_progress(self, user_id: str):
-            if self.use_supabase:
+        """Inserts one progress record (see insert_progress_bulk)."""
+        self.insert_progress_bulk([progress_data])
+
+    def insert_progress_bulk(self, records) -> int:
+        """
+        Inserts many user_progress records in one round trip: a single executemany
+        transaction on SQLite, one array insert on Supabase. Records may carry their own
+        `timestamp` (e.g. when written behind by ProgressWriter); otherwise the database
+        default applies. Input dicts are not modified.
+        """
+        rows = _progress_insert_rows(records, self.use_supabase)
+        if not rows:
+            return 0
+        if self.use_supabase:
+            self.supabase.table("user_progress").insert(rows).execute()
+        else:
+            with self._begin() as conn:
+                conn.execute(text(INSERT_PROGRESS_SQL), rows)
+        return len(rows)
+
+    def iter_progress_images(self, after_id: int = 0, batch_size: int = 500):
+        """
+        Yields `id`, `user_id` and `image_path` of every progress row with an image and
+        id > `after_id`, in id order, `batch_size` rows per keyset-paginated query.
+        """
+        if self.use_supabase:
+            def _page(last_id):
                 return (
                     self.supabase.table("user_progress")
-                    .select("*")
-                    .eq("user_id", user_id)
-                    .order("timestamp")
+                    .select("id,user_id,image_path")
+                    .not_.is_("image_path", "null")
+                    .gt("id", last_id)
+                    .order("id")
+                    .limit(batch_size)
                     .execute()
                     .data
                 )
-            else:
-                with self.engine.connect() as conn:
-                    result = conn.execute(
-                        text("SELECT * FROM user_progress WHERE user_id = :user_id"), 
-                        {"user_id": user_id}
-                    )
-                    
-                    rows = []
-                    for row in result:
-                        row_dict = dict(row)
-                        # Convert confidence_scores back to dict if JSON string
-                        if row_dict.get("confidence_scores"):
-                            try:
-                                row_dict["confidence_scores"] = json.loads(row_dict["confidence_scores"])
-                            except json.JSONDecodeError:
-                                pass
-                        rows.append(row_dict)
-                    return rows
+        else:
+            sql = text(
+                "SELECT id, user_id, image_path FROM user_progress "
+                "WHERE image_path IS NOT NULL AND id > :last_id ORDER BY id LIMIT :batch_size"
+            )
+
+            def _page(last_id):
+                with self._connect() as conn:
+                    result = conn.execute(sql, {"last_id": last_id, "batch_size": batch_size})
+                    return [dict(row._mapping) for row in result]
+        yield from _iter_keyset(_page, after_id)
+
+    def update_progress_analyses(self, updates) -> int:
+        """
+        Overwrites the analysis columns (PROGRESS_ANALYSIS_COLUMNS) of existing progress
+        rows; each update is a dict of those columns plus `id`. One executemany
+        transaction on SQLite, one update_user_progress_analyses call on Supabase
+        (needs the service-role key). Summaries are not touched: follow up with
+        rebuild_user_summaries for the affected users.
+        """
+        rows = [{"id": update["id"], **{c: update.get(c) for c in PROGRESS_ANALYSIS_COLUMNS}} for update in updates]
+        if not rows:
+            return 0
+        if self.use_supabase:
+            self.supabase.rpc("update_user_progress_analyses", {"p_rows": rows}).execute()
+        else:
+            for row in rows:
+                if isinstance(row["confidence_scores"], dict):
+                    row["confidence_scores"] = json.dumps(row["confidence_scores"])
+            with self._begin() as conn:
+                conn.execute(text(UPDATE_PROGRESS_ANALYSIS_SQL), rows)
+        return len(rows)
+
+    def get_user_progress_buckets(self, user_id: str, bucket: str = "day"):
+        """
+        Aggregates a user's history into day/week/month buckets in the database, so the
+        payload grows with the number of buckets rather than the number of uploads.
+        Each row has `bucket` (bucket start date), `samples`, mean/min/max of acne_severity
+        and oiliness_level, and the last skin_type / skin_tone / acne_severity /
+        oiliness_level recorded in the bucket. Weeks start on Monday. Days whose raw
+        rows were compacted are included through their daily rollups.
+        """
+        if bucket not in PROGRESS_BUCKETS:
+            raise ValueError(f"bucket must be one of {sorted(PROGRESS_BUCKETS)}")
+        if self.use_supabase:
+            return self.supabase.rpc(
+                "user_progress_buckets", {"p_user_id": user_id, "p_bucket": bucket}
+            ).execute().data
+        else:
+            with self._connect() as conn:
+                result = conn.execute(text(_progress_buckets_sql(bucket)), {"user_id": user_id})
+                return [dict(row._mapping) for row in result]
+
+    def get_user_summary(self, user_id: str):
+        """
+        Returns the user's user_progress_summary row (sample count, first/last timestamp,
+        latest_* values and *_avg running averages), or None if nothing was recorded.
+        The row is maintained on insert, so this is one primary-key lookup.
+        """
+        if self.use_supabase:
+            rows = (
+                self.supabase.table("user_progress_summary")
+                .select("*")
+                .eq("user_id", user_id)
+                .execute()
+                .data
+            )
+            return _summary_row(rows[0]) if rows else None
+        else:
+            with self._connect() as conn:
+                row = conn.execute(
+                    text("SELECT * FROM user_progress_summary WHERE user_id = :user_id"),
+                    {"user_id": user_id},
+                ).mappings().first()
+            return _summary_row(row) if row else None
+
+    def rebuild_user_summaries(self, user_ids=None):
+        """
+        Recomputes summary rows from user_progress and its daily rollups, for all users
+        or just `user_ids`. Only needed after existing progress rows are updated or
+        deleted; inserts (and compaction) keep the summary current on their own.
+        """
+        if self.use_supabase:
+            self.supabase.rpc("rebuild_user_progress_summary", {"p_user_ids": user_ids}).execute()
+            return
+        where, params = "", {}
+        if user_ids is not None:
+            user_ids = list(user_ids)
+            if not user_ids:
+                return
+            placeholders = ", ".join(f":u{i}" for i in range(len(user_ids)))
+            where = f"WHERE user_id IN ({placeholders})"
+            params = {f"u{i}": user_id for i, user_id in enumerate(user_ids)}
+        with self._begin() as conn:
+            conn.execute(text(f"DELETE FROM user_progress_summary {where}"), params)
+            conn.execute(text(REBUILD_SUMMARY_SQL.format(events=PROGRESS_EVENTS_SQL.format(where=where))), params)
+
+    def compact_user_progress(self, retention_months: int = PROGRESS_RETENTION_MONTHS,
+                              batch_size: int = PROGRESS_COMPACT_BATCH) -> dict:
+        """
+        Retention job for the user_progress event log. Raw rows from before the start of
+        the month `retention_months` months ago are rolled up into user_progress_daily
+        and removed. Charts and summaries keep covering them through the rollups.
+
+        On Supabase this calls maintain_user_progress: user_progress is partitioned by
+        month there, so an expired month is rolled up, detached and dropped, never
+        deleted row by row. SQLite has no partitioning, so expired rows are rolled up
+        and deleted in time order, at most `batch_size` rows per transaction: each
+        batch's rollup and delete commit together, and no transaction holds the write
+        lock for long. The rollup merges into existing days, so a day split across
+        batches adds up the same. The freed pages are then returned to the filesystem
+        with an incremental vacuum. That needs auto_vacuum=INCREMENTAL, which new
+        databases get on connect; older ones are converted once by vacuum_sqlite().
+        """
+        if self.use_supabase:
+            rows = self.supabase.rpc(
+                "maintain_user_progress", {"p_retention_months": retention_months}
+            ).execute().data
+            return rows[0] if rows else {}
+
+        cutoff = _month_start(datetime.now(timezone.utc), retention_months).strftime("%Y-%m-%d %H:%M:%S")
+        rolled_up = batches = 0
+        start = None
+        while True:
+            with self._begin() as conn:
+                if start is None:
+                    start = conn.execute(text("SELECT MIN(timestamp) FROM user_progress")).scalar()
+                    if start is None or str(start) >= cutoff:
+                        break
+                # End the batch before the batch_size-th next timestamp, so rows sharing a
+                # timestamp land in the same batch (a longer run of equal ones takes it whole)
+                end = conn.execute(text(
+                    "SELECT timestamp FROM user_progress WHERE timestamp >= :start AND timestamp < :cutoff "
+                    "ORDER BY timestamp LIMIT 1 OFFSET :offset"
+                ), {"start": start, "cutoff": cutoff, "offset": batch_size}).scalar()
+                if end is not None and end == start:
+                    end = conn.execute(text(
+                        "SELECT MIN(timestamp) FROM user_progress WHERE timestamp > :start AND timestamp < :cutoff"
+                    ), {"start": start, "cutoff": cutoff}).scalar()
+                bounds = {"start": start, "end": end if end is not None else cutoff}
+                conn.execute(text(ROLLUP_PROGRESS_SQL), bounds)
+                deleted = conn.execute(
+                    text("DELETE FROM user_progress WHERE timestamp >= :start AND timestamp < :end"), bounds
+                ).rowcount
+            rolled_up += deleted
+            batches += 1
+            if end is None:
+                break
+            start = end
+
+        pages_released = self._incremental_vacuum() if rolled_up else 0
+        return {"rows_rolled_up": rolled_up, "batches": batches, "pages_released": pages_released,
+                "cutoff": cutoff[:10]}
+
+    def _incremental_vacuum(self) -> int:
+        """Returns SQLite's free pages to the filesystem (if auto_vacuum=INCREMENTAL); returns how many."""
+        with self._connect() as conn:
+            if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+                print("ℹ️ SQLite auto_vacuum is off, so freed pages stay in the file; run "
+                      "python -m src.database.maintenance --vacuum once to enable it")
+                return 0
+            free_pages = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            # The driver steps a statement once, and incremental_vacuum frees one page per
+            # step; executescript runs it to completion
+            conn.connection.driver_connection.executescript("PRAGMA incremental_vacuum")
+            return free_pages - conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+
+    def vacuum_sqlite(self):
+        """
+        Rebuilds the SQLite file with auto_vacuum=INCREMENTAL, so compaction can release
+        freed pages. Only needed once for databases created before it was enabled on
+        connect; takes an exclusive lock for the duration.
+        """
+        if self.use_supabase:
+            return
+        with self._connect() as conn:
+            conn.connection.driver_connection.executescript("PRAGMA auto_vacuum = INCREMENTAL; VACUUM;")
+
+    def get_user_progress(self, user_id: str, since=None, until=None, limit: int = None, columns=None):
+        """
+        Returns a user's progress records in time order, optionally restricted to
+        `since` <= timestamp < `until` (datetimes or 'YYYY-MM-DD HH:MM:SS' strings),
+        the first `limit` records and the given `columns` (default: all). Reads are
+        served by the (user_id, timestamp) index; asking only for PROGRESS_INDEXED_COLUMNS
+        keeps them index-only.
+        """
+        if self.use_supabase:
+            query = self.supabase.table("user_progress")
+            return _supabase_progress_query(query, user_id, since, until, limit, columns).execute().data
+        else:
+            sql, params = _progress_query(user_id, since, until, limit, columns)
+            with self._connect() as conn:
+                result = conn.execute(text(sql), params)
+                return [_decode_progress_row(row._mapping) for row in result]
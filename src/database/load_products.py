@@ -1,13 +1,43 @@
 # src/database/load_products.py
 
+import argparse
+import os
+import sys
+from pathlib import Path
+
 import pandas as pd
+
+# Make the project root importable so db_client can use its package-relative imports
+ROOT_DIR = Path(__file__).resolve().parents[2]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
 # Import the class from your db_client.py file
-from db_client import DatabaseClient
+from src.database.db_client import DatabaseClient
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def iter_csv_products(csv_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Streams product dicts from the CSV `chunk_size` rows at a time so memory stays flat."""
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        # Fill any missing values with a placeholder to avoid errors
+        chunk = chunk.fillna('')
+        yield from chunk.to_dict(orient='records')
 
-import os
 
-def upload_products_from_csv():
-    """Reads product data from a CSV and uploads it using your DatabaseClient."""
+def _print_progress(total, chunk_rows, elapsed):
+    rate = total / elapsed if elapsed > 0 else float('inf')
+    print(f"  Processed chunk of {chunk_rows} products ({total} total, {rate:,.0f} rows/s)")
+
+
+def upload_products_from_csv(chunk_size=DEFAULT_CHUNK_SIZE, sync=False):
+    """
+    Reads product data from a CSV and upserts it using your DatabaseClient, keyed on
+    (brand, name): new products are inserted and changed ones updated, so re-running
+    the load never duplicates rows. With `sync=True` the CSV is treated as the full
+    catalog and products missing from it are soft-deleted as well.
+    """
     
     # Establish a connection to the database
     db = DatabaseClient()
@@ -21,26 +51,22 @@ def upload_products_from_csv():
         print(f"❌ Error: Product data file not found at {csv_path}")
         return
 
-    print(f"Reading product data from {csv_path}...")
-    products_df = pd.read_csv(csv_path)
-    
-    # Fill any missing values with a placeholder to avoid errors
-    products_df.fillna('', inplace=True)
-    
-    products_to_upload = products_df.to_dict(orient='records')
+    print(f"Streaming product data from {csv_path} in chunks of {chunk_size}...")
 
-    print(f"Found {len(products_to_upload)} products to upload.")
-
-    # Loop through and insert each product
-    for i, product in enumerate(products_to_upload):
-        try:
-            # Use the insert_product method from your DatabaseClient class
-            db.insert_product(product)
-            print(f"  ({i+1}/{len(products_to_upload)}) Successfully uploaded: {product.get('name')}")
-        except Exception as e:
-            print(f"  ({i+1}/{len(products_to_upload)}) ❌ Failed to upload {product.get('name')}: {e}")
-
-    print("\n✅ Product upload process complete!")
+    try:
+        load = db.sync_products if sync else db.upsert_products
+        stats = load(iter_csv_products(csv_path, chunk_size), chunk_size=chunk_size, on_chunk=_print_progress)
+    except Exception as e:
+        print(f"❌ Product {'sync' if sync else 'upload'} failed: {e}")
+        return
+    print(f"\n✅ Product {'sync' if sync else 'upload'} complete! {stats['inserted']} inserted, "
+          f"{stats['updated']} updated, {stats['deleted']} removed, {stats['unchanged']} unchanged.")
 
 if __name__ == "__main__":
-    upload_products_from_csv()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load products.csv into the database.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="rows per CSV read / database batch")
+    parser.add_argument("--sync", action="store_true",
+                        help="treat the CSV as the full catalog and soft-delete products missing from it")
+    args = parser.parse_args()
+    upload_products_from_csv(chunk_size=args.chunk_size, sync=args.sync)
@@ -0,0 +1,35 @@
+"""
+Scheduled maintenance for the user_progress event log (run daily, e.g. from cron):
+
+    python -m src.database.maintenance [--retention-months N] [--vacuum]
+
+Rolls raw progress rows older than the retention window up into user_progress_daily
+and removes them (on Supabase: creates upcoming monthly partitions and drops expired
+ones). See DatabaseClient.compact_user_progress. --vacuum first converts a SQLite
+database created before incremental auto-vacuum was enabled (a one-off full VACUUM).
+"""
+import sys
+import time
+import argparse
+
+from .db_client import PROGRESS_RETENTION_MONTHS, get_db_client
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Roll up and expire old user_progress rows.")
+    parser.add_argument("--retention-months", type=int, default=PROGRESS_RETENTION_MONTHS,
+                        help=f"whole months of raw rows to keep (default: {PROGRESS_RETENTION_MONTHS})")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="SQLite: rebuild the file once with incremental auto-vacuum first")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.vacuum:
+        get_db_client().vacuum_sqlite()
+    result = get_db_client().compact_user_progress(args.retention_months)
+    print(f"✅ Progress maintenance done in {time.perf_counter() - start:.1f}s: {result}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
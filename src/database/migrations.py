@@ -0,0 +1,1171 @@
+"""
+Versioned schema migrations for the SQLite fallback and the Supabase (Postgres) database.
+
+Every schema change is one Migration in MIGRATIONS, with its statements for each
+dialect. Applied versions are recorded in a `schema_version` table, so each migration
+runs exactly once per database, in order, in its own transaction.
+
+    python -m src.database.migrations apply [--url URL] [--target N]
+    python -m src.database.migrations check [--url URL]
+    python -m src.database.migrations render postgresql [-o FILE]
+
+`apply` and `check` use DATABASE_URL unless --url is given (for Supabase, use the
+Postgres connection string of the project; needs a Postgres driver such as psycopg2).
+`render postgresql` prints an idempotent script for the Supabase SQL editor;
+deployment/setup_supabase_tables.sql is generated with it.
+"""
+import os
+import sys
+import argparse
+import textwrap
+
+from sqlalchemy import text
+
+from .db_client import (
+    DATABASE_URL,
+    PRODUCT_TAG_COLUMNS,
+    PROGRESS_INDEXED_COLUMNS,
+    SUMMARY_LATEST_COLUMNS,
+    _sqlite_tag_values,
+    get_engine,
+)
+
+# Apply pending migrations when a DatabaseClient starts, instead of refusing to run
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+
+DIALECTS = ("sqlite", "postgresql")
+
+SCHEMA_VERSION_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+class Migration:
+    """
+    One schema change. `sqlite` and `postgresql` are sequences of steps; a step is a
+    single SQL statement, or (SQLite only) a callable taking the connection, for
+    changes that depend on what the database already has.
+    """
+
+    __slots__ = ("version", "name", "sqlite", "postgresql")
+
+    def __init__(self, version: int, name: str, sqlite=(), postgresql=()):
+        self.version = version
+        self.name = name
+        self.sqlite = tuple(sqlite)
+        self.postgresql = tuple(postgresql)
+
+    def steps(self, dialect: str) -> tuple:
+        if dialect not in DIALECTS:
+            raise ValueError(f"Unsupported dialect {dialect!r}; expected one of {DIALECTS}")
+        return getattr(self, dialect)
+
+
+def _add_sqlite_columns(table: str, columns: dict):
+    """Step adding `columns` ({name: type}) to `table` where missing (SQLite has no ADD COLUMN IF NOT EXISTS)."""
+    def add_columns(conn):
+        existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))}
+        for column, ddl in columns.items():
+            if column not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    add_columns.__doc__ = f"Add {', '.join(columns)} to {table} where missing"
+    return add_columns
+
+
+def _sqlite_insert_tags(source: str) -> str:
+    return "\n".join(
+        f"INSERT OR IGNORE INTO product_tags (product_id, kind, tag) "
+        f"SELECT {source}.id, '{kind}', lower(trim(value)) FROM {_sqlite_tag_values(f'{source}.{column}')} "
+        f"WHERE trim(value) <> '';"
+        for kind, column in PRODUCT_TAG_COLUMNS.items()
+    )
+
+
+def _sqlite_summary_latest_updates() -> str:
+    # Written-behind records can arrive out of order, so latest_* only moves forward
+    is_newer = "excluded.last_timestamp >= user_progress_summary.last_timestamp"
+    return ",\n".join(
+        f"latest_{col} = CASE WHEN {is_newer} THEN excluded.latest_{col} ELSE latest_{col} END"
+        for col in SUMMARY_LATEST_COLUMNS
+    )
+
+
+def _pg_tag_array(column: str) -> str:
+    return (
+        f"array_remove(string_to_array(lower(regexp_replace(btrim(coalesce({column}, '')), "
+        f"'\\s*,\\s*', ',', 'g')), ','), '')"
+    )
+
+
+# Postgres: user_progress history as events (raw rows plus daily rollups), see PROGRESS_EVENTS_SQL
+_PG_PROGRESS_EVENTS = """
+    SELECT user_id, timestamp AS ts, id AS seq, 1 AS samples, timestamp AS first_ts,
+           skin_type, skin_tone, acne_severity AS latest_acne, oiliness_level AS latest_oiliness,
+           COALESCE(acne_severity, 0) AS acne_sum, (acne_severity IS NOT NULL)::int AS acne_count,
+           acne_severity AS acne_min, acne_severity AS acne_max,
+           COALESCE(oiliness_level, 0) AS oiliness_sum, (oiliness_level IS NOT NULL)::int AS oiliness_count,
+           oiliness_level AS oiliness_min, oiliness_level AS oiliness_max
+    FROM user_progress WHERE {where}
+    UNION ALL
+    SELECT user_id, last_timestamp, 0, samples, first_timestamp,
+           latest_skin_type, latest_skin_tone, latest_acne_severity, latest_oiliness_level,
+           acne_severity_sum, acne_severity_count, acne_severity_min, acne_severity_max,
+           oiliness_level_sum, oiliness_level_count, oiliness_level_min, oiliness_level_max
+    FROM user_progress_daily WHERE {where}
+"""
+
+# Natural product key (see db_client.product_key, which also maps a NULL brand to '')
+_PRODUCT_KEY_INDEX_SQL = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_products_brand_name "
+    "ON products(COALESCE(brand, ''), name) WHERE deleted_at IS NULL"
+)
+_PRODUCT_DEDUPE_SQL = """
+    UPDATE products SET deleted_at = {now}, updated_at = {now}
+    WHERE deleted_at IS NULL AND id NOT IN (
+        SELECT MIN(id) FROM products WHERE deleted_at IS NULL GROUP BY COALESCE(brand, ''), name
+    )
+"""
+
+
+MIGRATIONS = (
+    Migration(1, "initial_schema", sqlite=(
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            brand TEXT,
+            category TEXT,
+            skin_type TEXT,
+            concerns TEXT,
+            price REAL,
+            rating REAL,
+            description TEXT,
+            ingredients TEXT,
+            purchase_link TEXT,
+            image_url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_progress (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            skin_type TEXT,
+            acne_severity REAL,
+            oiliness_level REAL,
+            skin_tone TEXT,
+            image_path TEXT,
+            confidence_scores TEXT, -- stored as JSON string
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_products_category ON products(category)",
+        "CREATE INDEX IF NOT EXISTS idx_products_price ON products(price)",
+        "CREATE INDEX IF NOT EXISTS idx_products_rating ON products(rating)",
+    ), postgresql=(
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            id BIGSERIAL PRIMARY KEY,
+            name TEXT NOT NULL,
+            brand TEXT,
+            category TEXT,
+            skin_type TEXT,
+            concerns TEXT,
+            price DECIMAL(10,2),
+            rating DECIMAL(3,2),
+            description TEXT,
+            ingredients TEXT,
+            purchase_link TEXT,
+            image_url TEXT,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_progress (
+            id BIGSERIAL PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            skin_type TEXT,
+            acne_severity DECIMAL(5,3),
+            oiliness_level DECIMAL(5,3),
+            skin_tone TEXT,
+            image_path TEXT,
+            confidence_scores JSONB,
+            timestamp TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_products_skin_type ON products(skin_type)",
+        "CREATE INDEX IF NOT EXISTS idx_products_category ON products(category)",
+        "CREATE INDEX IF NOT EXISTS idx_products_price ON products(price)",
+        "CREATE INDEX IF NOT EXISTS idx_products_rating ON products(rating)",
+        "CREATE INDEX IF NOT EXISTS idx_user_progress_user_id ON user_progress(user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_user_progress_timestamp ON user_progress(timestamp)",
+        "ALTER TABLE products ENABLE ROW LEVEL SECURITY",
+        "ALTER TABLE user_progress ENABLE ROW LEVEL SECURITY",
+        'DROP POLICY IF EXISTS "Allow public read access to products" ON products',
+        """
+        CREATE POLICY "Allow public read access to products" ON products
+            FOR SELECT USING (true)
+        """,
+        'DROP POLICY IF EXISTS "Users can view own progress" ON user_progress',
+        """
+        CREATE POLICY "Users can view own progress" ON user_progress
+            FOR SELECT USING (true) -- For demo purposes, allow all reads
+        """,
+        'DROP POLICY IF EXISTS "Users can insert own progress" ON user_progress',
+        """
+        CREATE POLICY "Users can insert own progress" ON user_progress
+            FOR INSERT WITH CHECK (true) -- For demo purposes, allow all inserts
+        """,
+    )),
+
+    # Columns and natural-key index used by the incremental catalog sync
+    Migration(2, "product_sync_columns", sqlite=(
+        _add_sqlite_columns("products", {"content_hash": "TEXT", "deleted_at": "TIMESTAMP"}),
+        "CREATE INDEX IF NOT EXISTS idx_products_brand_name ON products(brand, name)",
+    ), postgresql=(
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS content_hash TEXT",
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP WITH TIME ZONE",
+        "CREATE INDEX IF NOT EXISTS idx_products_brand_name ON products(brand, name)",
+    )),
+
+    # Normalized skin_type / concerns tags, so filters use an index instead of LIKE '%x%'.
+    # SQLite keeps them in product_tags (maintained by triggers); Postgres uses generated
+    # arrays (existing rows are backfilled when the column is added) with GIN indexes.
+    Migration(3, "product_tags", sqlite=(
+        """
+        CREATE TABLE IF NOT EXISTS product_tags (
+            product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+            kind TEXT NOT NULL,
+            tag TEXT NOT NULL,
+            PRIMARY KEY (product_id, kind, tag)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_product_tags_lookup ON product_tags(kind, tag, product_id)",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_products_tags_insert AFTER INSERT ON products
+        BEGIN
+            {_sqlite_insert_tags("NEW")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_products_tags_update AFTER UPDATE OF skin_type, concerns ON products
+        BEGIN
+            DELETE FROM product_tags WHERE product_id = NEW.id;
+            {_sqlite_insert_tags("NEW")}
+        END
+        """,
+        # Backfill tags for products loaded before the table existed
+        *(
+            f"INSERT OR IGNORE INTO product_tags (product_id, kind, tag) "
+            f"SELECT p.id, '{kind}', lower(trim(value)) FROM products p, {_sqlite_tag_values(f'p.{column}')} "
+            f"WHERE trim(value) <> ''"
+            for kind, column in PRODUCT_TAG_COLUMNS.items()
+        ),
+    ), postgresql=(
+        f"""
+        ALTER TABLE products ADD COLUMN IF NOT EXISTS skin_type_tags TEXT[]
+            GENERATED ALWAYS AS ({_pg_tag_array("skin_type")}) STORED
+        """,
+        f"""
+        ALTER TABLE products ADD COLUMN IF NOT EXISTS concern_tags TEXT[]
+            GENERATED ALWAYS AS ({_pg_tag_array("concerns")}) STORED
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_products_skin_type_tags ON products USING GIN (skin_type_tags)",
+        "CREATE INDEX IF NOT EXISTS idx_products_concern_tags ON products USING GIN (concern_tags)",
+    )),
+
+    # Ranked full-text catalog search (name > ingredients > brand > description)
+    Migration(4, "product_search", sqlite=(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            name, brand, description, ingredients,
+            content = 'products', content_rowid = 'id',
+            tokenize = 'porter unicode61 remove_diacritics 2'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_insert AFTER INSERT ON products
+        BEGIN
+            INSERT INTO products_fts (rowid, name, brand, description, ingredients)
+            VALUES (NEW.id, NEW.name, NEW.brand, NEW.description, NEW.ingredients);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_delete AFTER DELETE ON products
+        BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, brand, description, ingredients)
+            VALUES ('delete', OLD.id, OLD.name, OLD.brand, OLD.description, OLD.ingredients);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_update
+        AFTER UPDATE OF name, brand, description, ingredients ON products
+        BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, brand, description, ingredients)
+            VALUES ('delete', OLD.id, OLD.name, OLD.brand, OLD.description, OLD.ingredients);
+            INSERT INTO products_fts (rowid, name, brand, description, ingredients)
+            VALUES (NEW.id, NEW.name, NEW.brand, NEW.description, NEW.ingredients);
+        END
+        """,
+        "INSERT INTO products_fts (products_fts) VALUES ('rebuild')",
+    ), postgresql=(
+        """
+        ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(ingredients, '')), 'B') ||
+                setweight(to_tsvector('english', coalesce(brand, '')), 'C') ||
+                setweight(to_tsvector('english', coalesce(description, '')), 'D')
+            ) STORED
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_products_search_vector ON products USING GIN (search_vector)",
+        # Called via supabase.rpc("search_products", ...) from DatabaseClient
+        """
+        CREATE OR REPLACE FUNCTION search_products(
+            p_query TEXT,
+            p_max_budget NUMERIC DEFAULT NULL,
+            p_min_rating NUMERIC DEFAULT NULL,
+            p_skin_type TEXT DEFAULT NULL,
+            p_categories TEXT[] DEFAULT NULL,
+            p_concerns TEXT[] DEFAULT NULL,
+            p_limit INT DEFAULT 20,
+            p_offset INT DEFAULT 0
+        )
+        RETURNS TABLE (
+            id BIGINT, name TEXT, brand TEXT, category TEXT, skin_type TEXT, concerns TEXT,
+            price DECIMAL(10,2), rating DECIMAL(3,2), description TEXT, ingredients TEXT,
+            purchase_link TEXT, image_url TEXT, search_rank REAL
+        )
+        LANGUAGE sql STABLE
+        AS $$
+            SELECT p.id, p.name, p.brand, p.category, p.skin_type, p.concerns,
+                   p.price, p.rating, p.description, p.ingredients, p.purchase_link, p.image_url,
+                   ts_rank(p.search_vector, q) AS search_rank
+            FROM products p, websearch_to_tsquery('english', p_query) q
+            WHERE p.search_vector @@ q
+              AND p.deleted_at IS NULL
+              AND (p_max_budget IS NULL OR p.price <= p_max_budget)
+              AND (p_min_rating IS NULL OR p.rating >= p_min_rating)
+              AND (p_skin_type IS NULL OR p.skin_type_tags @> ARRAY[p_skin_type])
+              AND (p_categories IS NULL OR p.category = ANY(p_categories))
+              AND (p_concerns IS NULL OR p.concern_tags && p_concerns)
+            ORDER BY search_rank DESC, p.id
+            LIMIT p_limit OFFSET p_offset;
+        $$
+        """,
+    )),
+
+    # Server-side top-K recommendations; SQLite computes the same ORDER BY inline
+    Migration(5, "recommend_products_rpc", postgresql=(
+        """
+        CREATE OR REPLACE FUNCTION recommend_products(
+            p_price_scale NUMERIC,
+            p_rating_weight NUMERIC DEFAULT 0.4,
+            p_price_weight NUMERIC DEFAULT 0.3,
+            p_base_weight NUMERIC DEFAULT 0.3,
+            p_max_budget NUMERIC DEFAULT NULL,
+            p_min_rating NUMERIC DEFAULT NULL,
+            p_skin_type TEXT DEFAULT NULL,
+            p_categories TEXT[] DEFAULT NULL,
+            p_concerns TEXT[] DEFAULT NULL,
+            p_limit INT DEFAULT 6
+        )
+        RETURNS TABLE (
+            id BIGINT, name TEXT, brand TEXT, category TEXT, skin_type TEXT, concerns TEXT,
+            price DECIMAL(10,2), rating DECIMAL(3,2), description TEXT, ingredients TEXT,
+            purchase_link TEXT, image_url TEXT, match_score NUMERIC
+        )
+        LANGUAGE sql STABLE
+        AS $$
+            SELECT p.id, p.name, p.brand, p.category, p.skin_type, p.concerns,
+                   p.price, p.rating, p.description, p.ingredients, p.purchase_link, p.image_url,
+                   p.rating / 5.0 * p_rating_weight + (1 - p.price / p_price_scale) * p_price_weight + p_base_weight
+                       AS match_score
+            FROM products p
+            WHERE p.deleted_at IS NULL
+              AND (p_max_budget IS NULL OR p.price <= p_max_budget)
+              AND (p_min_rating IS NULL OR p.rating >= p_min_rating)
+              AND (p_skin_type IS NULL OR p.skin_type_tags @> ARRAY[p_skin_type])
+              AND (p_categories IS NULL OR p.category = ANY(p_categories))
+              AND (p_concerns IS NULL OR p.concern_tags && p_concerns)
+            ORDER BY match_score DESC NULLS LAST, p.id
+            LIMIT p_limit;
+        $$
+        """,
+    )),
+
+    # Day/week/month aggregates of one user's progress; SQLite computes them inline
+    Migration(6, "user_progress_buckets_rpc", postgresql=(
+        """
+        CREATE OR REPLACE FUNCTION user_progress_buckets(p_user_id TEXT, p_bucket TEXT DEFAULT 'day')
+        RETURNS TABLE (
+            bucket DATE, samples BIGINT,
+            acne_severity_mean NUMERIC, acne_severity_min NUMERIC, acne_severity_max NUMERIC,
+            oiliness_level_mean NUMERIC, oiliness_level_min NUMERIC, oiliness_level_max NUMERIC,
+            last_skin_type TEXT, last_skin_tone TEXT, last_acne_severity NUMERIC, last_oiliness_level NUMERIC
+        )
+        LANGUAGE sql STABLE
+        AS $$
+            SELECT date_trunc(p_bucket, up.timestamp)::date AS bucket,
+                   COUNT(*),
+                   AVG(up.acne_severity), MIN(up.acne_severity), MAX(up.acne_severity),
+                   AVG(up.oiliness_level), MIN(up.oiliness_level), MAX(up.oiliness_level),
+                   (array_agg(up.skin_type ORDER BY up.timestamp DESC, up.id DESC))[1],
+                   (array_agg(up.skin_tone ORDER BY up.timestamp DESC, up.id DESC))[1],
+                   (array_agg(up.acne_severity ORDER BY up.timestamp DESC, up.id DESC))[1],
+                   (array_agg(up.oiliness_level ORDER BY up.timestamp DESC, up.id DESC))[1]
+            FROM user_progress up
+            WHERE up.user_id = p_user_id
+            GROUP BY 1
+            ORDER BY 1;
+        $$
+        """,
+    )),
+
+    # One row per user, kept current by an insert trigger (read by DatabaseClient.get_user_summary)
+    Migration(7, "user_progress_summary", sqlite=(
+        """
+        CREATE TABLE IF NOT EXISTS user_progress_summary (
+            user_id TEXT PRIMARY KEY,
+            samples INTEGER NOT NULL,
+            first_timestamp TIMESTAMP,
+            last_timestamp TIMESTAMP,
+            latest_skin_type TEXT,
+            latest_skin_tone TEXT,
+            latest_acne_severity REAL,
+            latest_oiliness_level REAL,
+            acne_severity_sum REAL NOT NULL DEFAULT 0,
+            acne_severity_count INTEGER NOT NULL DEFAULT 0,
+            oiliness_level_sum REAL NOT NULL DEFAULT 0,
+            oiliness_level_count INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_user_progress_summary AFTER INSERT ON user_progress
+        BEGIN
+            INSERT INTO user_progress_summary (
+                user_id, samples, first_timestamp, last_timestamp,
+                latest_skin_type, latest_skin_tone, latest_acne_severity, latest_oiliness_level,
+                acne_severity_sum, acne_severity_count, oiliness_level_sum, oiliness_level_count
+            ) VALUES (
+                NEW.user_id, 1, NEW.timestamp, NEW.timestamp,
+                NEW.skin_type, NEW.skin_tone, NEW.acne_severity, NEW.oiliness_level,
+                COALESCE(NEW.acne_severity, 0), NEW.acne_severity IS NOT NULL,
+                COALESCE(NEW.oiliness_level, 0), NEW.oiliness_level IS NOT NULL
+            )
+            ON CONFLICT (user_id) DO UPDATE SET
+                samples = samples + 1,
+                first_timestamp = min(first_timestamp, excluded.first_timestamp),
+                {_sqlite_summary_latest_updates()},
+                last_timestamp = max(last_timestamp, excluded.last_timestamp),
+                acne_severity_sum = acne_severity_sum + excluded.acne_severity_sum,
+                acne_severity_count = acne_severity_count + excluded.acne_severity_count,
+                oiliness_level_sum = oiliness_level_sum + excluded.oiliness_level_sum,
+                oiliness_level_count = oiliness_level_count + excluded.oiliness_level_count;
+        END
+        """,
+        # Backfill summaries for progress recorded before the table existed
+        """
+        WITH latest AS (
+            SELECT * FROM (
+                SELECT user_id, skin_type, skin_tone, acne_severity, oiliness_level,
+                       ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY timestamp DESC, id DESC) AS rn
+                FROM user_progress
+            ) WHERE rn = 1
+        )
+        INSERT OR REPLACE INTO user_progress_summary (
+            user_id, samples, first_timestamp, last_timestamp,
+            latest_skin_type, latest_skin_tone, latest_acne_severity, latest_oiliness_level,
+            acne_severity_sum, acne_severity_count, oiliness_level_sum, oiliness_level_count
+        )
+        SELECT p.user_id, COUNT(*), MIN(p.timestamp), MAX(p.timestamp),
+               l.skin_type, l.skin_tone, l.acne_severity, l.oiliness_level,
+               TOTAL(p.acne_severity), COUNT(p.acne_severity), TOTAL(p.oiliness_level), COUNT(p.oiliness_level)
+        FROM user_progress p JOIN latest l ON l.user_id = p.user_id
+        GROUP BY p.user_id
+        """,
+    ), postgresql=(
+        """
+        CREATE TABLE IF NOT EXISTS user_progress_summary (
+            user_id TEXT PRIMARY KEY,
+            samples BIGINT NOT NULL,
+            first_timestamp TIMESTAMP WITH TIME ZONE,
+            last_timestamp TIMESTAMP WITH TIME ZONE,
+            latest_skin_type TEXT,
+            latest_skin_tone TEXT,
+            latest_acne_severity DECIMAL(5,3),
+            latest_oiliness_level DECIMAL(5,3),
+            acne_severity_sum NUMERIC NOT NULL DEFAULT 0,
+            acne_severity_count BIGINT NOT NULL DEFAULT 0,
+            oiliness_level_sum NUMERIC NOT NULL DEFAULT 0,
+            oiliness_level_count BIGINT NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE OR REPLACE FUNCTION user_progress_summary_on_insert()
+        RETURNS TRIGGER
+        LANGUAGE plpgsql
+        SECURITY DEFINER  -- clients never write the summary directly (see RLS below)
+        AS $$
+        BEGIN
+            INSERT INTO user_progress_summary AS s (
+                user_id, samples, first_timestamp, last_timestamp,
+                latest_skin_type, latest_skin_tone, latest_acne_severity, latest_oiliness_level,
+                acne_severity_sum, acne_severity_count, oiliness_level_sum, oiliness_level_count
+            ) VALUES (
+                NEW.user_id, 1, NEW.timestamp, NEW.timestamp,
+                NEW.skin_type, NEW.skin_tone, NEW.acne_severity, NEW.oiliness_level,
+                COALESCE(NEW.acne_severity, 0), (NEW.acne_severity IS NOT NULL)::int,
+                COALESCE(NEW.oiliness_level, 0), (NEW.oiliness_level IS NOT NULL)::int
+            )
+            ON CONFLICT (user_id) DO UPDATE SET
+                samples = s.samples + 1,
+                first_timestamp = LEAST(s.first_timestamp, EXCLUDED.first_timestamp),
+                -- Written-behind records can arrive out of order, so latest_* only moves forward
+                latest_skin_type = CASE WHEN EXCLUDED.last_timestamp >= s.last_timestamp THEN EXCLUDED.latest_skin_type ELSE s.latest_skin_type END,
+                latest_skin_tone = CASE WHEN EXCLUDED.last_timestamp >= s.last_timestamp THEN EXCLUDED.latest_skin_tone ELSE s.latest_skin_tone END,
+                latest_acne_severity = CASE WHEN EXCLUDED.last_timestamp >= s.last_timestamp THEN EXCLUDED.latest_acne_severity ELSE s.latest_acne_severity END,
+                latest_oiliness_level = CASE WHEN EXCLUDED.last_timestamp >= s.last_timestamp THEN EXCLUDED.latest_oiliness_level ELSE s.latest_oiliness_level END,
+                last_timestamp = GREATEST(s.last_timestamp, EXCLUDED.last_timestamp),
+                acne_severity_sum = s.acne_severity_sum + EXCLUDED.acne_severity_sum,
+                acne_severity_count = s.acne_severity_count + EXCLUDED.acne_severity_count,
+                oiliness_level_sum = s.oiliness_level_sum + EXCLUDED.oiliness_level_sum,
+                oiliness_level_count = s.oiliness_level_count + EXCLUDED.oiliness_level_count;
+            RETURN NULL;
+        END;
+        $$
+        """,
+        "DROP TRIGGER IF EXISTS trg_user_progress_summary ON user_progress",
+        """
+        CREATE TRIGGER trg_user_progress_summary
+            AFTER INSERT ON user_progress
+            FOR EACH ROW EXECUTE FUNCTION user_progress_summary_on_insert()
+        """,
+        # Recomputes summaries (all users when p_user_ids is NULL) after updates or deletes
+        """
+        CREATE OR REPLACE FUNCTION rebuild_user_progress_summary(p_user_ids TEXT[] DEFAULT NULL)
+        RETURNS VOID
+        LANGUAGE sql
+        SECURITY DEFINER
+        AS $$
+            DELETE FROM user_progress_summary
+            WHERE p_user_ids IS NULL OR user_id = ANY(p_user_ids);
+
+            INSERT INTO user_progress_summary (
+                user_id, samples, first_timestamp, last_timestamp,
+                latest_skin_type, latest_skin_tone, latest_acne_severity, latest_oiliness_level,
+                acne_severity_sum, acne_severity_count, oiliness_level_sum, oiliness_level_count
+            )
+            SELECT agg.user_id, agg.samples, agg.first_timestamp, agg.last_timestamp,
+                   l.skin_type, l.skin_tone, l.acne_severity, l.oiliness_level,
+                   agg.acne_severity_sum, agg.acne_severity_count, agg.oiliness_level_sum, agg.oiliness_level_count
+            FROM (
+                SELECT user_id, COUNT(*) AS samples, MIN(timestamp) AS first_timestamp, MAX(timestamp) AS last_timestamp,
+                       COALESCE(SUM(acne_severity), 0) AS acne_severity_sum, COUNT(acne_severity) AS acne_severity_count,
+                       COALESCE(SUM(oiliness_level), 0) AS oiliness_level_sum, COUNT(oiliness_level) AS oiliness_level_count
+                FROM user_progress
+                WHERE p_user_ids IS NULL OR user_id = ANY(p_user_ids)
+                GROUP BY user_id
+            ) agg
+            JOIN (
+                SELECT DISTINCT ON (user_id) user_id, skin_type, skin_tone, acne_severity, oiliness_level
+                FROM user_progress
+                WHERE p_user_ids IS NULL OR user_id = ANY(p_user_ids)
+                ORDER BY user_id, timestamp DESC, id DESC
+            ) l ON l.user_id = agg.user_id;
+        $$
+        """,
+        "SELECT rebuild_user_progress_summary()",
+        "ALTER TABLE user_progress_summary ENABLE ROW LEVEL SECURITY",
+        'DROP POLICY IF EXISTS "Users can view own progress summary" ON user_progress_summary',
+        """
+        CREATE POLICY "Users can view own progress summary" ON user_progress_summary
+            FOR SELECT USING (true) -- For demo purposes, allow all reads
+        """,
+    )),
+
+    # Per-user time-range reads; the extra columns make chart queries index-only
+    Migration(8, "user_progress_user_time_index", sqlite=(
+        "CREATE INDEX IF NOT EXISTS idx_user_progress_user_time ON user_progress"
+        f"(user_id, timestamp, {', '.join(PROGRESS_INDEXED_COLUMNS[3:])})",
+    ), postgresql=(
+        "CREATE INDEX IF NOT EXISTS idx_user_progress_user_time ON user_progress(user_id, timestamp) "
+        f"INCLUDE ({', '.join(PROGRESS_INDEXED_COLUMNS[3:])})",
+        "DROP INDEX IF EXISTS idx_user_progress_user_id",
+        "DROP INDEX IF EXISTS idx_user_progress_timestamp",
+    )),
+
+    # Monthly partitioning of user_progress and the retention rollup. Postgres converts the
+    # table to RANGE partitions on timestamp (the primary key becomes (id, timestamp)) and
+    # gets maintain_user_progress() to create upcoming partitions and drop expired ones
+    # after rolling them up. SQLite has no partitioning: DatabaseClient.compact_user_progress
+    # rolls up and deletes expired months, using the timestamp index added here.
+    Migration(9, "user_progress_partitions_and_rollups", sqlite=(
+        """
+        CREATE TABLE IF NOT EXISTS user_progress_daily (
+            user_id TEXT NOT NULL,
+            day DATE NOT NULL,
+            samples INTEGER NOT NULL,
+            first_timestamp TIMESTAMP,
+            last_timestamp TIMESTAMP,
+            latest_skin_type TEXT,
+            latest_skin_tone TEXT,
+            latest_acne_severity REAL,
+            latest_oiliness_level REAL,
+            acne_severity_sum REAL NOT NULL DEFAULT 0,
+            acne_severity_count INTEGER NOT NULL DEFAULT 0,
+            acne_severity_min REAL,
+            acne_severity_max REAL,
+            oiliness_level_sum REAL NOT NULL DEFAULT 0,
+            oiliness_level_count INTEGER NOT NULL DEFAULT 0,
+            oiliness_level_min REAL,
+            oiliness_level_max REAL,
+            PRIMARY KEY (user_id, day)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_user_progress_timestamp ON user_progress(timestamp)",
+    ), postgresql=(
+        """
+        CREATE TABLE IF NOT EXISTS user_progress_daily (
+            user_id TEXT NOT NULL,
+            day DATE NOT NULL,
+            samples BIGINT NOT NULL,
+            first_timestamp TIMESTAMP WITH TIME ZONE,
+            last_timestamp TIMESTAMP WITH TIME ZONE,
+            latest_skin_type TEXT,
+            latest_skin_tone TEXT,
+            latest_acne_severity DECIMAL(5,3),
+            latest_oiliness_level DECIMAL(5,3),
+            acne_severity_sum NUMERIC NOT NULL DEFAULT 0,
+            acne_severity_count BIGINT NOT NULL DEFAULT 0,
+            acne_severity_min DECIMAL(5,3),
+            acne_severity_max DECIMAL(5,3),
+            oiliness_level_sum NUMERIC NOT NULL DEFAULT 0,
+            oiliness_level_count BIGINT NOT NULL DEFAULT 0,
+            oiliness_level_min DECIMAL(5,3),
+            oiliness_level_max DECIMAL(5,3),
+            PRIMARY KEY (user_id, day)
+        )
+        """,
+        "ALTER TABLE user_progress_daily ENABLE ROW LEVEL SECURITY",
+        """
+        CREATE POLICY "Users can view own progress rollups" ON user_progress_daily
+            FOR SELECT USING (true) -- For demo purposes, allow all reads
+        """,
+        # Swap in a partitioned table; the id sequence is kept so ids stay unique
+        "ALTER TABLE user_progress RENAME TO user_progress_unpartitioned",
+        "ALTER INDEX IF EXISTS idx_user_progress_user_time RENAME TO idx_user_progress_unpartitioned_user_time",
+        "ALTER SEQUENCE user_progress_id_seq OWNED BY NONE",
+        """
+        CREATE TABLE user_progress (
+            id BIGINT NOT NULL DEFAULT nextval('user_progress_id_seq'),
+            user_id TEXT NOT NULL,
+            skin_type TEXT,
+            acne_severity DECIMAL(5,3),
+            oiliness_level DECIMAL(5,3),
+            skin_tone TEXT,
+            image_path TEXT,
+            confidence_scores JSONB,
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+        """,
+        "ALTER SEQUENCE user_progress_id_seq OWNED BY user_progress.id",
+        "CREATE TABLE user_progress_default PARTITION OF user_progress DEFAULT",
+        "CREATE INDEX idx_user_progress_user_time ON user_progress(user_id, timestamp) "
+        f"INCLUDE ({', '.join(PROGRESS_INDEXED_COLUMNS[3:])})",
+        """
+        CREATE OR REPLACE FUNCTION create_user_progress_partitions(p_from DATE DEFAULT NULL, p_months_ahead INT DEFAULT 3)
+        RETURNS INT
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            v_month DATE := date_trunc('month', COALESCE(p_from, now()))::date;
+            v_last DATE := (date_trunc('month', now()) + make_interval(months => p_months_ahead))::date;
+            v_name TEXT;
+            v_created INT := 0;
+        BEGIN
+            WHILE v_month <= v_last LOOP
+                v_name := 'user_progress_' || to_char(v_month, 'YYYY_MM');
+                IF to_regclass(v_name) IS NULL THEN
+                    EXECUTE format('CREATE TABLE %I PARTITION OF user_progress FOR VALUES FROM (%L) TO (%L)',
+                                   v_name, v_month, (v_month + INTERVAL '1 month')::date);
+                    v_created := v_created + 1;
+                END IF;
+                v_month := (v_month + INTERVAL '1 month')::date;
+            END LOOP;
+            RETURN v_created;
+        END;
+        $$
+        """,
+        "SELECT create_user_progress_partitions((SELECT MIN(timestamp) FROM user_progress_unpartitioned)::date)",
+        """
+        INSERT INTO user_progress
+            (id, user_id, skin_type, acne_severity, oiliness_level, skin_tone, image_path, confidence_scores, timestamp)
+        SELECT id, user_id, skin_type, acne_severity, oiliness_level, skin_tone, image_path, confidence_scores,
+               COALESCE(timestamp, NOW())
+        FROM user_progress_unpartitioned
+        """,
+        "DROP TABLE user_progress_unpartitioned",
+        # Re-attach the summary trigger and RLS to the new table (after the copy, so rows aren't counted twice)
+        """
+        CREATE TRIGGER trg_user_progress_summary
+            AFTER INSERT ON user_progress
+            FOR EACH ROW EXECUTE FUNCTION user_progress_summary_on_insert()
+        """,
+        "ALTER TABLE user_progress ENABLE ROW LEVEL SECURITY",
+        """
+        CREATE POLICY "Users can view own progress" ON user_progress
+            FOR SELECT USING (true) -- For demo purposes, allow all reads
+        """,
+        """
+        CREATE POLICY "Users can insert own progress" ON user_progress
+            FOR INSERT WITH CHECK (true) -- For demo purposes, allow all inserts
+        """,
+        # Rolls raw rows in [p_from, p_to) into user_progress_daily; returns the raw row count
+        """
+        CREATE OR REPLACE FUNCTION rollup_user_progress(p_from TIMESTAMPTZ, p_to TIMESTAMPTZ)
+        RETURNS BIGINT
+        LANGUAGE sql
+        AS $$
+            INSERT INTO user_progress_daily AS d (
+                user_id, day, samples, first_timestamp, last_timestamp,
+                latest_skin_type, latest_skin_tone, latest_acne_severity, latest_oiliness_level,
+                acne_severity_sum, acne_severity_count, acne_severity_min, acne_severity_max,
+                oiliness_level_sum, oiliness_level_count, oiliness_level_min, oiliness_level_max
+            )
+            SELECT user_id, timestamp::date, COUNT(*), MIN(timestamp), MAX(timestamp),
+                   (array_agg(skin_type ORDER BY timestamp DESC, id DESC))[1],
+                   (array_agg(skin_tone ORDER BY timestamp DESC, id DESC))[1],
+                   (array_agg(acne_severity ORDER BY timestamp DESC, id DESC))[1],
+                   (array_agg(oiliness_level ORDER BY timestamp DESC, id DESC))[1],
+                   COALESCE(SUM(acne_severity), 0), COUNT(acne_severity), MIN(acne_severity), MAX(acne_severity),
+                   COALESCE(SUM(oiliness_level), 0), COUNT(oiliness_level), MIN(oiliness_level), MAX(oiliness_level)
+            FROM user_progress
+            WHERE timestamp >= p_from AND timestamp < p_to
+            GROUP BY user_id, timestamp::date
+            ON CONFLICT (user_id, day) DO UPDATE SET
+                samples = d.samples + EXCLUDED.samples,
+                first_timestamp = LEAST(d.first_timestamp, EXCLUDED.first_timestamp),
+                latest_skin_type = CASE WHEN EXCLUDED.last_timestamp >= d.last_timestamp THEN EXCLUDED.latest_skin_type ELSE d.latest_skin_type END,
+                latest_skin_tone = CASE WHEN EXCLUDED.last_timestamp >= d.last_timestamp THEN EXCLUDED.latest_skin_tone ELSE d.latest_skin_tone END,
+                latest_acne_severity = CASE WHEN EXCLUDED.last_timestamp >= d.last_timestamp THEN EXCLUDED.latest_acne_severity ELSE d.latest_acne_severity END,
+                latest_oiliness_level = CASE WHEN EXCLUDED.last_timestamp >= d.last_timestamp THEN EXCLUDED.latest_oiliness_level ELSE d.latest_oiliness_level END,
+                last_timestamp = GREATEST(d.last_timestamp, EXCLUDED.last_timestamp),
+                acne_severity_sum = d.acne_severity_sum + EXCLUDED.acne_severity_sum,
+                acne_severity_count = d.acne_severity_count + EXCLUDED.acne_severity_count,
+                acne_severity_min = LEAST(d.acne_severity_min, EXCLUDED.acne_severity_min),
+                acne_severity_max = GREATEST(d.acne_severity_max, EXCLUDED.acne_severity_max),
+                oiliness_level_sum = d.oiliness_level_sum + EXCLUDED.oiliness_level_sum,
+                oiliness_level_count = d.oiliness_level_count + EXCLUDED.oiliness_level_count,
+                oiliness_level_min = LEAST(d.oiliness_level_min, EXCLUDED.oiliness_level_min),
+                oiliness_level_max = GREATEST(d.oiliness_level_max, EXCLUDED.oiliness_level_max);
+
+            SELECT COUNT(*) FROM user_progress WHERE timestamp >= p_from AND timestamp < p_to;
+        $$
+        """,
+        # Retention job, called via supabase.rpc("maintain_user_progress", ...) or pg_cron.
+        # Expired monthly partitions are rolled up, detached and dropped (no DELETE, no vacuum);
+        # expired rows left in the default partition are rolled up and deleted.
+        """
+        CREATE OR REPLACE FUNCTION maintain_user_progress(p_retention_months INT DEFAULT 24, p_months_ahead INT DEFAULT 3)
+        RETURNS TABLE (partitions_created INT, partitions_dropped INT, rows_rolled_up BIGINT, cutoff DATE)
+        LANGUAGE plpgsql
+        SECURITY DEFINER
+        AS $$
+        DECLARE
+            v_partition RECORD;
+            v_month DATE;
+        BEGIN
+            cutoff := (date_trunc('month', now()) - make_interval(months => p_retention_months))::date;
+            partitions_created := create_user_progress_partitions(NULL, p_months_ahead);
+            partitions_dropped := 0;
+            rows_rolled_up := 0;
+
+            FOR v_partition IN
+                SELECT c.relname
+                FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'user_progress'::regclass
+                  AND c.relname ~ '^user_progress_[0-9]{4}_[0-9]{2}$'
+                ORDER BY c.relname
+            LOOP
+                v_month := to_date(right(v_partition.relname, 7), 'YYYY_MM');
+                EXIT WHEN v_month + INTERVAL '1 month' > cutoff;
+                rows_rolled_up := rows_rolled_up + rollup_user_progress(v_month, (v_month + INTERVAL '1 month')::date);
+                EXECUTE format('ALTER TABLE user_progress DETACH PARTITION %I', v_partition.relname);
+                EXECUTE format('DROP TABLE %I', v_partition.relname);
+                partitions_dropped := partitions_dropped + 1;
+            END LOOP;
+
+            rows_rolled_up := rows_rolled_up + rollup_user_progress('-infinity', cutoff);
+            DELETE FROM user_progress WHERE timestamp < cutoff;
+            RETURN NEXT;
+        END;
+        $$
+        """,
+        # Schedule the job daily where pg_cron is available (Supabase: Database > Extensions)
+        """
+        DO $cron$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+                PERFORM cron.schedule('maintain-user-progress', '15 3 * * *', 'SELECT maintain_user_progress()');
+            END IF;
+        END
+        $cron$
+        """,
+        # Charts and summaries include the daily rollups of compacted months
+        f"""
+        CREATE OR REPLACE FUNCTION user_progress_buckets(p_user_id TEXT, p_bucket TEXT DEFAULT 'day')
+        RETURNS TABLE (
+            bucket DATE, samples BIGINT,
+            acne_severity_mean NUMERIC, acne_severity_min NUMERIC, acne_severity_max NUMERIC,
+            oiliness_level_mean NUMERIC, oiliness_level_min NUMERIC, oiliness_level_max NUMERIC,
+            last_skin_type TEXT, last_skin_tone TEXT, last_acne_severity NUMERIC, last_oiliness_level NUMERIC
+        )
+        LANGUAGE sql STABLE
+        AS $$
+            SELECT date_trunc(p_bucket, e.ts)::date AS bucket,
+                   SUM(e.samples)::bigint,
+                   SUM(e.acne_sum) / NULLIF(SUM(e.acne_count), 0), MIN(e.acne_min), MAX(e.acne_max),
+                   SUM(e.oiliness_sum) / NULLIF(SUM(e.oiliness_count), 0), MIN(e.oiliness_min), MAX(e.oiliness_max),
+                   (array_agg(e.skin_type ORDER BY e.ts DESC, e.seq DESC))[1],
+                   (array_agg(e.skin_tone ORDER BY e.ts DESC, e.seq DESC))[1],
+                   (array_agg(e.latest_acne ORDER BY e.ts DESC, e.seq DESC))[1],
+                   (array_agg(e.latest_oiliness ORDER BY e.ts DESC, e.seq DESC))[1]
+            FROM ({_PG_PROGRESS_EVENTS.format(where="user_id = p_user_id")}) e
+            GROUP BY 1
+            ORDER BY 1;
+        $$
+        """,
+        f"""
+        CREATE OR REPLACE FUNCTION rebuild_user_progress_summary(p_user_ids TEXT[] DEFAULT NULL)
+        RETURNS VOID
+        LANGUAGE sql
+        SECURITY DEFINER
+        AS $$
+            DELETE FROM user_progress_summary
+            WHERE p_user_ids IS NULL OR user_id = ANY(p_user_ids);
+
+            INSERT INTO user_progress_summary (
+                user_id, samples, first_timestamp, last_timestamp,
+                latest_skin_type, latest_skin_tone, latest_acne_severity, latest_oiliness_level,
+                acne_severity_sum, acne_severity_count, oiliness_level_sum, oiliness_level_count
+            )
+            SELECT e.user_id, SUM(e.samples)::bigint, MIN(e.first_ts), MAX(e.ts),
+                   (array_agg(e.skin_type ORDER BY e.ts DESC, e.seq DESC))[1],
+                   (array_agg(e.skin_tone ORDER BY e.ts DESC, e.seq DESC))[1],
+                   (array_agg(e.latest_acne ORDER BY e.ts DESC, e.seq DESC))[1],
+                   (array_agg(e.latest_oiliness ORDER BY e.ts DESC, e.seq DESC))[1],
+                   COALESCE(SUM(e.acne_sum), 0), SUM(e.acne_count)::bigint,
+                   COALESCE(SUM(e.oiliness_sum), 0), SUM(e.oiliness_count)::bigint
+            FROM ({_PG_PROGRESS_EVENTS.format(where="p_user_ids IS NULL OR user_id = ANY(p_user_ids)")}) e
+            GROUP BY e.user_id;
+        $$
+        """,
+    )),
+
+    # Bulk rewrite of analysis results for offline re-analysis (src.analysis.reanalyze).
+    # Restricted to the service role: clients may only insert progress rows.
+    Migration(10, "update_user_progress_analyses_rpc", postgresql=(
+        """
+        CREATE OR REPLACE FUNCTION update_user_progress_analyses(p_rows JSONB)
+        RETURNS INT
+        LANGUAGE sql
+        SECURITY DEFINER
+        AS $$
+            WITH updated AS (
+                UPDATE user_progress p
+                SET skin_type = r.skin_type,
+                    acne_severity = r.acne_severity,
+                    oiliness_level = r.oiliness_level,
+                    skin_tone = r.skin_tone,
+                    confidence_scores = r.confidence_scores
+                FROM jsonb_to_recordset(p_rows) AS r(
+                    id BIGINT, skin_type TEXT, acne_severity DECIMAL(5,3), oiliness_level DECIMAL(5,3),
+                    skin_tone TEXT, confidence_scores JSONB
+                )
+                WHERE p.id = r.id
+                RETURNING 1
+            )
+            SELECT COUNT(*)::int FROM updated;
+        $$
+        """,
+        "REVOKE EXECUTE ON FUNCTION update_user_progress_analyses(JSONB) FROM PUBLIC",
+        """
+        DO $grants$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'anon') THEN
+                REVOKE EXECUTE ON FUNCTION update_user_progress_analyses(JSONB) FROM anon, authenticated;
+            END IF;
+        END
+        $grants$
+        """,
+    )),
+
+    # (brand, name) becomes unique among active products. Duplicates left by appending
+    # loads are soft-deleted first, keeping the lowest id of each key.
+    Migration(11, "unique_active_product_key", sqlite=(
+        _PRODUCT_DEDUPE_SQL.format(now="CURRENT_TIMESTAMP"),
+        "DROP INDEX IF EXISTS idx_products_brand_name",
+        _PRODUCT_KEY_INDEX_SQL,
+    ), postgresql=(
+        _PRODUCT_DEDUPE_SQL.format(now="NOW()"),
+        "DROP INDEX IF EXISTS idx_products_brand_name",
+        _PRODUCT_KEY_INDEX_SQL,
+    )),
+
+    # Change counter for the products table, bumped by triggers on every write and read by
+    # DatabaseClient.get_products_watermark (updated_at has whole-second resolution only)
+    Migration(12, "products_version", sqlite=(
+        """
+        CREATE TABLE IF NOT EXISTS products_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        """,
+        "INSERT OR IGNORE INTO products_version (id, version) VALUES (1, 0)",
+        *(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_products_version_{op.lower()} AFTER {op} ON products
+            BEGIN
+                UPDATE products_version SET version = version + 1 WHERE id = 1;
+            END
+            """
+            for op in ("INSERT", "UPDATE", "DELETE")
+        ),
+    ), postgresql=(
+        """
+        CREATE TABLE IF NOT EXISTS products_version (
+            id INT PRIMARY KEY CHECK (id = 1),
+            version BIGINT NOT NULL
+        )
+        """,
+        "INSERT INTO products_version (id, version) VALUES (1, 0) ON CONFLICT DO NOTHING",
+        """
+        CREATE OR REPLACE FUNCTION bump_products_version()
+        RETURNS TRIGGER
+        LANGUAGE plpgsql
+        SECURITY DEFINER  -- clients never write the counter directly (see RLS below)
+        AS $$
+        BEGIN
+            UPDATE products_version SET version = version + 1 WHERE id = 1;
+            RETURN NULL;
+        END;
+        $$
+        """,
+        "DROP TRIGGER IF EXISTS trg_products_version ON products",
+        """
+        CREATE TRIGGER trg_products_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON products
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_products_version()
+        """,
+        "ALTER TABLE products_version ENABLE ROW LEVEL SECURITY",
+        'DROP POLICY IF EXISTS "Allow public read access to products_version" ON products_version',
+        """
+        CREATE POLICY "Allow public read access to products_version" ON products_version
+            FOR SELECT USING (true)
+        """,
+    )),
+
+    # A month's partition can't be created while the default partition holds rows of that
+    # month (e.g. written before maintain_user_progress last ran). The partition is now built
+    # as a plain table, the rows are moved into it and it is attached. SQLite has no partitions.
+    Migration(13, "user_progress_partitions_from_default", postgresql=(
+        """
+        CREATE OR REPLACE FUNCTION create_user_progress_partitions(p_from DATE DEFAULT NULL, p_months_ahead INT DEFAULT 3)
+        RETURNS INT
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            v_month DATE := date_trunc('month', COALESCE(p_from, now()))::date;
+            v_last DATE := (date_trunc('month', now()) + make_interval(months => p_months_ahead))::date;
+            v_next DATE;
+            v_name TEXT;
+            v_created INT := 0;
+        BEGIN
+            WHILE v_month <= v_last LOOP
+                v_name := 'user_progress_' || to_char(v_month, 'YYYY_MM');
+                v_next := (v_month + INTERVAL '1 month')::date;
+                IF to_regclass(v_name) IS NULL THEN
+                    EXECUTE format('CREATE TABLE %I (LIKE user_progress INCLUDING DEFAULTS)', v_name);
+                    -- Moved rows don't pass through user_progress, so the summary trigger doesn't count them again
+                    EXECUTE format('WITH moved AS (DELETE FROM user_progress_default WHERE timestamp >= %L AND timestamp < %L RETURNING *) '
+                                   'INSERT INTO %I SELECT * FROM moved', v_month, v_next, v_name);
+                    EXECUTE format('ALTER TABLE user_progress ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                                   v_name, v_month, v_next);
+                    v_created := v_created + 1;
+                END IF;
+                v_month := v_next;
+            END LOOP;
+            RETURN v_created;
+        END;
+        $$
+        """,
+    )),
+
+    # The catalog sync looks up each chunk's stored rows by name, soft-deleted ones included
+    # (idx_products_brand_name only covers active rows)
+    Migration(14, "product_name_index", sqlite=(
+        "CREATE INDEX IF NOT EXISTS idx_products_name ON products(name)",
+    ), postgresql=(
+        "CREATE INDEX IF NOT EXISTS idx_products_name ON products(name)",
+    )),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(conn) -> int:
+    """Highest applied migration version (0 for a database without a schema_version table)."""
+    if conn.dialect.name == "sqlite":
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+        )).first()
+    else:
+        exists = conn.execute(text("SELECT to_regclass('schema_version')")).scalar()
+    if not exists:
+        return 0
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+
+def pending_migrations(version: int) -> list:
+    return [m for m in MIGRATIONS if m.version > version]
+
+
+def apply_migrations(engine, target: int = None) -> list:
+    """
+    Applies every migration above the database's current version (up to `target`),
+    each in its own transaction together with its schema_version row. Returns the
+    applied migrations.
+    """
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        conn.execute(text(SCHEMA_VERSION_DDL))
+        version = current_version(conn)
+
+    applied = []
+    for migration in pending_migrations(version):
+        if target is not None and migration.version > target:
+            break
+        with engine.begin() as conn:
+            for step in migration.steps(dialect):
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(text(step))
+            conn.execute(
+                text("INSERT INTO schema_version (version, name) VALUES (:version, :name)"),
+                {"version": migration.version, "name": migration.name},
+            )
+        applied.append(migration)
+    return applied
+
+
+def ensure_schema(engine, auto_migrate: bool = DB_AUTO_MIGRATE) -> int:
+    """
+    Startup check: one query for the schema version. Pending migrations are applied
+    when `auto_migrate` is set; otherwise a RuntimeError says how to apply them.
+    """
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version >= LATEST_VERSION:
+        return version
+    if not auto_migrate:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {LATEST_VERSION}. "
+            "Run: python -m src.database.migrations apply"
+        )
+    for migration in apply_migrations(engine):
+        print(f"🛠️ Applied migration {migration.version:03d}_{migration.name}")
+    return LATEST_VERSION
+
+
+def _render_step(step, dialect: str) -> str:
+    if callable(step):
+        return f"-- (runtime step) {step.__doc__}"
+    sql = textwrap.dedent(step).strip()
+    if dialect == "postgresql":
+        return textwrap.indent(f"EXECUTE $step$\n{sql}\n$step$;", "        ")
+    return sql + ";"
+
+
+def render(dialect: str) -> str:
+    """
+    SQL script of all migrations for `dialect`. The Postgres script is idempotent:
+    each migration runs in a DO block only when schema_version does not list it yet.
+    """
+    lines = [
+        "-- Generated by: python -m src.database.migrations render " + dialect,
+        "-- Do not edit by hand; add a Migration to src/database/migrations.py instead.",
+        "",
+        textwrap.dedent(SCHEMA_VERSION_DDL).strip() + ";",
+    ]
+    for migration in MIGRATIONS:
+        steps = migration.steps(dialect)
+        lines += ["", f"-- {migration.version:03d}_{migration.name}"]
+        record = (
+            f"INSERT INTO schema_version (version, name) VALUES ({migration.version}, '{migration.name}')"
+        )
+        if dialect == "postgresql":
+            lines.append("DO $migration$")
+            lines.append("BEGIN")
+            lines.append(f"    IF NOT EXISTS (SELECT 1 FROM schema_version WHERE version = {migration.version}) THEN")
+            lines += [_render_step(step, dialect) for step in steps]
+            lines.append(f"        {record};")
+            lines.append("    END IF;")
+            lines.append("END")
+            lines.append("$migration$;")
+        else:
+            lines += [_render_step(step, dialect) for step in steps]
+            lines.append(record + " ON CONFLICT DO NOTHING;")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Apply, check or render database schema migrations.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    apply_parser = commands.add_parser("apply", help="apply pending migrations")
+    apply_parser.add_argument("--url", default=DATABASE_URL, help="database URL (default: DATABASE_URL)")
+    apply_parser.add_argument("--target", type=int, help="stop after this version")
+    check_parser = commands.add_parser("check", help="exit with status 1 if migrations are pending")
+    check_parser.add_argument("--url", default=DATABASE_URL, help="database URL (default: DATABASE_URL)")
+    render_parser = commands.add_parser("render", help="print the SQL script for a dialect")
+    render_parser.add_argument("dialect", choices=DIALECTS)
+    render_parser.add_argument("-o", "--output", help="write to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.command == "render":
+        script = render(args.dialect)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(script)
+        else:
+            sys.stdout.write(script)
+        return 0
+
+    engine = get_engine(args.url)
+    if args.command == "apply":
+        applied = apply_migrations(engine, args.target)
+        for migration in applied:
+            print(f"✅ Applied {migration.version:03d}_{migration.name}")
+        with engine.connect() as conn:
+            print(f"Schema version: {current_version(conn)} (latest {LATEST_VERSION})")
+        return 0
+
+    with engine.connect() as conn:
+        version = current_version(conn)
+    pending = pending_migrations(version)
+    print(f"Schema version: {version} (latest {LATEST_VERSION})")
+    for migration in pending:
+        print(f"  pending: {migration.version:03d}_{migration.name}")
+    return 1 if pending else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .db_client import get_db_client, split_tags
+
+
+class TagBitset:
+    """
+    Per-product tag sets packed into uint64 words, one bit per distinct tag.
+    Built from comma-joined columns such as skin_type ("Normal,Oily,Dry").
+    """
+
+    def __init__(self, values):
+        tag_lists = [split_tags(v) for v in values]
+        self.vocab = {}
+        for tags in tag_lists:
+            for tag in tags:
+                self.vocab.setdefault(tag, len(self.vocab))
+
+        words = max(1, (len(self.vocab) + 63) // 64)
+        self.bits = np.zeros((len(tag_lists), words), dtype=np.uint64)
+        for row, tags in enumerate(tag_lists):
+            for tag in tags:
+                bit = self.vocab[tag]
+                self.bits[row, bit // 64] |= np.uint64(1 << (bit % 64))
+
+    def query_mask(self, tags) -> np.ndarray:
+        """True for products carrying ANY of `tags` (unknown tags match nothing)."""
+        query = np.zeros(self.bits.shape[1], dtype=np.uint64)
+        for tag in tags:
+            for normalized in split_tags(tag):
+                bit = self.vocab.get(normalized)
+                if bit is not None:
+                    query[bit // 64] |= np.uint64(1 << (bit % 64))
+        if not query.any():
+            return np.zeros(len(self.bits), dtype=bool)
+        return (self.bits & query).any(axis=1)
+
+
+class _Snapshot:
+    """Immutable columnar copy of the active catalog; swapped atomically on refresh."""
+
+    def __init__(self, records, watermark):
+        self.records = records
+        self.watermark = watermark
+        frame = pd.DataFrame(records)  # only to build the columns; queries return `records`
+        n = len(records)
+
+        def _numeric(column):
+            if column not in frame:
+                return np.full(n, np.nan)
+            return pd.to_numeric(frame[column], errors="coerce").to_numpy(dtype=np.float64)
+
+        self.price = _numeric("price")
+        self.rating = _numeric("rating")
+        self.ids = _numeric("id") if "id" in frame else np.arange(n, dtype=np.float64)
+
+        categories = frame["category"] if "category" in frame else pd.Series([None] * n)
+        codes, uniques = pd.factorize(categories)
+        self.category_codes = codes.astype(np.int32)
+        self.category_lookup = {cat: code for code, cat in enumerate(uniques)}
+
+        self.skin_types = TagBitset(frame["skin_type"] if "skin_type" in frame else [None] * n)
+        self.concerns = TagBitset(frame["concerns"] if "concerns" in frame else [None] * n)
+
+
+class ProductIndex:
+    """
+    In-process, NumPy-backed index over the active product catalog.
+
+    Answers the same filter dict as DatabaseClient.get_products_by_criteria with
+    vectorized masks instead of a LIKE scan per rerun. Tag filters match whole tags
+    case-insensitively, so "Oily" no longer matches a hypothetical "Non-oily".
+    The index reloads itself when the products watermark (the products_version
+    counter) changes, checking at most once every `refresh_interval` seconds.
+    """
+
+    def __init__(self, db=None, refresh_interval: float = 30.0):
+        self.db = db or get_db_client()
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._last_check = 0.0
+
+    def __len__(self):
+        return len(self._get_snapshot().records)
+
+    def refresh(self, force: bool = False):
+        """Reloads the catalog if the table changed since the last load (or if forced)."""
+        with self._lock:
+            self._last_check = time.monotonic()
+            watermark = self.db.get_products_watermark()
+            if force or self._snapshot is None or watermark != self._snapshot.watermark:
+                # Bypass the query cache: the watermark already says the table changed
+                self._snapshot = _Snapshot(self.db.get_products(use_cache=False), watermark)
+
+    def _get_snapshot(self) -> _Snapshot:
+        if self._snapshot is None or time.monotonic() - self._last_check >= self.refresh_interval:
+            self.refresh()
+        return self._snapshot
+
+    def mask(self, filters: dict) -> np.ndarray:
+        """Boolean mask over the current snapshot for a get_products_by_criteria filter dict."""
+        return self._mask(self._get_snapshot(), filters)
+
+    @staticmethod
+    def _mask(snap: _Snapshot, filters: dict) -> np.ndarray:
+        mask = np.ones(len(snap.records), dtype=bool)
+        # NaN comparisons are False, matching SQL's NULL semantics
+        if 'max_budget' in filters:
+            mask &= snap.price <= filters['max_budget']
+        if 'min_rating' in filters:
+            mask &= snap.rating >= filters['min_rating']
+        if filters.get('skin_type'):
+            mask &= snap.skin_types.query_mask([filters['skin_type']])
+        if filters.get('categories'):
+            codes = [snap.category_lookup[c] for c in filters['categories'] if c in snap.category_lookup]
+            mask &= np.isin(snap.category_codes, codes)
+        if filters.get('concerns'):
+            mask &= snap.concerns.query_mask(filters['concerns'])
+        return mask
+
+    def query(self, filters: dict):
+        """
+        Returns matching products as the cached record dicts (shared, so treat them as
+        read-only); wrap them in a DataFrame only where one is needed.
+        """
+        snap = self._get_snapshot()
+        return [snap.records[i] for i in np.flatnonzero(self._mask(snap, filters))]
+
+    def top_k(self, filters: dict, k: int, score_fn):
+        """
+        Returns the `k` highest-scoring matches as new dicts with a `match_score` key.
+        `score_fn(price, rating)` receives the matched rows' float arrays and returns
+        their scores; selection uses argpartition, so only the top k are sorted. Equal
+        scores are ordered by product id and unscored rows come last, as in
+        DatabaseClient.get_top_products.
+        """
+        snap = self._get_snapshot()
+        indices = np.flatnonzero(self._mask(snap, filters))
+        if len(indices) == 0 or k <= 0:
+            return []
+        scores = np.asarray(score_fn(snap.price[indices], snap.rating[indices]), dtype=np.float64)
+        ranked = np.where(np.isnan(scores), -np.inf, scores)
+        if k < len(indices):
+            # Everything scoring at least the k-th best, so ties at the cut are decided by id too
+            kth = ranked[np.argpartition(-ranked, k - 1)[k - 1]]
+            top = np.flatnonzero(ranked >= kth)
+        else:
+            top = np.arange(len(indices))
+        top = top[np.lexsort((snap.ids[indices[top]], -ranked[top]))][:k]
+        return [dict(snap.records[indices[i]], match_score=float(scores[i])) for i in top]
+
+
+_product_index = None
+_product_index_lock = threading.Lock()
+
+
+def get_product_index() -> ProductIndex:
+    """Returns the ProductIndex shared by every Streamlit session in this process."""
+    global _product_index
+    if _product_index is None:
+        with _product_index_lock:
+            if _product_index is None:
+                _product_index = ProductIndex()
+    return _product_index
@@ -0,0 +1,337 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+import config
+from .db_client import get_db_client
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Every process spools to its own files in this directory (see ProgressWriter)
+PROGRESS_SPOOL_DIR = os.getenv("PROGRESS_SPOOL_DIR", str(config.DATA_DIR / "spool"))
+# Records the database rejected for good, one JSON object per line, for inspection or manual replay
+PROGRESS_DEAD_LETTER_PATH = os.getenv(
+    "PROGRESS_DEAD_LETTER_PATH", str(Path(PROGRESS_SPOOL_DIR) / "user_progress.dead.jsonl")
+)
+PROGRESS_FLUSH_SIZE = int(os.getenv("PROGRESS_FLUSH_SIZE", "100"))
+PROGRESS_FLUSH_INTERVAL = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "2.0"))
+
+
+def _try_lock(f) -> bool:
+    """Takes an exclusive, non-blocking lock on open file `f`; False if another process holds it."""
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _read_records(path: Path) -> list:
+    records = []
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    pass  # a torn final line from a crash mid-write
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def _is_permanent(error: Exception) -> bool:
+    """True for errors retrying can't fix: constraint violations and invalid values (SQLAlchemy or PostgREST)."""
+    if isinstance(error, (IntegrityError, DataError, ValueError, TypeError)):
+        return True
+    # PostgREST APIError carries the SQLSTATE: class 22 is data exceptions, 23 constraint violations
+    return str(getattr(error, "code", "") or "")[:2] in ("22", "23")
+
+
+class ProgressWriter:
+    """
+    Write-behind buffer for user_progress records.
+
+    enqueue() returns immediately: the record is stamped with its capture time,
+    appended to a local JSONL spool file and buffered. A background thread flushes
+    the buffer through DatabaseClient.insert_progress_bulk when it reaches
+    `flush_size` records or `flush_interval` seconds have passed. Transient failures
+    (an outage, a lock timeout, a dropped connection) are retried indefinitely with
+    exponential backoff capped at `max_backoff`; the records stay buffered meanwhile.
+    The spool always mirrors the unflushed buffer, so records survive a crash or
+    restart and are replayed on startup.
+
+    Streamlit and API workers may share `spool_dir`, so each writer spools to its own
+    progress-<pid>-<id>.jsonl and holds an exclusive lock on a matching .lock file
+    while it runs. On startup a writer adopts the spools of writers whose lock is
+    free (they exited or crashed): taking the lock is the claim, so each orphaned
+    spool is replayed by exactly one process. Spools of running writers are left alone.
+
+    Only a batch that fails with an error retrying can't fix (a constraint violation
+    or invalid value) is moved to the dead-letter file, so later records are not
+    blocked behind it. The records are retried one by one first, so only the rejected
+    ones are dead-lettered. close() makes a final attempt; what is still unwritten
+    stays in the spool, or is dead-lettered if the writer has no spool.
+    """
+
+    def __init__(self, db=None, spool_dir=PROGRESS_SPOOL_DIR, flush_size: int = PROGRESS_FLUSH_SIZE,
+                 flush_interval: float = PROGRESS_FLUSH_INTERVAL, backoff: float = 0.5,
+                 max_backoff: float = 30.0, dead_letter_path=PROGRESS_DEAD_LETTER_PATH):
+        self.db = db or get_db_client()
+        self.spool_dir = Path(spool_dir) if spool_dir else None
+        self.spool_path = None
+        self._lock_file = None
+        self.dead_letter_path = Path(dead_letter_path) if dead_letter_path else None
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._flush_requested = False
+        self._closing = False
+        self._flushed = 0
+        self._failed_attempts = 0
+        self._dead_lettered = 0
+        self._flush_latencies = []
+        self._last_error = None
+
+        if self.spool_dir:
+            self.spool_dir.mkdir(parents=True, exist_ok=True)
+            writer_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+            self.spool_path = self.spool_dir / f"progress-{writer_id}.jsonl"
+            self._lock_file = open(self.spool_dir / f"progress-{writer_id}.lock", "w")
+            _try_lock(self._lock_file)
+            self._adopt_orphaned_spools()
+
+        self._worker = threading.Thread(target=self._run, name="progress-writer", daemon=True)
+        self._worker.start()
+
+    # ----------------- Spool -----------------
+    def _adopt_orphaned_spools(self):
+        """Moves the records of exited writers' spools into this writer's buffer and spool."""
+        for lock_path in sorted(self.spool_dir.glob("progress-*.lock")):
+            if lock_path.name == Path(self._lock_file.name).name:
+                continue
+            try:
+                lock_file = open(lock_path, "a")
+            except FileNotFoundError:
+                continue  # adopted by another process meanwhile
+            with lock_file:
+                if not _try_lock(lock_file):
+                    continue  # its writer is still running
+                spool_path = lock_path.with_suffix(".jsonl")
+                records = _read_records(spool_path)
+                if records:
+                    print(f"♻️ Replaying {len(records)} unsaved progress records from {spool_path}")
+                    self._buffer.extend(records)
+                    self._rewrite_spool(self._buffer)
+                spool_path.unlink(missing_ok=True)
+                spool_path.with_suffix(".tmp").unlink(missing_ok=True)
+            lock_path.unlink(missing_ok=True)
+
+        # The single shared spool of earlier versions, claimed by an atomic rename
+        claimed = self.spool_path.with_suffix(".legacy")
+        try:
+            os.rename(self.spool_dir / "user_progress.jsonl", claimed)
+        except FileNotFoundError:
+            return
+        records = _read_records(claimed)
+        if records:
+            print(f"♻️ Replaying {len(records)} unsaved progress records from the shared spool")
+            self._buffer.extend(records)
+            self._rewrite_spool(self._buffer)
+        claimed.unlink()
+
+    def _rewrite_spool(self, records: list):
+        tmp_path = self.spool_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.spool_path)
+
+    def _dead_letter(self, records: list, error: Exception):
+        error = getattr(error, "orig", None) or error  # the driver's message, without SQLAlchemy's SQL dump
+        print(f"❌ Moved {len(records)} unwritable progress record(s) to {self.dead_letter_path}: {error}")
+        with self._cond:
+            self._dead_lettered += len(records)
+        if not self.dead_letter_path:
+            return
+        failed_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        self.dead_letter_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.dead_letter_path, "a") as f:
+            for record in records:
+                f.write(json.dumps({"failed_at": failed_at, "error": str(error), "record": record}) + "\n")
+
+    # ----------------- Public API -----------------
+    def enqueue(self, record: dict):
+        """Buffers one progress record for a later batched insert."""
+        record = dict(record)
+        record.setdefault("timestamp", datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"))
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("ProgressWriter has been closed")
+            if self.spool_path:
+                with open(self.spool_path, "a") as f:
+                    f.write(json.dumps(record) + "\n")
+            self._buffer.append(record)
+            if len(self._buffer) >= self.flush_size:
+                self._cond.notify()
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Asks for an immediate flush and waits until the buffer is empty (or `timeout` passes)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._buffer:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """
+        Flushes what it can and stops the worker; anything left stays in the spool (for
+        the next writer to adopt). An empty spool is removed.
+        """
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._worker.join(timeout)
+        if self._worker.is_alive():
+            return  # still in its final attempt; the spool keeps the unflushed records
+        with self._cond:
+            leftover, drained = list(self._buffer), not self._buffer
+        if leftover and not self.spool_path:
+            self._dead_letter(leftover, RuntimeError(self._last_error or "writer closed before the write succeeded"))
+            with self._cond:
+                self._buffer.clear()
+        if self._lock_file:
+            self._lock_file.close()
+            if drained:
+                self.spool_path.unlink(missing_ok=True)
+                Path(self._lock_file.name).unlink(missing_ok=True)
+
+    def metrics(self) -> dict:
+        with self._cond:
+            latencies = sorted(self._flush_latencies)
+            return {
+                "backlog": len(self._buffer),
+                "flushed": self._flushed,
+                "failed_attempts": self._failed_attempts,
+                "dead_lettered": self._dead_lettered,
+                "last_error": self._last_error,
+                "flush_latency_p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+                "flush_latency_max_ms": latencies[-1] * 1000 if latencies else 0.0,
+            }
+
+    # ----------------- Worker -----------------
+    def _write_with_retry(self, batch: list):
+        """
+        Returns None once the batch is written, or the error it gave up on: a permanent
+        one, or a transient one from the final attempt made while closing.
+        """
+        delay = self.backoff
+        while True:
+            try:
+                self.db.insert_progress_bulk(batch)
+                return None
+            except Exception as e:
+                with self._cond:
+                    self._failed_attempts += 1
+                    self._last_error = str(getattr(e, "orig", None) or e)
+                    if _is_permanent(e) or self._closing:
+                        return e
+                    # close() cuts the wait short, for one final attempt
+                    self._cond.wait_for(lambda: self._closing, timeout=delay)
+                delay = min(delay * 2, self.max_backoff)
+
+    def _write_batch(self, batch: list) -> tuple:
+        """
+        Writes one batch, dead-lettering the records the database rejects for good.
+        Returns (handled, written): the first `handled` records were written or
+        dead-lettered; any after them failed transiently while closing and stay buffered.
+        """
+        error = self._write_with_retry(batch)
+        if error is None:
+            return len(batch), len(batch)
+        if not _is_permanent(error):
+            return 0, 0
+        if len(batch) == 1:
+            self._dead_letter(batch, error)
+            return 1, 0
+        # Isolate the rejected records so the rest of the batch is still written
+        written = 0
+        for handled, record in enumerate(batch):
+            error = self._write_with_retry([record])
+            if error is None:
+                written += 1
+            elif _is_permanent(error):
+                self._dead_letter([record], error)
+            else:
+                return handled, written
+        return len(batch), written
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._closing or self._flush_requested or len(self._buffer) >= self.flush_size,
+                    timeout=self.flush_interval,
+                )
+                requested, self._flush_requested = self._flush_requested, False
+                batch = self._buffer[:self.flush_size]
+                closing = self._closing
+
+            if batch:
+                start = time.perf_counter()
+                handled, written = self._write_batch(batch)
+                with self._cond:
+                    del self._buffer[:handled]
+                    if self.spool_path and handled:
+                        self._rewrite_spool(self._buffer)
+                    self._flushed += written
+                    self._cond.notify_all()
+                    if handled < len(batch):
+                        return  # closing: the rest stays in the spool for the next start
+                    self._flush_latencies = (self._flush_latencies + [time.perf_counter() - start])[-1000:]
+                    if self._buffer and (requested or closing or len(self._buffer) >= self.flush_size):
+                        self._flush_requested = True  # keep draining
+                continue
+
+            if closing:
+                return
+
+
+_progress_writer = None
+_progress_writer_lock = threading.Lock()
+
+
+def get_progress_writer() -> ProgressWriter:
+    """Returns the write-behind ProgressWriter shared by every Streamlit session in this process."""
+    global _progress_writer
+    if _progress_writer is None:
+        with _progress_writer_lock:
+            if _progress_writer is None:
+                _progress_writer = ProgressWriter()
+                atexit.register(_progress_writer.close)
+    return _progress_writer
@@ -0,0 +1,99 @@
+import math
+import time
+import threading
+from collections import OrderedDict
+
+# Budget sliders move in $5 steps and ratings in 0.1 steps; bucketing lets nearby
+# values share one database query, with the exact bounds re-applied in memory.
+BUDGET_BUCKET = 5.0
+RATING_BUCKET = 0.5
+
+
+def canonical_filters(filters: dict) -> tuple:
+    """
+    Hashable, order-insensitive cache key for a get_products_by_criteria filter dict.
+    max_budget is rounded up and min_rating down to their buckets, so the cached
+    result is a superset of what the exact filters select.
+    """
+    key = []
+    for name, value in sorted((filters or {}).items()):
+        if name == 'max_budget' and value is not None:
+            value = math.ceil(value / BUDGET_BUCKET) * BUDGET_BUCKET
+        elif name == 'min_rating' and value is not None:
+            value = math.floor(value / RATING_BUCKET) * RATING_BUCKET
+        elif isinstance(value, (list, tuple, set)):
+            value = tuple(sorted(value))
+        key.append((name, value))
+    return tuple(key)
+
+
+def bucketed_filters(filters: dict) -> dict:
+    """The filter dict the cache actually queries with (see canonical_filters)."""
+    return {name: (list(value) if isinstance(value, tuple) else value)
+            for name, value in canonical_filters(filters)}
+
+
+class QueryCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL and hit/miss counters.
+    Entries are dropped on expiry, when the cache is full (least recently used
+    first), or all at once via invalidate() after a write.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Returns the cached value or None (expired entries count as misses)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        """Returns the cached value for `key`, calling `loader()` and caching its result on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            self.put(key, value)
+        return value
+
+    def invalidate(self):
+        """Drops every entry; called whenever products are written."""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,74 @@
+import heapq
+
+from ..database.db_client import get_db_client
+
+# Price normalizer used when the filters carry no max_budget
+DEFAULT_PRICE_SCALE = 100.0
+
+
+class MatchScorer:
+    """
+    The linear match score used on the recommendations page:
+
+        rating / 5 * rating_weight + (1 - price / max_budget) * price_weight + base_weight
+
+    Because it is linear it can be pushed down to SQL (DatabaseClient.get_top_products)
+    or evaluated on whole NumPy columns (ProductIndex.top_k).
+    """
+
+    def __init__(self, rating_weight: float = 0.4, price_weight: float = 0.3, base_weight: float = 0.3):
+        self.rating_weight = rating_weight
+        self.price_weight = price_weight
+        self.base_weight = base_weight
+
+    def weights(self, price_scale: float) -> dict:
+        """Weights in the form DatabaseClient.get_top_products expects."""
+        return {
+            "rating": self.rating_weight,
+            "price": self.price_weight,
+            "base": self.base_weight,
+            "price_scale": price_scale,
+        }
+
+    def score_arrays(self, price, rating, price_scale: float):
+        """Vectorized score over price/rating arrays (NaN in, NaN out)."""
+        return rating / 5.0 * self.rating_weight + (1 - price / price_scale) * self.price_weight + self.base_weight
+
+    def __call__(self, product: dict, price_scale: float = DEFAULT_PRICE_SCALE) -> float:
+        price, rating = product.get("price"), product.get("rating")
+        if price is None or rating is None:
+            return float("-inf")
+        return float(self.score_arrays(float(price), float(rating), price_scale))
+
+
+def _price_scale(filters: dict) -> float:
+    return filters.get("max_budget") or DEFAULT_PRICE_SCALE
+
+
+def recommend_products(filters: dict, k: int = 6, scorer=None, db=None, index=None):
+    """
+    Returns the top `k` products for `filters`, best first, each with a `match_score`.
+
+    With the default MatchScorer the score is evaluated where the data lives: on the
+    ProductIndex arrays when `index` is given, otherwise in the database via
+    ORDER BY ... LIMIT k. Any other `scorer(product) -> float` is applied in Python
+    with a bounded heap over the streamed matching rows, so memory stays O(k).
+    """
+    scorer = scorer or MatchScorer()
+    price_scale = _price_scale(filters)
+
+    if isinstance(scorer, MatchScorer):
+        if index is not None:
+            return index.top_k(
+                filters, k, lambda price, rating: scorer.score_arrays(price, rating, price_scale)
+            )
+        return (db or get_db_client()).get_top_products(filters, k, scorer.weights(price_scale))
+
+    if index is not None:
+        rows = index.query(filters)
+    else:
+        rows = (db or get_db_client()).iter_products_by_criteria(filters)
+
+    # The index breaks score ties in favour of earlier rows and keeps dicts out of comparisons
+    scored = ((scorer(row), -i, row) for i, row in enumerate(rows))
+    return [dict(row, match_score=score) for score, _, row in heapq.nlargest(k, scored)]
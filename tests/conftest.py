@@ -0,0 +1,34 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Everything runs against throwaway SQLite files and directories, never a configured
+# Supabase project or the data/ folder. Set before any project module reads its config.
+_SCRATCH = Path(tempfile.mkdtemp(prefix="skincare-tests-"))
+os.environ.update({
+    "SUPABASE_URL": "",
+    "SUPABASE_KEY": "",
+    "DATABASE_URL": f"sqlite:///{_SCRATCH / 'default.db'}",
+    "ANALYSIS_CACHE_DIR": str(_SCRATCH / "analysis-cache"),
+    "PROGRESS_SPOOL_DIR": str(_SCRATCH / "spool"),
+})
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'skincare.db'}"
+
+
+@pytest.fixture
+def db(db_url):
+    """A DatabaseClient on a fresh, fully migrated SQLite file."""
+    from src.database.db_client import DatabaseClient
+
+    return DatabaseClient(db_url)
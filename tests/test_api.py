@@ -0,0 +1,69 @@
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import config
+from app.api import app
+
+
+@pytest.fixture(scope="module")
+def client():
+    # Without the lifespan: the scheduler and caches load on first use
+    return TestClient(app)
+
+
+def _jpeg(color=(200, 170, 150)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (320, 240), color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_analyze_returns_results_and_caches_them(client):
+    image = _jpeg((190, 160, 140))
+
+    first = client.post("/analyze", files={"file": ("face.jpg", image, "image/jpeg")})
+    second = client.post("/analyze", files={"file": ("face.jpg", image, "image/jpeg")})
+
+    assert first.status_code == 200, first.text
+    assert first.json()["cached"] is False
+    assert set(first.json()["results"]) >= {"skin_type", "acne_severity", "skin_tone", "oiliness_level"}
+    assert second.json() == dict(first.json(), cached=True)
+
+
+@pytest.mark.parametrize("payload", [b"not an image", _jpeg()[:300]], ids=["garbage", "truncated"])
+def test_unreadable_image_is_rejected_with_422(client, payload):
+    response = client.post("/analyze", files={"file": ("face.jpg", payload, "image/jpeg")})
+
+    assert response.status_code == 422
+
+
+def test_body_over_the_limit_is_rejected_by_content_length(client):
+    body = b"x" * (config.API_MAX_BODY_BYTES + 1)
+
+    response = client.post("/analyze", files={"file": ("face.jpg", body, "image/jpeg")})
+
+    assert response.status_code == 413
+
+
+def test_streamed_body_over_the_limit_is_rejected(client):
+    chunk = b"x" * 2**20
+
+    def stream():  # no Content-Length: the middleware has to count
+        for _ in range(config.API_MAX_BODY_BYTES // len(chunk) + 2):
+            yield chunk
+
+    response = client.post("/analyze", content=stream(),
+                           headers={"content-type": "multipart/form-data; boundary=limit"})
+
+    assert response.status_code == 413
+
+
+def test_image_over_the_upload_limit_is_rejected(client):
+    image = b"x" * (config.MAX_UPLOAD_BYTES + 1)  # body itself is within API_MAX_BODY_BYTES
+
+    response = client.post("/analyze", files={"file": ("face.jpg", image, "image/jpeg")})
+
+    assert response.status_code == 413
+    assert "Image is larger" in response.json()["detail"]
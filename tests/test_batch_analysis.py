@@ -0,0 +1,40 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from src.analysis.batch import StageTimer, analyze_batch
+
+
+def _image(path, color=(200, 180, 170), fmt="JPEG"):
+    Image.new("RGB", (300, 300), color).save(path, format=fmt)
+    return str(path)
+
+
+def test_unreadable_images_get_an_error_row_and_the_rest_are_analyzed(tmp_path):
+    good = _image(tmp_path / "good.jpg")
+    (tmp_path / "garbage.jpg").write_bytes(b"not an image")
+    buffer = io.BytesIO()
+    Image.new("RGB", (300, 300)).save(buffer, format="JPEG")
+    (tmp_path / "truncated.jpg").write_bytes(buffer.getvalue()[:200])
+    unsupported = _image(tmp_path / "anim.gif", fmt="GIF")
+    sources = [good, str(tmp_path / "garbage.jpg"), str(tmp_path / "truncated.jpg"),
+               str(tmp_path / "missing.jpg"), unsupported, good]
+    timer = StageTimer()
+
+    results = analyze_batch(sources, chunk_size=4, as_frame=False, timer=timer)
+
+    failed = np.array([error is not None for error in results["error"]])
+    assert failed.tolist() == [False, True, True, True, True, False]
+    assert np.isnan(results["brightness"][failed]).all()
+    assert (results["skin_type"][failed] == "").all()
+    assert (results["skin_type"][~failed] != "").all()
+    assert timer.summary()["decode"]["failed"] == 4
+
+
+def test_a_chunk_of_only_bad_files_is_reported_not_raised(tmp_path):
+    (tmp_path / "bad.jpg").write_bytes(b"\x00" * 10)
+
+    frame = analyze_batch([str(tmp_path / "bad.jpg")], timer=StageTimer())
+
+    assert len(frame) == 1 and frame["error"][0]
@@ -0,0 +1,88 @@
+import math
+import random
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+
+def _old_records(n, seed=7):
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    records = []
+    for i in range(n):
+        # Whole-minute steps with repeats, so batches have to split runs of equal timestamps correctly
+        ts = start + timedelta(minutes=rng.randrange(0, 60 * 24 * 300, 30))
+        records.append({
+            "user_id": f"u{i % 3}",
+            "skin_type": rng.choice(["Oily", "Dry", "Normal"]),
+            "skin_tone": rng.choice(["Fair", "Medium"]),
+            "acne_severity": rng.random() if i % 5 else None,
+            "oiliness_level": rng.random(),
+            "timestamp": ts.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+    return records
+
+
+def _same(a, b):
+    if isinstance(a, float) and isinstance(b, float):
+        return math.isclose(a, b, rel_tol=1e-9)
+    return a == b
+
+
+def _assert_rows_equal(before, after):
+    assert len(before) == len(after)
+    for x, y in zip(before, after):
+        assert x.keys() == y.keys()
+        assert all(_same(x[key], y[key]) for key in x), (x, y)
+
+
+def _without_updated_at(summary):
+    return {key: value for key, value in summary.items() if key != "updated_at"}
+
+
+def _raw_count(db):
+    with db._connect() as conn:
+        return conn.execute(text("SELECT COUNT(*) FROM user_progress")).scalar()
+
+
+def test_compaction_rolls_up_expired_rows_without_changing_history(db):
+    recent = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    db.insert_progress_bulk(_old_records(3000) + [{"user_id": "u1", "acne_severity": 0.3, "timestamp": recent}])
+    users = ["u0", "u1", "u2"]
+    buckets = {(u, b): db.get_user_progress_buckets(u, b) for u in users for b in ("day", "month")}
+    summaries = {u: db.get_user_summary(u) for u in users}
+
+    result = db.compact_user_progress(retention_months=12, batch_size=250)
+
+    assert result["rows_rolled_up"] == 3000
+    assert result["batches"] > 1
+    assert _raw_count(db) == 1
+    for key, expected in buckets.items():
+        _assert_rows_equal(expected, db.get_user_progress_buckets(*key))
+    for user, expected in summaries.items():
+        _assert_rows_equal([_without_updated_at(expected)], [_without_updated_at(db.get_user_summary(user))])
+
+
+def test_compaction_is_a_no_op_when_nothing_expired(db):
+    db.insert_progress_bulk(_old_records(50))
+    db.compact_user_progress(retention_months=12)
+
+    assert db.compact_user_progress(retention_months=12)["rows_rolled_up"] == 0
+    assert _raw_count(db) == 0
+
+
+def test_rebuilt_summary_matches_after_compaction(db):
+    db.insert_progress_bulk(_old_records(400))
+    db.compact_user_progress(retention_months=12, batch_size=64)
+    maintained = db.get_user_summary("u2")
+
+    db.rebuild_user_summaries(["u2"])
+
+    rebuilt = db.get_user_summary("u2")
+    _assert_rows_equal([_without_updated_at(maintained)], [_without_updated_at(rebuilt)])
+
+
+def test_compaction_releases_freed_pages(db):
+    db.insert_progress_bulk(_old_records(3000))
+
+    assert db.compact_user_progress(retention_months=12)["pages_released"] > 0
@@ -0,0 +1,103 @@
+import sqlite3
+
+from sqlalchemy import text
+
+from src.database.db_client import get_engine
+from src.database.migrations import LATEST_VERSION, MIGRATIONS, apply_migrations, current_version, render
+
+# The tables as the original DatabaseClient created them, before schema_version existed
+LEGACY_SCHEMA = """
+    CREATE TABLE products (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        brand TEXT,
+        category TEXT,
+        skin_type TEXT,
+        concerns TEXT,
+        price REAL,
+        rating REAL,
+        description TEXT,
+        ingredients TEXT,
+        purchase_link TEXT,
+        image_url TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE user_progress (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        skin_type TEXT,
+        acne_severity REAL,
+        oiliness_level REAL,
+        skin_tone TEXT,
+        image_path TEXT,
+        confidence_scores TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    INSERT INTO products (name, brand, skin_type, concerns, price, rating) VALUES
+        ('Gel Cleanser', 'Acme', 'Oily,Combination', 'Acne', 12.5, 4.5),
+        ('Gel Cleanser', 'Acme', 'Oily,Combination', 'Acne', 12.5, 4.5),
+        ('Rich Cream', NULL, 'Dry', 'Dryness', 30, 4.1);
+    INSERT INTO user_progress (user_id, skin_type, acne_severity, oiliness_level, timestamp) VALUES
+        ('u1', 'Oily', 0.6, 0.8, '2024-01-05 10:00:00'),
+        ('u1', 'Dry', 0.2, 0.2, '2024-02-05 10:00:00'),
+        ('u2', 'Normal', 0.1, 0.4, '2024-02-06 10:00:00');
+"""
+
+
+def _version(engine):
+    with engine.connect() as conn:
+        return current_version(conn)
+
+
+def test_fresh_database_applies_every_migration_once(db_url):
+    engine = get_engine(db_url)
+
+    applied = apply_migrations(engine)
+
+    assert [m.version for m in applied] == [m.version for m in MIGRATIONS]
+    assert _version(engine) == LATEST_VERSION
+    assert apply_migrations(engine) == []
+
+
+def test_existing_database_is_upgraded_in_place(tmp_path):
+    path = tmp_path / "legacy.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+    engine = get_engine(f"sqlite:///{path}")
+
+    apply_migrations(engine)
+
+    assert _version(engine) == LATEST_VERSION
+    with engine.connect() as conn:
+        products = conn.execute(text("SELECT id, deleted_at FROM products ORDER BY id")).all()
+        tags = conn.execute(text("SELECT kind, tag FROM product_tags WHERE product_id = 1 ORDER BY kind, tag")).all()
+        progress = conn.execute(text("SELECT COUNT(*) FROM user_progress")).scalar()
+        summary = dict(conn.execute(text("SELECT user_id, samples FROM user_progress_summary")).all())
+    # The appended duplicate is soft-deleted, keeping the lowest id of the key
+    assert [row.deleted_at is None for row in products] == [True, False, True]
+    assert [tuple(row) for row in tags] == [("concern", "acne"), ("skin_type", "combination"), ("skin_type", "oily")]
+    assert progress == 3
+    assert summary == {"u1": 2, "u2": 1}
+
+
+def test_partially_migrated_database_continues_from_its_version(db_url):
+    engine = get_engine(db_url)
+    apply_migrations(engine, target=8)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO user_progress (user_id, acne_severity, timestamp) VALUES ('u1', 0.5, '2024-03-01 09:00:00')"
+        ))
+
+    applied = apply_migrations(engine)
+
+    assert [m.version for m in applied] == [m.version for m in MIGRATIONS if m.version > 8]
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM user_progress")).scalar() == 1
+
+
+def test_postgres_script_guards_every_migration():
+    script = render("postgresql")
+
+    for migration in MIGRATIONS:
+        assert f"WHERE version = {migration.version}) THEN" in script
@@ -0,0 +1,72 @@
+import math
+
+import pytest
+
+from src.database.product_index import ProductIndex
+from src.recommendation.recommender import recommend_products
+
+CATALOG = [
+    {"name": "Gel Cleanser", "brand": "Acme", "category": "Cleanser", "skin_type": "Oily,Combination",
+     "concerns": "Acne,Pores", "price": 12.0, "rating": 4.5},
+    {"name": "Foam Cleanser", "brand": "Acme", "category": "Cleanser", "skin_type": "Oily",
+     "concerns": "Acne", "price": 12.0, "rating": 4.5},  # ties with Gel Cleanser
+    {"name": "Rich Cream", "brand": "Dewy", "category": "Moisturizer", "skin_type": "Dry,Normal",
+     "concerns": "Dryness", "price": 30.0, "rating": 4.8},
+    {"name": "Light Lotion", "brand": "Dewy", "category": "Moisturizer", "skin_type": "Normal,Oily",
+     "concerns": "Dryness,Pores", "price": 18.0, "rating": 4.1},
+    {"name": "Spot Serum", "brand": "Zed", "category": "Serum", "skin_type": "Oily",
+     "concerns": "Acne", "price": 45.0, "rating": 4.9},
+    {"name": "Mystery Toner", "brand": "Zed", "category": "Toner", "skin_type": "Oily,Dry",
+     "concerns": "Pores", "price": None, "rating": 4.0},  # no score
+    {"name": "Budget Balm", "brand": "Zed", "category": "Moisturizer", "skin_type": "Dry",
+     "concerns": "Dryness", "price": 5.0, "rating": 3.2},
+]
+
+FILTERS = [
+    {},
+    {"skin_type": "Oily"},
+    {"skin_type": "oily", "max_budget": 40, "min_rating": 4.0},
+    {"categories": ["Cleanser", "Serum"], "concerns": ["Acne"]},
+    {"concerns": ["Pores", "Dryness"], "max_budget": 25},
+    {"categories": ["Sunscreen"]},
+]
+
+
+@pytest.fixture
+def catalog_db(db):
+    db.upsert_products(CATALOG)
+    return db
+
+
+def _ranking(rows):
+    return [(row["name"], None if row["match_score"] is None or math.isnan(row["match_score"])
+             else round(row["match_score"], 9)) for row in rows]
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+@pytest.mark.parametrize("k", [1, 3, 10])
+def test_index_top_k_matches_sql_top_k(catalog_db, filters, k):
+    index = ProductIndex(catalog_db)
+
+    from_index = recommend_products(filters, k=k, index=index)
+    from_sql = recommend_products(filters, k=k, db=catalog_db)
+
+    assert _ranking(from_index) == _ranking(from_sql)
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_index_query_matches_sql_filters(catalog_db, filters):
+    index = ProductIndex(catalog_db)
+
+    expected = sorted(row["name"] for row in catalog_db.get_products_by_criteria(filters))
+
+    assert sorted(row["name"] for row in index.query(filters)) == expected
+
+
+def test_index_reloads_after_a_catalog_write(catalog_db):
+    index = ProductIndex(catalog_db, refresh_interval=0)
+    assert len(index) == len(CATALOG)
+
+    catalog_db.upsert_products([{"name": "New Mask", "brand": "Acme", "price": 9.0, "rating": 4.4}])
+
+    assert len(index) == len(CATALOG) + 1
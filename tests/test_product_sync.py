@@ -0,0 +1,69 @@
+from sqlalchemy import text
+
+
+def _feed(n, **overrides):
+    return [dict({"name": f"Product {i}", "brand": "Acme", "price": 10 + i, "rating": 4.0}, **overrides)
+            for i in range(n)]
+
+
+def _active(db):
+    with db._connect() as conn:
+        rows = conn.execute(text("SELECT name, price FROM products WHERE deleted_at IS NULL ORDER BY id"))
+        return [tuple(row) for row in rows]
+
+
+def test_resync_of_the_same_feed_writes_nothing(db):
+    feed = _feed(25)
+
+    first = db.sync_products(feed, chunk_size=7)
+    second = db.sync_products(feed, chunk_size=7)
+
+    assert first == {"inserted": 25, "updated": 0, "unchanged": 0, "deleted": 0}
+    assert second == {"inserted": 0, "updated": 0, "unchanged": 25, "deleted": 0}
+    assert len(_active(db)) == 25
+
+
+def test_sync_updates_changed_rows_and_soft_deletes_missing_ones(db):
+    db.sync_products(_feed(10), chunk_size=4)
+    feed = _feed(10)
+    feed[0]["price"] = 99
+    del feed[5]
+
+    stats = db.sync_products(feed, chunk_size=4)
+
+    assert stats == {"inserted": 0, "updated": 1, "unchanged": 8, "deleted": 1}
+    active = dict(_active(db))
+    assert active["Product 0"] == 99
+    assert "Product 5" not in active
+
+    # Back in the feed: the soft-deleted row is revived, not duplicated
+    assert db.sync_products(_feed(10), chunk_size=4)["updated"] == 2
+    with db._connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM products")).scalar() == 10
+
+
+def test_upsert_keeps_products_missing_from_the_feed(db):
+    db.upsert_products(_feed(5))
+
+    stats = db.upsert_products([{"name": "New", "brand": "Other"}])
+
+    assert stats["inserted"] == 1 and stats["deleted"] == 0
+    assert len(_active(db)) == 6
+
+
+def test_first_occurrence_of_a_key_wins_across_chunks(db):
+    feed = _feed(6)
+    feed.append({"name": "Product 1", "brand": "Acme", "price": 500})
+
+    stats = db.sync_products(feed, chunk_size=3)
+
+    assert stats["inserted"] == 6
+    assert dict(_active(db))["Product 1"] == 11
+
+
+def test_sync_reports_progress_per_chunk(db):
+    calls = []
+
+    db.upsert_products(_feed(10), chunk_size=4, on_chunk=lambda total, rows, elapsed: calls.append((total, rows)))
+
+    assert calls == [(4, 4), (8, 4), (10, 2)]
@@ -0,0 +1,130 @@
+import json
+import threading
+
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from src.database.progress_writer import ProgressWriter
+
+
+class FlakyDB:
+    """Stands in for DatabaseClient.insert_progress_bulk: fails while `down`, rejects records marked bad."""
+
+    def __init__(self, down=False):
+        self.down = down
+        self.rows = []
+        self.attempts = 0
+        self._lock = threading.Lock()
+
+    def insert_progress_bulk(self, records):
+        with self._lock:
+            self.attempts += 1
+            if self.down:
+                raise OperationalError("INSERT", {}, Exception("database is locked"))
+            if any(record.get("bad") for record in records):
+                raise IntegrityError("INSERT", {}, Exception("NOT NULL constraint failed: user_progress.user_id"))
+            self.rows.extend(records)
+
+
+def _writer(db, tmp_path, **kwargs):
+    options = dict(spool_dir=tmp_path / "spool", flush_interval=0.02, backoff=0.01, max_backoff=0.02,
+                   dead_letter_path=tmp_path / "dead.jsonl")
+    options.update(kwargs)
+    return ProgressWriter(db, **options)
+
+
+def _dead_letters(tmp_path):
+    path = tmp_path / "dead.jsonl"
+    return [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+
+
+def test_records_are_written_in_batches(tmp_path):
+    db = FlakyDB()
+    writer = _writer(db, tmp_path, flush_size=10)
+    for i in range(25):
+        writer.enqueue({"user_id": "u1", "n": i})
+
+    assert writer.flush(5)
+    writer.close()
+
+    assert [row["n"] for row in db.rows] == list(range(25))
+    assert all(row["timestamp"] for row in db.rows)
+    assert list((tmp_path / "spool").iterdir()) == []
+
+
+def test_transient_failures_are_retried_until_they_succeed(tmp_path):
+    db = FlakyDB(down=True)
+    writer = _writer(db, tmp_path)
+    writer.enqueue({"user_id": "u1"})
+
+    assert not writer.flush(0.5)  # far more attempts than any fixed retry budget
+    assert db.attempts > 10 and writer.metrics()["backlog"] == 1
+
+    db.down = False
+    assert writer.flush(5)
+    writer.close()
+    assert len(db.rows) == 1
+    assert _dead_letters(tmp_path) == []
+
+
+def test_only_rejected_records_are_dead_lettered(tmp_path):
+    db = FlakyDB()
+    writer = _writer(db, tmp_path)
+    for record in ({"user_id": "u1"}, {"user_id": None, "bad": True}, {"user_id": "u2"}):
+        writer.enqueue(record)
+
+    assert writer.flush(5)
+    writer.close()
+
+    assert [row["user_id"] for row in db.rows] == ["u1", "u2"]
+    dead = _dead_letters(tmp_path)
+    assert [entry["record"]["bad"] for entry in dead] == [True]
+    assert "NOT NULL" in dead[0]["error"]
+    assert writer.metrics()["dead_lettered"] == 1
+
+
+def test_unwritten_records_survive_a_restart(tmp_path):
+    db = FlakyDB(down=True)
+    writer = _writer(db, tmp_path)
+    for i in range(3):
+        writer.enqueue({"user_id": "u1", "n": i})
+    writer.close()  # database still down: the records stay in the spool
+    assert db.rows == [] and _dead_letters(tmp_path) == []
+
+    db.down = False
+    restarted = _writer(db, tmp_path)
+    assert restarted.flush(5)
+    restarted.close()
+
+    assert [row["n"] for row in db.rows] == [0, 1, 2]
+
+
+def test_spools_of_running_writers_are_left_alone(tmp_path):
+    db = FlakyDB(down=True)
+    running = _writer(db, tmp_path)
+    running.enqueue({"user_id": "u1"})
+
+    other = _writer(FlakyDB(), tmp_path)
+
+    assert other.metrics()["backlog"] == 0
+    assert running.metrics()["backlog"] == 1
+    other.close()
+    db.down = False
+    running.close()
+    assert len(db.rows) == 1
+
+
+def test_without_a_spool_unwritten_records_are_dead_lettered_on_close(tmp_path):
+    writer = _writer(FlakyDB(down=True), tmp_path, spool_dir=None)
+    writer.enqueue({"user_id": "u1"})
+    writer.close()
+
+    assert [entry["record"]["user_id"] for entry in _dead_letters(tmp_path)] == ["u1"]
+
+
+def test_enqueue_after_close_is_refused(tmp_path):
+    writer = _writer(FlakyDB(), tmp_path)
+    writer.close()
+
+    with pytest.raises(RuntimeError):
+        writer.enqueue({"user_id": "u1"})